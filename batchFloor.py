@@ -0,0 +1,338 @@
+from typing import Union, Sequence
+
+import numpy as np
+
+from obtainPassenger import PassengerGenerator, RandomPassengerGenerator
+from trafficTrace import TracePassengerGenerator
+
+from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, DEFAULT_ELEVATOR_CAPACITY, UNLOADING_TIME, \
+    DEFAULT_BUSY_MULTIPLIER, RANDOM_SEED, DIRECTION_UP, DIRECTION_DOWN
+
+
+class BatchFloors(object):
+    def __init__(self,
+                 buildingCount: int,
+                 passengerGenerators: Union[Sequence[PassengerGenerator], None] = None,
+                 elevatorCount: int = DEFAULT_ELEVATOR_COUNT,
+                 floorCount: int = DEFAULT_ELEVATOR_FLOOR,
+                 elevatorCapacity: int = DEFAULT_ELEVATOR_CAPACITY
+                 ) -> None:
+        """
+        Initialize N independent buildings that are stepped in lockstep
+
+        Every building follows the same rules as Floors/Elevator and gives the same wait
+        times for the same traffic and actions. Passengers are stored as arrays:
+
+            - waiting[n, origin, destination]: passengers waiting on a floor
+            - waiting passengers: building, origin and destination columns in arrival order;
+              every floor has a first row, passengers of that floor in earlier rows have left
+            - waitingUp[n, floor], waitingDown[n, floor]: passengers waiting to go up, down
+            - riders[n, elevator, destination]: passengers inside an elevator
+
+        :param buildingCount: Number of buildings (N)
+        :param passengerGenerators: One PassengerGenerator per building, None for random traffic
+        :param elevatorCount: Elevator count per building
+        :param floorCount: Floor count per building
+        :param elevatorCapacity: Elevator capacity
+        """
+        self.buildingCount: int = buildingCount
+        self.elevatorCount: int = elevatorCount
+        self.floorCount: int = floorCount
+        self.capacity: int = elevatorCapacity
+        self.time: int = 0
+
+        # waiting passengers, rows in arrival order, compacted when full
+        self._passengerBuilding: np.ndarray = np.zeros(256, dtype=np.int32)
+        self._passengerOrigin: np.ndarray = np.zeros(256, dtype=np.int32)
+        self._passengerDestination: np.ndarray = np.zeros(256, dtype=np.int32)
+        self._passengerRows: int = 0
+        self._floorStart: np.ndarray = np.zeros((buildingCount, floorCount), dtype=np.int64)
+        self.waiting: np.ndarray = np.zeros((buildingCount, floorCount, floorCount), dtype=np.int32)
+        self.waitingUp: np.ndarray = np.zeros((buildingCount, floorCount), dtype=np.int32)
+        self.waitingDown: np.ndarray = np.zeros((buildingCount, floorCount), dtype=np.int32)
+
+        self.riders: np.ndarray = np.zeros((buildingCount, elevatorCount, floorCount), dtype=np.int32)
+        self.position: np.ndarray = np.zeros((buildingCount, elevatorCount), dtype=np.int32)
+        self.direction: np.ndarray = np.zeros((buildingCount, elevatorCount), dtype=np.int8)
+        self.holdingTime: np.ndarray = np.zeros((buildingCount, elevatorCount), dtype=np.int32)
+        self.load: np.ndarray = np.zeros((buildingCount, elevatorCount), dtype=np.int32)
+        self.takeIns: np.ndarray = np.zeros((buildingCount, elevatorCount), dtype=bool)
+
+        self.totalWaitTime: np.ndarray = np.zeros(buildingCount, dtype=np.int64)
+
+        self._buildings: np.ndarray = np.arange(buildingCount)
+
+        if passengerGenerators is None:
+            self.passengerGenerators = [RandomPassengerGenerator(floorCount, DEFAULT_BUSY_MULTIPLIER, RANDOM_SEED + n)
+                                        for n in range(buildingCount)]
+        else:
+            if len(passengerGenerators) != buildingCount:
+                raise ValueError("One passenger generator is required per building")
+            self.passengerGenerators = list(passengerGenerators)
+
+    def setTakeIns(self, takeIns: np.ndarray) -> None:
+        """
+        Set the take in status of the elevators
+
+        :param takeIns: bool array of shape (N, elevatorCount)
+        :return: None
+        """
+        self.takeIns[:] = takeIns
+
+    def setElevatorDirection(self, directions: np.ndarray) -> None:
+        """
+        Set the direction of the elevators
+
+        :param directions: int array of shape (N, elevatorCount) with 1 (up), 0 (idle) or -1 (down)
+        :return: None
+        """
+        self.direction[:] = np.sign(directions)
+
+    def getElevatorLocation(self) -> np.ndarray:
+        """
+        Get the location of the elevators
+
+        :return: int array of shape (N, elevatorCount)
+        """
+        return self.position
+
+    def getElevatorDirection(self) -> np.ndarray:
+        """
+        Get the direction of the elevators
+
+        :return: int array of shape (N, elevatorCount)
+        """
+        return self.direction
+
+    def getFloorRequests(self) -> np.ndarray:
+        """
+        Get the floor requests
+
+        :return: bool array of shape (N, floorCount, 2) holding (up, down) per floor
+        """
+        return np.stack((self.waitingUp > 0, self.waitingDown > 0), axis=-1)
+
+    def getWaitingCounts(self) -> np.ndarray:
+        """
+        Get the number of passengers waiting on each floor
+
+        :return: int array of shape (N, floorCount)
+        """
+        return self.waitingUp + self.waitingDown
+
+    @property
+    def observationSize(self) -> int:
+        """
+        Length of one building's observation, see Floors.observe for the layout
+        """
+        return 1 + 2 * self.elevatorCount + 3 * self.floorCount
+
+    def observe(self, out: Union[np.ndarray, None] = None) -> np.ndarray:
+        """
+        Write the observation of every building into a buffer, same layout as Floors.observe
+
+        :param out: float array of shape (N, observationSize) to reuse, None to allocate one
+        :return: the observation buffer
+        """
+        if out is None:
+            out = np.empty((self.buildingCount, self.observationSize))
+        E, F = self.elevatorCount, self.floorCount
+        out[:, 0] = self.time
+        out[:, 1:1 + E] = self.position
+        out[:, 1 + E:1 + 2 * E] = self.direction
+        requests = out[:, 1 + 2 * E:1 + 2 * E + 2 * F]
+        np.greater(self.waitingUp, 0, out=requests[:, 0::2], casting="unsafe")
+        np.greater(self.waitingDown, 0, out=requests[:, 1::2], casting="unsafe")
+        np.add(self.waitingUp, self.waitingDown, out=out[:, 1 + 2 * E + 2 * F:], casting="unsafe")
+        return out
+
+    def addArrivals(self, buildings: np.ndarray, origins: np.ndarray, destinations: np.ndarray) -> None:
+        """
+        Place new passengers on their origin floors
+
+        :param buildings: building index of every passenger
+        :param origins: origin floor of every passenger
+        :param destinations: destination floor of every passenger
+        :return: None
+        """
+        count = len(buildings)
+        if self._passengerRows + count > len(self._passengerBuilding):
+            self._compact(count)
+        rows = slice(self._passengerRows, self._passengerRows + count)
+        self._passengerBuilding[rows] = buildings
+        self._passengerOrigin[rows] = origins
+        self._passengerDestination[rows] = destinations
+        self._passengerRows += count
+        np.add.at(self.waiting, (buildings, origins, destinations), 1)
+        up = destinations > origins
+        np.add.at(self.waitingUp, (buildings[up], origins[up]), 1)
+        np.add.at(self.waitingDown, (buildings[~up], origins[~up]), 1)
+
+    def _compact(self, extra: int) -> None:
+        """
+        Drop the rows of passengers that left their floor, keeping arrival order, and grow
+        the passenger columns if extra more rows would still not fit in half of them
+        """
+        rows = self._passengerRows
+        building = self._passengerBuilding[:rows]
+        origin = self._passengerOrigin[:rows]
+        kept = np.flatnonzero(np.arange(rows) >= self._floorStart[building, origin])
+        size = len(self._passengerBuilding)
+        while 2 * (len(kept) + extra) > size:
+            size *= 2
+        columns = []
+        for column in (self._passengerBuilding, self._passengerOrigin, self._passengerDestination):
+            compacted = np.zeros(size, dtype=column.dtype)
+            compacted[:len(kept)] = column[kept]
+            columns.append(compacted)
+        self._passengerBuilding, self._passengerOrigin, self._passengerDestination = columns
+        self._passengerRows = len(kept)
+        # the first kept row at or after the old first row of every floor
+        self._floorStart = np.searchsorted(kept, self._floorStart)
+
+    def _generate(self) -> None:
+        counts = np.empty(self.buildingCount, dtype=np.int64)
+        origins, destinations = [], []
+        for n, generator in enumerate(self.passengerGenerators):
+            if isinstance(generator, TracePassengerGenerator):
+                tickOrigins, tickDestinations = generator.trace.arrivals(self.time)
+            else:
+                tickOrigins, tickDestinations = generator.obtainTrips(self.time)
+            counts[n] = len(tickOrigins)
+            origins.append(tickOrigins)
+            destinations.append(tickDestinations)
+        if counts.any():
+            self.addArrivals(np.repeat(self._buildings, counts), np.concatenate(origins).astype(np.int32),
+                             np.concatenate(destinations).astype(np.int32))
+
+    def _takeIn(self, e: int) -> None:
+        """
+        Vectorized Elevator.add_passengers for elevator e of every building
+
+        As FloorQueue.take: the floor empties in arrival order until the car is full. Passengers
+        heading in the car's direction board, the others leave without boarding. Once the
+        car is full, only those who arrived before its last boarder have left the floor.
+        """
+        buildings = self._buildings
+        pos = self.position[:, e]
+        active = self.takeIns[:, e] & (self.waitingUp[buildings, pos] + self.waitingDown[buildings, pos] > 0)
+        if not active.any():
+            return
+        self.holdingTime[active, e] += UNLOADING_TIME
+        space = self.capacity - self.load[:, e]
+        taking = active & (space > 0)
+        if not taking.any():
+            return
+
+        waiting = self.waiting[buildings, pos]
+        direction = self.direction[:, e, None]
+        floors = np.arange(self.floorCount)
+        heading = (((direction == DIRECTION_UP) & (floors > pos[:, None]))
+                   | ((direction == DIRECTION_DOWN) & (floors < pos[:, None])))
+        boarding = np.where(heading, waiting, 0)
+        full = taking & (boarding.sum(axis=1) >= space)
+
+        # the car never fills: the whole floor leaves, those heading its way board
+        fits = taking & ~full
+        if fits.any():
+            b, floor = buildings[fits], pos[fits]
+            self.riders[fits, e] += boarding[fits]
+            self.load[fits, e] += boarding[fits].sum(axis=1, dtype=self.load.dtype)
+            self.waiting[b, floor] = 0
+            self.waitingUp[b, floor] = 0
+            self.waitingDown[b, floor] = 0
+            self._floorStart[b, floor] = self._passengerRows
+        if full.any():
+            self._fill(e, full, space)
+
+    def _fill(self, e: int, full: np.ndarray, space: np.ndarray) -> None:
+        """
+        Board elevator e of the full buildings from the rows of their floors in arrival order
+        """
+        pos = self.position[:, e]
+        start = self._floorStart[full, pos[full]].min()
+        building = self._passengerBuilding[start:self._passengerRows]
+        index = start + np.flatnonzero(full[building] & (self._passengerOrigin[start:self._passengerRows]
+                                                         == pos[building]))
+        b = self._passengerBuilding[index]
+        index = index[index >= self._floorStart[b, pos[b]]]
+        b = self._passengerBuilding[index]
+        origin = pos[b]
+        destination = self._passengerDestination[index]
+        up = destination > origin
+        direction = self.direction[b, e]
+        same = np.where(up, direction == DIRECTION_UP, direction == DIRECTION_DOWN)
+
+        # passengers up to the last boarder leave the floor
+        limit = np.zeros(self.buildingCount, dtype=np.int64)
+        sameBuilding = b[same]
+        order = np.argsort(sameBuilding, kind="stable")
+        first = np.searchsorted(sameBuilding[order], self._buildings[full])
+        limit[full] = index[same][order][first + space[full] - 1]
+        removed = index <= limit[b]
+        board = removed & same
+
+        np.subtract.at(self.waiting, (b[removed], origin[removed], destination[removed]), 1)
+        removedUp = removed & up
+        removedDown = removed & ~up
+        np.subtract.at(self.waitingUp, (b[removedUp], origin[removedUp]), 1)
+        np.subtract.at(self.waitingDown, (b[removedDown], origin[removedDown]), 1)
+        np.add.at(self.riders, (b[board], e, destination[board]), 1)
+        self.load[:, e] += np.bincount(b[board], minlength=self.buildingCount).astype(self.load.dtype)
+        self._floorStart[full, pos[full]] = limit[full] + 1
+
+    def _elevatorNext(self) -> None:
+        """
+        Vectorized Elevator.next for every elevator of every building
+        """
+        holding = self.holdingTime > 0
+        self.holdingTime[holding] -= 1
+        moving = ~holding
+
+        up = moving & (self.direction == DIRECTION_UP) & (self.position < self.floorCount - 1)
+        down = moving & (self.direction == DIRECTION_DOWN) & (self.position > 0)
+        self.position += up
+        self.position -= down
+
+        buildings = self._buildings[:, None]
+        elevators = np.arange(self.elevatorCount)[None, :]
+        dropped = np.where(moving, self.riders[buildings, elevators, self.position], 0)
+        self.riders[buildings, elevators, self.position] -= dropped
+        self.load -= dropped
+        self.holdingTime[dropped > 0] = UNLOADING_TIME
+
+    def step(self,
+             directions: Union[np.ndarray, None] = None,
+             takeIns: Union[np.ndarray, None] = None,
+             wait: int = 1) -> np.ndarray:
+        """
+        Set the actions and advance every building by one time step
+
+        Same phase order as Floors.next: generate passengers, elevator take in,
+        elevator next, update floor and wait accounting.
+
+        :param directions: int array of shape (N, elevatorCount), None keeps the current directions
+        :param takeIns: bool array of shape (N, elevatorCount), None keeps the current take ins
+        :param wait: wait time charged per passenger in the system
+        :return: int array of shape (N,): total wait time of every building
+        """
+        if directions is not None:
+            self.setElevatorDirection(directions)
+        if takeIns is not None:
+            self.setTakeIns(takeIns)
+
+        # generate passengers
+        self._generate()
+
+        # elevator take in, in elevator order as in Floors.next
+        for e in range(self.elevatorCount):
+            self._takeIn(e)
+
+        # elevator next
+        self._elevatorNext()
+
+        # update floor: floor requests are read from waitingUp/waitingDown
+        inSystem = self.waitingUp.sum(axis=1) + self.waitingDown.sum(axis=1) + self.load.sum(axis=1)
+        self.totalWaitTime += wait * inSystem
+        self.time += 1
+        return self.totalWaitTime
@@ -0,0 +1,371 @@
+"""
+Benchmarks of the simulator and training hot paths.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--quick] [--output results.json]
+    python benchmarks/run_benchmarks.py --check-imports
+
+Every case is timed over a grid of floor counts, elevator counts and busy multipliers
+and written as JSON, so runs of different commits can be compared. --check-imports only
+times importing the simulator core and exits with status 1 when it is over its budget.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from batchFloor import BatchFloors
+from demandProfile import uniform_profile
+from elevator import Elevator
+from eventFloors import EventFloors
+from floor import Floors
+from floorQueue import FloorQueue
+from obtainPassenger import TimeCapture
+from trafficTrace import TracePassengerGenerator
+
+from elevatorConstants import DEFAULT_ELEVATOR_CAPACITY, RANDOM_SEED
+
+WARMUP_STEPS: int = 200
+BATCH_BUILDINGS: int = 90  # buildings of the BatchFloors benchmark, as a generation's runs
+EPISODE_STEPS: int = 1000  # ticks of the episode benchmarks
+
+# the simulator, importable without NumPy, NEAT or plotting so short jobs and workers start fast
+CORE_MODULES: tuple[str, ...] = ("elevatorConstants", "passenger", "obtainPassenger", "elevator", "floor")
+HEAVY_MODULES: tuple[str, ...] = ("numpy", "neat", "matplotlib", "graphviz", "svglib", "reportlab")
+IMPORT_BUDGET_SECONDS: float = 0.08  # importing CORE_MODULES in a fresh interpreter
+
+
+def timed(run: Callable[[], None], setup: Callable[[], None] = None, min_time: float = 0.2, repeat: int = 5) -> dict:
+    """
+    Time a call, excluding its setup
+
+    :param run: the call to time
+    :param setup: called before every run, not timed
+    :param min_time: minimum measured time per repeat, in seconds
+    :param repeat: number of repeats, the median is reported
+    :return: dict with seconds_per_call (median), best and the number of calls per repeat
+    """
+    samples = []
+    calls = 0
+    for _ in range(repeat):
+        elapsed = 0.0
+        calls = 0
+        while calls == 0 or elapsed < min_time:
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            run()
+            elapsed += time.perf_counter() - start
+            calls += 1
+        samples.append(elapsed / calls)
+    return {"seconds_per_call": statistics.median(samples), "best": min(samples), "calls": calls}
+
+
+def loaded_floors(floors: int, elevators: int, busy: float) -> tuple[Floors, Callable[[], None]]:
+    """
+    Floors after WARMUP_STEPS of seeded random control, and the action setter used for it
+    """
+    floor_system = Floors(TimeCapture(floors, busy, RANDOM_SEED), elevators, floors)
+    rng = np.random.default_rng(RANDOM_SEED)
+
+    def act() -> None:
+        floor_system.applyActions(rng.integers(-1, 2, elevators), rng.random(elevators) < 0.5)
+
+    for _ in range(WARMUP_STEPS):
+        act()
+        floor_system.next()
+    return floor_system, act
+
+
+def bench_elevator_next(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    rng = random.Random(RANDOM_SEED)
+    elevator = Elevator(DEFAULT_ELEVATOR_CAPACITY, floors)
+    destinations = [rng.randint(1, floors - 1) for _ in range(DEFAULT_ELEVATOR_CAPACITY)]
+
+    def setup() -> None:
+        elevator.clear()
+        elevator.current_floor = 0
+        elevator.holdingTime = 0
+        elevator.set_direction("up")
+        for destination in destinations:
+            elevator.add(elevator.pool.allocate(0, destination))
+
+    def run() -> None:
+        for _ in range(floors):
+            elevator.next()
+
+    result = timed(run, setup, **kwargs)
+    result["seconds_per_call"] /= floors
+    result["best"] /= floors
+    return result
+
+
+def bench_elevator_add_passengers(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    rng = random.Random(RANDOM_SEED)
+    # queue length of a busy floor: arrivals per floor over the warmup
+    waiting = max(1, int(busy * WARMUP_STEPS))
+    origin = floors // 2
+    destinations = [rng.choice([f for f in range(floors) if f != origin]) for _ in range(waiting)]
+    elevator = Elevator(DEFAULT_ELEVATOR_CAPACITY, floors)
+    elevator.current_floor = origin
+    floor = FloorQueue(elevator.pool)
+
+    def setup() -> None:
+        elevator.clear()
+        elevator.holdingTime = 0
+        elevator.set_direction("up")
+        for passenger in floor:
+            elevator.pool.release(passenger)
+        floor.clear()
+        for destination in destinations:
+            floor.append(elevator.pool.allocate(origin, destination), "up" if origin < destination else "down")
+
+    def run() -> None:
+        elevator.add_passengers(floor)
+
+    return timed(run, setup, **kwargs)
+
+
+def bench_floors_update_floor(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    floor_system, _ = loaded_floors(floors, elevators, busy)
+    return timed(floor_system.updateFloor, **kwargs)
+
+
+def bench_floors_next(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    floor_system, act = loaded_floors(floors, elevators, busy)
+    return timed(floor_system.next, act, **kwargs)
+
+
+def bench_floors_fork(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    floor_system, _ = loaded_floors(floors, elevators, busy)
+    return timed(floor_system.fork, **kwargs)
+
+
+def bench_floors_restore(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    floor_system, _ = loaded_floors(floors, elevators, busy)
+    snapshot = floor_system.snapshot()
+    return timed(lambda: floor_system.restore(snapshot), **kwargs)
+
+
+def bench_batch_floors_episode(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    """
+    BATCH_BUILDINGS episodes as in episode_benchmark, stepped together by one BatchFloors;
+    reported per building to compare with the Floors episode
+    """
+    profile = uniform_profile(floors, busy)
+    traces = [profile.generate(floors, EPISODE_STEPS, RANDOM_SEED + n) for n in range(BATCH_BUILDINGS)]
+    state = {}
+
+    def setup() -> None:
+        state["batch"] = BatchFloors(BATCH_BUILDINGS, [TracePassengerGenerator(trace) for trace in traces],
+                                     elevators, floors)
+        state["rng"] = np.random.default_rng(RANDOM_SEED)
+
+    def run() -> None:
+        batch, rng = state["batch"], state["rng"]
+        for _ in range(EPISODE_STEPS):
+            batch.step(rng.integers(-1, 2, (BATCH_BUILDINGS, elevators)),
+                       rng.random((BATCH_BUILDINGS, elevators)) < 0.5)
+
+    result = timed(run, setup, **kwargs)
+    result["seconds_per_call"] /= BATCH_BUILDINGS
+    result["best"] /= BATCH_BUILDINGS
+    result["buildings"] = BATCH_BUILDINGS
+    return result
+
+
+def episode_benchmark(floorsType: type, floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    """
+    One EPISODE_STEPS tick episode of Poisson traffic under seeded random control, stepped
+    tick by tick (Floors) or from decision point to decision point (EventFloors.run)
+    """
+    trace = uniform_profile(floors, busy).generate(floors, EPISODE_STEPS, RANDOM_SEED)
+    state = {}
+
+    def setup() -> None:
+        state["floors"] = floorsType(TracePassengerGenerator(trace), elevators, floors)
+        state["rng"] = np.random.default_rng(RANDOM_SEED)
+
+    def act(floor_system: Floors) -> None:
+        rng = state["rng"]
+        floor_system.applyActions(rng.integers(-1, 2, elevators), rng.random(elevators) < 0.5)
+
+    def run() -> None:
+        floor_system = state["floors"]
+        if isinstance(floor_system, EventFloors):
+            floor_system.run(act, EPISODE_STEPS)
+        else:
+            for _ in range(EPISODE_STEPS):
+                act(floor_system)
+                floor_system.next()
+
+    return timed(run, setup, **kwargs)
+
+
+def bench_floors_episode(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    return episode_benchmark(Floors, floors, elevators, busy, **kwargs)
+
+
+def bench_event_floors_run(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    return episode_benchmark(EventFloors, floors, elevators, busy, **kwargs)
+
+
+def bench_time_capture_obtain_trips(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    generator = TimeCapture(floors, busy, RANDOM_SEED)
+    ticks = iter(itertools.count())
+    return timed(lambda: generator.obtainTrips(next(ticks)), **kwargs)
+
+
+def bench_profile_generate(floors: int, elevators: int, busy: float, **kwargs) -> dict:
+    # one 1000 tick episode per call
+    profile = uniform_profile(floors, busy)
+    seeds = iter(itertools.count())
+    return timed(lambda: profile.generate(floors, 1000, next(seeds)), **kwargs)
+
+
+SIMULATOR_BENCHMARKS: dict[str, Callable[..., dict]] = {
+    "Elevator.next": bench_elevator_next,
+    "Elevator.add_passengers": bench_elevator_add_passengers,
+    "Floors.updateFloor": bench_floors_update_floor,
+    "Floors.next": bench_floors_next,
+    f"Floors episode ({EPISODE_STEPS} ticks)": bench_floors_episode,
+    f"BatchFloors episode ({EPISODE_STEPS} ticks, per building)": bench_batch_floors_episode,
+    f"EventFloors.run ({EPISODE_STEPS} ticks)": bench_event_floors_run,
+    "Floors.fork": bench_floors_fork,
+    "Floors.restore": bench_floors_restore,
+    "TimeCapture.obtainTrips": bench_time_capture_obtain_trips,
+    "DemandProfile.generate(1000 ticks)": bench_profile_generate,
+}
+
+
+def bench_evaluate_genomes(repeat: int, engine: str = "floors") -> dict:
+    """
+    One generation of train_neat.evaluate_genomes with a seeded population and traffic
+
+    :param repeat: number of generations timed
+    :param engine: simulator of the evaluations, see train_neat.ENGINES
+    """
+    import neat
+    import train_neat
+
+    config = train_neat.load_config(path=os.path.join(ROOT, "neat_config"), engine=engine)
+    random.seed(RANDOM_SEED)
+    population = neat.Population(config)
+    genomes = list(population.population.items())
+    return timed(lambda: train_neat.evaluate_genomes(genomes, config, RANDOM_SEED), min_time=0.0, repeat=repeat)
+
+
+def bench_core_import(repeat: int) -> dict:
+    """
+    Import of CORE_MODULES in fresh interpreters, and the heavy modules it pulled in
+    """
+    script = ("import json, sys, time\n"
+              "start = time.perf_counter()\n"
+              f"for name in {CORE_MODULES!r}:\n"
+              "    __import__(name)\n"
+              "elapsed = time.perf_counter() - start\n"
+              f"print(json.dumps([elapsed, [name for name in {HEAVY_MODULES!r} if name in sys.modules]]))")
+    samples = []
+    heavy: set[str] = set()
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", script], cwd=ROOT, text=True)
+        elapsed, loaded = json.loads(output)
+        samples.append(elapsed)
+        heavy.update(loaded)
+    return {"seconds_per_call": statistics.median(samples), "best": min(samples), "calls": 1,
+            "budget": IMPORT_BUDGET_SECONDS, "heavy_modules": sorted(heavy)}
+
+
+def check_core_import(result: dict) -> bool:
+    """
+    Print whether a bench_core_import result is within its budget and free of heavy modules
+    """
+    ok = True
+    if result["seconds_per_call"] > result["budget"]:
+        print(f"Importing the core took {result['seconds_per_call'] * 1e3:.1f} ms, "
+              f"over the budget of {result['budget'] * 1e3:.0f} ms")
+        ok = False
+    if result["heavy_modules"]:
+        print("Importing the core loaded", ", ".join(result["heavy_modules"]))
+        ok = False
+    if ok:
+        print(f"Importing the core took {result['seconds_per_call'] * 1e3:.1f} ms, "
+              f"within the budget of {result['budget'] * 1e3:.0f} ms")
+    return ok
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the elevator simulator and training")
+    parser.add_argument("--output", default="bench_results.json", help="JSON file to write")
+    parser.add_argument("--quick", action="store_true", help="small grid and short timings")
+    parser.add_argument("--floors", type=int, nargs="+", help="floor counts to sweep")
+    parser.add_argument("--elevators", type=int, nargs="+", help="elevator counts to sweep")
+    parser.add_argument("--busy", type=float, nargs="+", help="busy multipliers to sweep")
+    parser.add_argument("--only", nargs="+", help="run only these benchmarks (by name)")
+    parser.add_argument("--skip-training", action="store_true", help="skip the evaluate_genomes benchmark")
+    parser.add_argument("--check-imports", action="store_true",
+                        help="only check the import time of the simulator core, exit with status 1 if over budget")
+    args = parser.parse_args()
+
+    if args.check_imports:
+        sys.exit(0 if check_core_import(bench_core_import(5)) else 1)
+
+    floors = args.floors or ([10, 40] if args.quick else [10, 40, 100])
+    elevators = args.elevators or ([4] if args.quick else [2, 4, 8])
+    busy = args.busy or ([0.03] if args.quick else [0.03, 0.1, 0.3])
+    timing = {"min_time": 0.05, "repeat": 3} if args.quick else {"min_time": 0.2, "repeat": 5}
+
+    results = []
+    if not args.only or "import core" in args.only:
+        result = bench_core_import(3 if args.quick else 10)
+        results.append({"name": "import core", "params": {}, **result})
+        print(f"{'import core':48s} {json.dumps(result['heavy_modules']):58s} {result['seconds_per_call'] * 1e6:12.2f} us")
+
+    for name, bench in SIMULATOR_BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        for floor_count, elevator_count, busy_multiplier in itertools.product(floors, elevators, busy):
+            params = {"floors": floor_count, "elevators": elevator_count, "busyMultiplier": busy_multiplier}
+            result = bench(floor_count, elevator_count, busy_multiplier, **timing)
+            results.append({"name": name, "params": params, **result})
+            print(f"{name:48s} {json.dumps(params):58s} {result['seconds_per_call'] * 1e6:12.2f} us")
+
+    if not args.skip_training and (not args.only or "evaluate_genomes" in args.only):
+        import train_neat
+
+        for engine in train_neat.ENGINES:
+            params = {"engine": engine}
+            result = bench_evaluate_genomes(1 if args.quick else 3, engine)
+            results.append({"name": "evaluate_genomes", "params": params, **result})
+            print(f"{'evaluate_genomes':48s} {json.dumps(params):58s} {result['seconds_per_call']:12.2f} s")
+
+    with open(args.output, "w") as f:
+        json.dump({"commit": git_commit(),
+                   "python": platform.python_version(),
+                   "platform": platform.platform(),
+                   "timestamp": time.time(),
+                   "results": results}, f, indent=2)
+    print("Results written to", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import gzip
+import json
+import os
+import pickle
+import random
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Literal, Optional
+
+import neat
+from neat.reporting import BaseReporter
+
+from fitnessCache import FitnessCache
+
+MANIFEST_NAME: str = "manifest.json"
+# settings of load_config a restored population must have been trained with
+TRAINING_SETTINGS: tuple[str, ...] = ("floor_count", "elevator_count", "controller", "objective")
+
+
+def read_manifest(directory: str) -> list[dict]:
+    """
+    Checkpoints listed in a checkpoint directory, oldest first
+
+    :param directory: checkpoint directory
+    :return: one dict per checkpoint with run, generation, best_fitness, path (relative to the directory) and time;
+        run is None for checkpoints written before runs were recorded
+    """
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [{"run": None, **entry} for entry in json.load(f)["checkpoints"]]
+
+
+def check_config(saved, config) -> None:
+    """
+    Raise ValueError if a checkpoint was trained for another building, controller or objective than config
+
+    :param saved: NEAT configuration pickled with the checkpoint
+    :param config: NEAT configuration of the current run, see train_neat.load_config
+    :return: None
+    """
+    for name in TRAINING_SETTINGS:
+        if not hasattr(saved, name) or not hasattr(config, name):
+            continue
+        if getattr(saved, name) != getattr(config, name):
+            raise ValueError(f"The checkpoint was trained with {name} {getattr(saved, name)!r}, "
+                             f"not {getattr(config, name)!r}")
+    for name in ("num_inputs", "num_outputs"):
+        if getattr(saved.genome_config, name) != getattr(config.genome_config, name):
+            raise ValueError(f"The checkpoint networks have {getattr(saved.genome_config, name)} {name[4:]}, "
+                             f"not {getattr(config.genome_config, name)}")
+
+
+def restore_checkpoint(directory: str, which: Literal["latest", "best"] = "latest", config=None
+                       ) -> tuple[neat.Population, Optional[FitnessCache], Optional[dict], Optional[str]]:
+    """
+    Restore a population saved by BackgroundCheckpointer, found through the manifest
+
+    Only the run that wrote the most recent snapshot is considered, so an older run sharing the
+    directory is never picked up in its place.
+
+    :param directory: checkpoint directory
+    :param which: "latest" for the last generation saved, "best" for the one with the highest best fitness
+    :param config: NEAT configuration of the current run, the checkpoint must match its building, controller
+        and objective (see check_config); None restores whatever was saved
+    :return: the population, the fitness cache and curriculum progress saved with it (None if there were none),
+        and the run that wrote it
+    """
+    entries = read_manifest(directory)
+    if not entries:
+        raise FileNotFoundError(f"No checkpoints listed in {os.path.join(directory, MANIFEST_NAME)}")
+    run = max(entries, key=lambda e: e["time"])["run"]
+    entries = [e for e in entries if e["run"] == run]
+    if which == "latest":
+        entry = max(entries, key=lambda e: e["generation"])
+    elif which == "best":
+        entry = max(entries, key=lambda e: (e["best_fitness"] is not None, e["best_fitness"] or 0, e["generation"]))
+    else:
+        raise ValueError(f"Cannot restore {which!r} checkpoint, use 'latest' or 'best'")
+    with gzip.open(os.path.join(directory, entry["path"])) as f:
+        generation, saved_config, population, species_set, rndstate, cache, *rest = pickle.load(f)
+    if config is not None:
+        check_config(saved_config, config)
+    random.setstate(rndstate)
+    # snapshots written before curricula have no curriculum progress
+    curriculum = rest[0] if rest else None
+    return neat.Population(saved_config, (population, species_set, generation)), cache, curriculum, run
+
+
+class BackgroundCheckpointer(BaseReporter):
+    def __init__(self,
+                 directory: str = "checkpoints",
+                 generation_interval: int = 4,
+                 keep: int = 5,
+                 cache: Optional[FitnessCache] = None,
+                 compresslevel: int = 5,
+                 curriculum: Optional["curriculum.CurriculumScheduler"] = None,
+                 run: Optional[str] = None) -> None:
+        """
+        Checkpointer that compresses and writes snapshots on a background thread
+
+        The population is pickled at the end of the generation, so the snapshot is consistent;
+        compressing, writing, updating the manifest and pruning happen while the next
+        generation is evaluated. Snapshots are written one at a time, in order.
+
+        The manifest (manifest.json in the directory) lists the run, generation, best fitness and
+        file of every kept snapshot, so restore_checkpoint never scans the directory. Of the
+        snapshots of this run, the keep latest and the one with the best fitness are kept, older
+        ones are deleted. Snapshots of other runs in the directory are left alone.
+
+        :param directory: checkpoint directory, created if missing
+        :param generation_interval: generations between snapshots
+        :param keep: number of latest snapshots kept besides the best one
+        :param cache: FitnessCache saved with every snapshot, None to leave it out
+        :param compresslevel: gzip compression level
+        :param curriculum: CurriculumScheduler whose progress is saved with every snapshot, None to leave it out
+        :param run: run the snapshots belong to, the one returned by restore_checkpoint to continue it;
+            None starts a new run
+        """
+        self.directory: str = directory
+        self.generation_interval: int = generation_interval
+        self.keep: int = keep
+        self.cache: Optional[FitnessCache] = cache
+        self.compresslevel: int = compresslevel
+        self.curriculum: Optional["curriculum.CurriculumScheduler"] = curriculum
+        os.makedirs(directory, exist_ok=True)
+
+        self.current_generation: Optional[int] = None
+        self.last_generation_checkpoint: int = -1
+        self.best_fitness: Optional[float] = None
+        self.run: str = run if run is not None else f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        # snapshots of this run
+        self.entries: list[dict] = [e for e in read_manifest(directory) if e["run"] == self.run]
+        self._executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending: list[Future] = []
+
+    def __getstate__(self) -> dict:
+        # snapshots reach the reporters through the species set, leave the writer thread out
+        state = self.__dict__.copy()
+        del state["_executor"], state["_pending"]
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self._pending = []
+
+    def start_generation(self, generation):
+        self.current_generation = generation
+        self._raise_errors()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.best_fitness = best_genome.fitness
+
+    def end_generation(self, config, population, species_set):
+        if self.current_generation - self.last_generation_checkpoint >= self.generation_interval:
+            self.save_checkpoint(config, population, species_set, self.current_generation)
+            self.last_generation_checkpoint = self.current_generation
+
+    def save_checkpoint(self, config, population, species_set, generation: int) -> None:
+        """
+        Snapshot the current state and write it in the background
+
+        :return: None
+        """
+        data = (generation, config, population, species_set, random.getstate(), self.cache,
+                self.curriculum.getState() if self.curriculum is not None else None)
+        payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+        entry = {"run": self.run, "generation": generation, "best_fitness": self.best_fitness,
+                 "path": f"{self.run}-generation-{generation}.pkl.gz", "time": time.time()}
+        self._pending.append(self._executor.submit(self._write, payload, entry))
+
+    def _write(self, payload: bytes, entry: dict) -> None:
+        path = os.path.join(self.directory, entry["path"])
+        with gzip.open(path + ".tmp", "wb", compresslevel=self.compresslevel) as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+
+        self.entries = [e for e in self.entries if e["path"] != entry["path"]] + [entry]
+        self.entries.sort(key=lambda e: e["generation"])
+        kept = self.entries[-self.keep:] if self.keep > 0 else []
+        fitted = [e for e in self.entries if e["best_fitness"] is not None]
+        if fitted:
+            best = max(fitted, key=lambda e: (e["best_fitness"], e["generation"]))
+            if best not in kept:
+                kept.append(best)
+        # the manifest is updated before files are deleted, so it never lists a missing file
+        pruned = [e for e in self.entries if e not in kept]
+        self.entries = sorted(kept, key=lambda e: e["generation"])
+        others = [e for e in read_manifest(self.directory) if e["run"] != self.run]
+        manifest = os.path.join(self.directory, MANIFEST_NAME)
+        with open(manifest + ".tmp", "w") as f:
+            json.dump({"checkpoints": others + self.entries}, f, indent=2)
+        os.replace(manifest + ".tmp", manifest)
+        for e in pruned:
+            try:
+                os.remove(os.path.join(self.directory, e["path"]))
+            except FileNotFoundError:
+                pass
+
+    def _raise_errors(self) -> None:
+        # surface failures of finished writes in the training thread
+        done = [future for future in self._pending if future.done()]
+        self._pending = [future for future in self._pending if not future.done()]
+        for future in done:
+            future.result()
+
+    def close(self) -> None:
+        """
+        Wait for the pending snapshots to be written
+
+        :return: None
+        """
+        self._executor.shutdown(wait=True)
+        self._raise_errors()
@@ -0,0 +1,216 @@
+import weakref
+from typing import Callable
+
+import numpy as np
+from neat.graphs import feed_forward_layers
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    z = np.clip(5.0 * z, -60.0, 60.0)
+    return 1.0 / (1.0 + np.exp(-z))
+
+
+def _tanh(z: np.ndarray) -> np.ndarray:
+    return np.tanh(np.clip(2.5 * z, -60.0, 60.0))
+
+
+def _sin(z: np.ndarray) -> np.ndarray:
+    return np.sin(np.clip(5.0 * z, -60.0, 60.0))
+
+
+def _gauss(z: np.ndarray) -> np.ndarray:
+    z = np.clip(z, -3.4, 3.4)
+    return np.exp(-5.0 * z ** 2)
+
+
+def _softplus(z: np.ndarray) -> np.ndarray:
+    z = np.clip(5.0 * z, -60.0, 60.0)
+    return 0.2 * np.log1p(np.exp(z))
+
+
+def _inv(z: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", over="ignore"):
+        inverse = 1.0 / z
+    return np.where((z == 0.0) | ~np.isfinite(inverse), 0.0, inverse)
+
+
+# NumPy versions of neat.activations, with the same clamping
+ACTIVATIONS: dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    "sigmoid": _sigmoid,
+    "tanh": _tanh,
+    "sin": _sin,
+    "gauss": _gauss,
+    "relu": lambda z: np.maximum(z, 0.0),
+    "softplus": _softplus,
+    "identity": lambda z: z,
+    "clamped": lambda z: np.clip(z, -1.0, 1.0),
+    "inv": _inv,
+    "log": lambda z: np.log(np.maximum(z, 1e-7)),
+    "exp": lambda z: np.exp(np.clip(z, -60.0, 60.0)),
+    "abs": np.abs,
+    "hat": lambda z: np.maximum(0.0, 1.0 - np.abs(z)),
+    "square": np.square,
+    "cube": lambda z: z ** 3,
+}
+
+
+def _maxabs(weighted: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    magnitude = np.where(mask, np.abs(weighted), -1.0)
+    picked = np.argmax(magnitude, axis=-1)
+    return np.take_along_axis(weighted, picked[..., None], axis=-1)[..., 0]
+
+
+def _median(weighted: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    # neat's median2 averages when there are at most two values, which np.nanmedian also does
+    return np.nanmedian(np.where(mask, weighted, np.nan), axis=-1)
+
+
+# NumPy versions of neat.aggregations over the padded (batch, nodes, inputs) products
+AGGREGATIONS: dict[str, Callable[[np.ndarray, np.ndarray], np.ndarray]] = {
+    "sum": lambda weighted, mask: np.where(mask, weighted, 0.0).sum(axis=-1),
+    "product": lambda weighted, mask: np.where(mask, weighted, 1.0).prod(axis=-1),
+    "max": lambda weighted, mask: np.where(mask, weighted, -np.inf).max(axis=-1),
+    "min": lambda weighted, mask: np.where(mask, weighted, np.inf).min(axis=-1),
+    "mean": lambda weighted, mask: np.where(mask, weighted, 0.0).sum(axis=-1) / mask.sum(axis=-1),
+    "maxabs": _maxabs,
+    "median": _median,
+}
+
+
+class _NodeGroup(object):
+    def __init__(self, slots, aggregation, activation, sources, weights, bias, response) -> None:
+        # nodes of one layer sharing aggregation and activation
+        self.slots: np.ndarray = np.array(slots)
+        self.aggregation: str = aggregation
+        self.activation: Callable[[np.ndarray], np.ndarray] = ACTIVATIONS[activation]
+        self.bias: np.ndarray = np.array(bias)
+        self.response: np.ndarray = np.array(response)
+        width = max(len(s) for s in sources)
+        self.sources: np.ndarray = np.zeros((len(slots), width), dtype=np.intp)
+        self.weights: np.ndarray = np.zeros((len(slots), width))
+        self.mask: np.ndarray = np.zeros((len(slots), width), dtype=bool)
+        for i, (source, weight) in enumerate(zip(sources, weights)):
+            self.sources[i, :len(source)] = source
+            self.weights[i, :len(weight)] = weight
+            self.mask[i, :len(source)] = True
+        if aggregation == "sum":
+            # sums are a plain matrix product over all slots evaluated so far
+            self.matrix: np.ndarray = np.zeros((int(self.sources.max()) + 1, len(slots)))
+            for i in range(len(slots)):
+                np.add.at(self.matrix[:, i], self.sources[i, self.mask[i]], self.weights[i, self.mask[i]])
+
+    def evaluate(self, values: np.ndarray) -> None:
+        if self.aggregation == "sum":
+            aggregated = values[:, :self.matrix.shape[0]] @ self.matrix
+        else:
+            weighted = values[:, self.sources] * self.weights
+            aggregated = AGGREGATIONS[self.aggregation](weighted, self.mask[None, :, :])
+        values[:, self.slots] = self.activation(self.bias + self.response * aggregated)
+
+
+class CompiledNetwork(object):
+    def __init__(self, numInputs: int, outputSlots: list[int], slotCount: int, groups: list[_NodeGroup]) -> None:
+        """
+        Layered NumPy evaluator of a feed-forward NEAT network
+
+        Use CompiledNetwork.create or compile_genome to build one from a genome.
+
+        :param numInputs: number of network inputs
+        :param outputSlots: value column of every output node
+        :param slotCount: number of value columns (inputs, evaluated nodes and unconnected outputs)
+        :param groups: node groups in evaluation order
+        """
+        self.numInputs: int = numInputs
+        self.outputSlots: np.ndarray = np.array(outputSlots, dtype=np.intp)
+        self.slotCount: int = slotCount
+        self.groups: list[_NodeGroup] = groups
+
+    @staticmethod
+    def create(genome, config) -> "CompiledNetwork":
+        """
+        Compile a genome, following neat.nn.FeedForwardNetwork.create
+
+        :param genome: DefaultGenome
+        :param config: NEAT configuration of the genome
+        :return: CompiledNetwork
+        """
+        genome_config = config.genome_config
+        connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+        layers = feed_forward_layers(genome_config.input_keys, genome_config.output_keys, connections)
+
+        slots = {key: i for i, key in enumerate(genome_config.input_keys)}
+        for layer in layers:
+            for node in sorted(layer):
+                slots[node] = len(slots)
+        for key in genome_config.output_keys:
+            if key not in slots:
+                # never evaluated, stays 0.0 as in FeedForwardNetwork
+                slots[key] = len(slots)
+
+        evaluated = set().union(*layers)
+        incoming: dict[int, list[tuple[int, float]]] = {}
+        for key in connections:
+            inode, onode = key
+            if onode in evaluated:
+                incoming.setdefault(onode, []).append((slots[inode], genome.connections[key].weight))
+
+        groups = []
+        for layer in layers:
+            grouped: dict[tuple[str, str], list[int]] = {}
+            for node in sorted(layer):
+                ng = genome.nodes[node]
+                grouped.setdefault((ng.aggregation, ng.activation), []).append(node)
+            for (aggregation, activation), nodes in grouped.items():
+                if aggregation not in AGGREGATIONS or activation not in ACTIVATIONS:
+                    raise ValueError(f"Cannot compile aggregation {aggregation!r} with activation {activation!r}")
+                groups.append(_NodeGroup([slots[node] for node in nodes], aggregation, activation,
+                                         [[source for source, _ in incoming[node]] for node in nodes],
+                                         [[weight for _, weight in incoming[node]] for node in nodes],
+                                         [genome.nodes[node].bias for node in nodes],
+                                         [genome.nodes[node].response for node in nodes]))
+
+        return CompiledNetwork(len(genome_config.input_keys), [slots[key] for key in genome_config.output_keys],
+                               len(slots), groups)
+
+    def activate_batch(self, inputs: np.ndarray) -> np.ndarray:
+        """
+        Evaluate the network on a batch of inputs
+
+        :param inputs: array of shape (batch, num_inputs)
+        :return: array of shape (batch, num_outputs)
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        if inputs.ndim != 2 or inputs.shape[1] != self.numInputs:
+            raise RuntimeError(f"Expected inputs of shape (batch, {self.numInputs}), got {inputs.shape}")
+        values = np.zeros((inputs.shape[0], self.slotCount))
+        values[:, :self.numInputs] = inputs
+        for group in self.groups:
+            group.evaluate(values)
+        return values[:, self.outputSlots]
+
+    def activate(self, inputs) -> list[float]:
+        """
+        Evaluate the network on one input vector, like FeedForwardNetwork.activate
+
+        :param inputs: num_inputs values
+        :return: list of num_outputs values
+        """
+        return self.activate_batch(np.asarray(inputs, dtype=float)[None, :])[0].tolist()
+
+
+_compiled: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+
+
+def compile_genome(genome, config) -> CompiledNetwork:
+    """
+    Compile a genome once and reuse the result while the genome is alive
+
+    :param genome: DefaultGenome, must not be mutated after it has been compiled
+    :param config: NEAT configuration of the genome
+    :return: CompiledNetwork
+    """
+    network = _compiled.get(genome)
+    if network is None:
+        network = CompiledNetwork.create(genome, config)
+        _compiled[genome] = network
+    return network
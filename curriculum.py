@@ -0,0 +1,187 @@
+"""
+Episode curriculum for genome evaluation: short episodes on few runs and light traffic while the
+population is random, growing to the full episodes and traffic as it improves.
+
+Usage:
+    python train_neat.py --curriculum                        (DEFAULT_CURRICULUM)
+    python train_neat.py --curriculum stages.json --curriculum-spread 0.05
+
+A curriculum file is a JSON list of CurriculumStage keyword arguments, e.g.
+    [{"steps": 100, "runs": 1, "intensity": 0.5, "burst": 0, "generations": 20}, {"steps": 300, "runs": 3}]
+"""
+import json
+import statistics
+from typing import Optional, Sequence
+
+from neat.reporting import BaseReporter
+
+from elevatorConstants import TOTAL_STEPS, TOTAL_RUNS
+
+
+class CurriculumStage(object):
+    def __init__(self, steps: int, runs: int, intensity: float = 1.0, burst: float = 1.0,
+                 generations: Optional[int] = None) -> None:
+        """
+        Episodes genomes are evaluated on for a number of generations
+
+        The traffic is the training traffic (see demandProfile.time_capture_profile) with only a
+        fraction of its random and burst passengers, so the last stage of a curriculum is usually
+        the full episodes, steps=TOTAL_STEPS and runs=TOTAL_RUNS at intensity and burst 1.
+
+        :param steps: ticks per run
+        :param runs: runs per genome, each on its own traffic
+        :param intensity: fraction of the random passengers kept
+        :param burst: fraction of the burst passengers kept
+        :param generations: generations of the stage, None to end it on the fitness spread only (or never, if last)
+        """
+        if not 0 <= intensity <= 1 or not 0 <= burst <= 1:
+            raise ValueError("Stage intensity and burst are fractions of the training traffic, between 0 and 1")
+        self.steps: int = steps
+        self.runs: int = runs
+        self.intensity: float = intensity
+        self.burst: float = burst
+        self.generations: Optional[int] = generations
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CurriculumStage":
+        """
+        Build a stage from plain data, e.g. loaded from JSON
+
+        :param data: keyword arguments of CurriculumStage
+        :return: CurriculumStage
+        """
+        return cls(**data)
+
+    def ticks(self) -> int:
+        """
+        Ticks simulated to evaluate one genome
+        """
+        return self.steps * self.runs
+
+    def isFull(self) -> bool:
+        """
+        Whether the stage evaluates on the full episodes of training without a curriculum
+        """
+        return (self.steps, self.runs, self.intensity, self.burst) == (TOTAL_STEPS, TOTAL_RUNS, 1.0, 1.0)
+
+    def __str__(self) -> str:
+        return f"{self.steps} steps x {self.runs} runs, traffic intensity {self.intensity:g}, burst {self.burst:g}"
+
+
+# the last stage is the episode of training without a curriculum, the earlier ones grow the episode length,
+# the runs and the traffic; at DEFAULT_BUSY_MULTIPLIER the burst rounds to no passengers (see
+# demandProfile.time_capture_profile), so growing it only changes busier traffic
+DEFAULT_CURRICULUM: tuple[CurriculumStage, ...] = (
+    CurriculumStage(100, 1, intensity=0.5, burst=0.0, generations=60),
+    CurriculumStage(200, 2, intensity=0.75, burst=0.5, generations=60),
+    CurriculumStage(TOTAL_STEPS, TOTAL_RUNS),
+)
+
+
+def load_curriculum(path: str) -> tuple[CurriculumStage, ...]:
+    """
+    Stages of a curriculum file, see the module docstring; "default" for DEFAULT_CURRICULUM
+    """
+    if path == "default":
+        return DEFAULT_CURRICULUM
+    with open(path, "r") as f:
+        return tuple(CurriculumStage.from_dict(stage) for stage in json.load(f))
+
+
+def fitness_spread(fitness: Sequence[float]) -> float:
+    """
+    Standard deviation of fitness values relative to their mean, inf when it cannot tell genomes apart
+    """
+    if len(fitness) < 2:
+        return float("inf")
+    mean = statistics.fmean(fitness)
+    return statistics.pstdev(fitness, mean) / abs(mean) if mean else float("inf")
+
+
+class CurriculumScheduler(BaseReporter):
+    def __init__(self, population, stages: Sequence[CurriculumStage] = DEFAULT_CURRICULUM,
+                 minSpread: Optional[float] = None) -> None:
+        """
+        Grow the episodes genomes are evaluated on, stage by stage
+
+        The stage is set on the configuration of the population (see train_neat.episode_shape)
+        at the start of every generation, and the evaluators pass it on to their workers. A stage
+        ends after its generations, or as soon as the fitness spread of the population falls below
+        minSpread: the episodes of the stage no longer tell its genomes apart. The last stage lasts
+        until training ends.
+
+        Fitness is normalised at every stage (see train_neat.fitness_scale), so species keep their
+        fitness history across stages. Population.run still returns the best genome of any stage;
+        best is the best genome evaluated at the last stage, the winner of a curriculum run.
+
+        :param population: neat.Population to schedule, add the scheduler to its reporters
+        :param stages: stages in order
+        :param minSpread: end a stage early once fitness_spread falls below this, None to follow the generations only
+        """
+        if not stages:
+            raise ValueError("A curriculum needs at least one stage")
+        for number, stage in enumerate(stages[:-1]):
+            if stage.generations is None and minSpread is None:
+                raise ValueError(f"Stage {number} of the curriculum never ends, give it generations or set minSpread")
+        self.population = population
+        self.stages: tuple[CurriculumStage, ...] = tuple(stages)
+        self.minSpread: Optional[float] = minSpread
+        self.stage: int = 0
+        self.stageGenerations: int = 0
+        # ticks simulated to evaluate the population so far, and what full episodes would have cost
+        self.ticks: int = 0
+        self.fullTicks: int = 0
+        self.best = None
+        population.config.curriculum_stage = self.stages[0]
+
+    def __getstate__(self) -> dict:
+        # snapshots reach the reporters through the species set, the population is saved on its own
+        state = self.__dict__.copy()
+        del state["population"]
+        return state
+
+    def getState(self) -> dict:
+        """
+        Progress through the curriculum, for checkpoints
+        """
+        return {"stage": self.stage, "stageGenerations": self.stageGenerations,
+                "ticks": self.ticks, "fullTicks": self.fullTicks, "best": self.best}
+
+    def setState(self, state: dict) -> None:
+        """
+        Continue from the progress saved by getState
+
+        :param state: result of getState
+        :return: None
+        """
+        self.stage = min(state["stage"], len(self.stages) - 1)
+        self.stageGenerations = state["stageGenerations"]
+        self.ticks = state["ticks"]
+        self.fullTicks = state["fullTicks"]
+        # progress saved before the best genome was kept
+        self.best = state.get("best")
+        self.population.config.curriculum_stage = self.stages[self.stage]
+
+    def start_generation(self, generation):
+        self.population.config.curriculum_stage = self.stages[self.stage]
+
+    def post_evaluate(self, config, population, species, best_genome):
+        self.ticks += len(population) * self.stages[self.stage].ticks()
+        self.fullTicks += len(population) * self.stages[-1].ticks()
+        self.stageGenerations += 1
+        if self.stage + 1 == len(self.stages):
+            if self.best is None or best_genome.fitness > self.best.fitness:
+                self.best = best_genome
+            return
+        stage = self.stages[self.stage]
+        if stage.generations is not None and self.stageGenerations >= stage.generations:
+            reason = f"after {self.stageGenerations} generations"
+        elif self.minSpread is not None and fitness_spread(
+                [genome.fitness for genome in population.values()]) < self.minSpread:
+            reason = f"after {self.stageGenerations} generations, fitness spread below {self.minSpread:g}"
+        else:
+            return
+        self.stage += 1
+        self.stageGenerations = 0
+        print(f"Curriculum stage {self.stage + 1}/{len(self.stages)} {reason}: {self.stages[self.stage]}, "
+              f"{self.ticks} ticks simulated so far, {self.fullTicks} with full episodes")
@@ -0,0 +1,277 @@
+import copy
+from typing import Union, Sequence, Optional
+
+import numpy as np
+
+from obtainPassenger import PassengerGenerator
+from trafficTrace import TrafficTrace
+
+from elevatorConstants import DEFAULT_BUSY_MULTIPLIER, RANDOM_SEED
+
+# floor -> relative weight, None for every floor with the same weight
+FloorWeights = Optional[dict[int, float]]
+
+
+class DemandPattern(object):
+    def __init__(self,
+                 rate: Union[float, Sequence[float]],
+                 origins: FloorWeights = None,
+                 destinations: FloorWeights = None,
+                 start: int = 0,
+                 end: Optional[int] = None,
+                 period: Optional[int] = None,
+                 poisson: bool = True,
+                 keep: float = 1.0) -> None:
+        """
+        One source of passengers: how many arrive per tick, when, and between which floors
+
+        :param rate: mean arrivals per active tick, or one rate per tick of the window
+        :param origins: origin floor weights, None for uniform
+        :param destinations: destination floor weights, None for uniform; the origin is never drawn, so every
+            origin the pattern can draw needs a weight on another floor
+        :param start: first active tick (within the period if one is given)
+        :param end: end of the active window (exclusive), None for no end
+        :param period: repeat the window every period ticks, None for a single window
+        :param poisson: draw Poisson arrival counts, else round(rate) passengers every active tick
+        :param keep: fraction of the drawn passengers kept, each one independently; thins traffic whose
+            rounded counts cannot be scaled down
+        """
+        self.rate: Union[float, Sequence[float]] = rate
+        self.origins: FloorWeights = origins
+        self.destinations: FloorWeights = destinations
+        self.start: int = start
+        self.end: Optional[int] = end
+        self.period: Optional[int] = period
+        self.poisson: bool = poisson
+        self.keep: float = keep
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DemandPattern":
+        """
+        Build a pattern from plain data, e.g. loaded from JSON (floor keys may be strings)
+
+        :param data: keyword arguments of DemandPattern
+        :return: DemandPattern
+        """
+        data = dict(data)
+        for key in ("origins", "destinations"):
+            if data.get(key) is not None:
+                data[key] = {int(floor): float(weight) for floor, weight in data[key].items()}
+        return cls(**data)
+
+    def rates(self, ticks: np.ndarray) -> np.ndarray:
+        """
+        Mean arrivals at the given ticks, 0 outside the active window
+
+        :param ticks: tick numbers
+        :return: float array, same shape as ticks
+        """
+        local = ticks % self.period if self.period is not None else ticks
+        end = self.end if self.end is not None else np.iinfo(np.int64).max
+        active = (local >= self.start) & (local < end)
+        if np.ndim(self.rate) == 0:
+            return np.where(active, float(self.rate), 0.0)
+        rate = np.asarray(self.rate, dtype=float)
+        index = np.clip(local - self.start, 0, len(rate) - 1)
+        return np.where(active & (local - self.start < len(rate)), rate[index], 0.0)
+
+
+def _probabilities(weights: FloorWeights, floorCount: int) -> Optional[np.ndarray]:
+    if weights is None:
+        return None
+    p = np.zeros(floorCount)
+    for floor, weight in weights.items():
+        p[floor] = weight
+    if p.sum() <= 0:
+        raise ValueError("Floor weights must have a positive total")
+    return p / p.sum()
+
+
+def _draw(pattern: DemandPattern, ticks: np.ndarray, floorCount: int, rng: np.random.Generator):
+    rates = pattern.rates(ticks)
+    if pattern.poisson:
+        counts = rng.poisson(rates)
+    else:
+        counts = np.rint(rates).astype(np.int64)
+    if pattern.keep < 1:
+        counts = rng.binomial(counts, pattern.keep)
+    arrivalTicks = np.repeat(ticks, counts)
+    count = len(arrivalTicks)
+
+    originP = _probabilities(pattern.origins, floorCount)
+    destinationP = _probabilities(pattern.destinations, floorCount)
+    if destinationP is not None:
+        support = np.arange(floorCount) if originP is None else np.flatnonzero(originP)
+        if np.any(destinationP.sum() - destinationP[support] <= 0):
+            raise ValueError("An origin floor of the pattern is its only destination")
+
+    origins = rng.choice(floorCount, count, p=originP)
+    if destinationP is None:
+        # uniform over the other floors, no rejection needed
+        destinations = (origins + rng.integers(1, floorCount, count)) % floorCount
+    else:
+        # destination weights of every origin without the origin itself
+        destinations = np.empty(count, dtype=np.int64)
+        for origin in np.unique(origins):
+            drawn = origins == origin
+            p = destinationP.copy()
+            p[origin] = 0.0
+            destinations[drawn] = rng.choice(floorCount, np.count_nonzero(drawn), p=p / p.sum())
+    return arrivalTicks, origins, destinations
+
+
+class DemandProfile(object):
+    def __init__(self, patterns: Sequence[DemandPattern]) -> None:
+        """
+        Traffic of a building as a list of demand patterns, generated with NumPy
+
+        :param patterns: DemandPattern objects, their arrivals add up
+        """
+        self.patterns: list[DemandPattern] = list(patterns)
+
+    @classmethod
+    def from_dict(cls, data: Sequence[dict]) -> "DemandProfile":
+        """
+        Build a profile from plain data, one dict per pattern
+
+        :param data: list of DemandPattern keyword arguments
+        :return: DemandProfile
+        """
+        return cls([DemandPattern.from_dict(pattern) for pattern in data])
+
+    def sample(self, floorCount: int, start: int, end: int, rng: np.random.Generator) -> TrafficTrace:
+        """
+        Draw the arrivals of ticks [start, end) in one call
+
+        :param floorCount: floor count of the building
+        :param start: first tick
+        :param end: last tick (exclusive)
+        :param rng: NumPy random generator
+        :return: TrafficTrace of length end, holding arrivals of [start, end) only
+        """
+        ticks = np.arange(start, end)
+        drawn = [_draw(pattern, ticks, floorCount, rng) for pattern in self.patterns]
+        return TrafficTrace(np.concatenate([d[0] for d in drawn]).astype(np.int32),
+                            np.concatenate([d[1] for d in drawn]).astype(np.int32),
+                            np.concatenate([d[2] for d in drawn]).astype(np.int32),
+                            end, floorCount)
+
+    def generate(self, floorCount: int, length: int, seed: int = RANDOM_SEED) -> TrafficTrace:
+        """
+        Draw a whole episode
+
+        :param floorCount: floor count of the building
+        :param length: number of ticks in the episode
+        :param seed: seed of the NumPy random generator
+        :return: TrafficTrace
+        """
+        return self.sample(floorCount, 0, length, np.random.default_rng(seed))
+
+
+class ProfilePassengerGenerator(PassengerGenerator):
+    def __init__(self,
+                 profile: DemandProfile,
+                 floorCount: int,
+                 seed: int = RANDOM_SEED,
+                 blockSize: int = 1000) -> None:
+        """
+        PassengerGenerator drawing blocks of ticks from a DemandProfile
+
+        :param profile: DemandProfile of the building
+        :param floorCount: floor count of the building
+        :param seed: seed of the NumPy random generator
+        :param blockSize: number of ticks drawn per call to the profile
+        """
+        super().__init__(floorCount, seed=seed)
+        self.profile: DemandProfile = profile
+        self.blockSize: int = blockSize
+        self.rng: np.random.Generator = np.random.default_rng(seed)
+        self.block: Optional[TrafficTrace] = None
+        self.blockStart: int = 0
+
+    def getState(self) -> tuple:
+        # the drawn block is never modified, so it is shared rather than copied
+        return self.rng.bit_generator.state, self.block, self.blockStart
+
+    def setState(self, state: tuple) -> None:
+        self.rng.bit_generator.state, self.block, self.blockStart = state
+
+    def fork(self) -> "ProfilePassengerGenerator":
+        clone = copy.copy(self)
+        clone.rng = copy.deepcopy(self.rng)
+        return clone
+
+    def _blockOf(self, time: int) -> TrafficTrace:
+        # draw the block holding time unless it is the current one
+        if self.block is None or not self.blockStart <= time < self.block.length:
+            self.blockStart = time - time % self.blockSize
+            self.block = self.profile.sample(self.floorCount, self.blockStart,
+                                             self.blockStart + self.blockSize, self.rng)
+        return self.block
+
+    def obtainTrips(self, time: int) -> tuple[list[int], list[int]]:
+        origins, destinations = self._blockOf(time).arrivals(time)
+        return origins.tolist(), destinations.tolist()
+
+    def nextArrival(self, time: int) -> Optional[int]:
+        # the next arrival of the block holding time, or the start of the next block, which is not drawn yet;
+        # drawing the block here gives the same passengers as obtainTrips
+        block = self._blockOf(time)
+        index = int(block.offsets[time])
+        if index < len(block):
+            return int(block.ticks[index])
+        return block.length
+
+
+def uniform_profile(floorCount: int, busyMultiplier: float = DEFAULT_BUSY_MULTIPLIER) -> DemandProfile:
+    """
+    Random traffic between any two floors, as RandomPassengerGenerator
+    """
+    return DemandProfile([DemandPattern(busyMultiplier * floorCount)])
+
+
+def time_capture_profile(floorCount: int, busyMultiplier: float = DEFAULT_BUSY_MULTIPLIER,
+                         intensity: float = 1.0, burst: float = 1.0) -> DemandProfile:
+    """
+    Random traffic with a burst from floor 3 to floor 1 in the last 5 ticks of every 50, as TimeCapture
+
+    :param floorCount: floor count of the building
+    :param busyMultiplier: traffic intensity, as TimeCapture
+    :param intensity: fraction of the random passengers kept
+    :param burst: fraction of the burst passengers kept
+    """
+    return DemandProfile([
+        DemandPattern(round(busyMultiplier * floorCount), start=0, end=45, period=50, poisson=False,
+                      keep=intensity),
+        DemandPattern(round(busyMultiplier * 5), origins={3: 1.0}, destinations={1: 1.0},
+                      start=45, end=50, period=50, poisson=False, keep=burst),
+    ])
+
+
+def office_day_profile(floorCount: int,
+                       dayLength: int,
+                       busyMultiplier: float = DEFAULT_BUSY_MULTIPLIER,
+                       peakFactor: float = 4.0) -> DemandProfile:
+    """
+    Office day over dayLength ticks: background inter-floor traffic, a morning up-peak
+    from the lobby, a lunch peak to and from the lobby and an evening down-peak to the lobby
+
+    :param floorCount: floor count of the building
+    :param dayLength: number of ticks in a day, the profile repeats every day
+    :param busyMultiplier: background arrivals per floor and tick
+    :param peakFactor: peak arrival rate relative to the background
+    """
+    base = busyMultiplier * floorCount
+    lobby = {0: 1.0}
+    upper = {floor: 1.0 for floor in range(1, floorCount)}
+
+    def window(fromFraction: float, toFraction: float) -> dict:
+        return {"start": int(fromFraction * dayLength), "end": int(toFraction * dayLength), "period": dayLength}
+
+    return DemandProfile([
+        DemandPattern(base),
+        DemandPattern(base * peakFactor, origins=lobby, destinations=upper, **window(0.10, 0.20)),
+        DemandPattern(base * peakFactor / 2, origins=upper, destinations=lobby, **window(0.45, 0.50)),
+        DemandPattern(base * peakFactor / 2, origins=lobby, destinations=upper, **window(0.50, 0.55)),
+        DemandPattern(base * peakFactor, origins=upper, destinations=lobby, **window(0.80, 0.90)),
+    ])
@@ -0,0 +1,331 @@
+"""
+Real-time dispatch: an asyncio service that drives the elevators of many buildings with one genome.
+
+Usage:
+    python dispatchService.py serve winner.pkl --listen 0.0.0.0:7000                  (service)
+    python dispatchService.py load 127.0.0.1:7000 --buildings 300 --steps 600 --tick 0.1  (load generator)
+    python dispatchService.py load --genome winner.pkl --buildings 300                   (both in one process)
+
+Every building keeps a TCP connection to the service. On connect the service sends one JSON line
+describing the building it expects ({"floors", "elevators", "controller", "observation"}); then, once
+per tick, the building sends its observation (Floors.observe, or Floors.observeLocal for a local
+controller) as little-endian float64 and receives its actions: one int8 direction per elevator
+(1 up, 0 idle, -1 down) followed by one uint8 take in per elevator.
+
+Requests that arrive within batch_window seconds of each other are evaluated in one batched network
+pass (train_neat.network_actions), so the cost of a pass is shared by all the buildings in it. The
+decision latency, from receiving a request to sending its actions, is kept in a WaitHistogram of
+microseconds.
+"""
+import argparse
+import asyncio
+import json
+import pickle
+import random
+import time
+from typing import Optional
+
+import numpy as np
+
+import train_neat
+from compiledNetwork import compile_genome
+from distributedEval import parse_address
+from demandProfile import ProfilePassengerGenerator, time_capture_profile
+from floor import Floors
+from serviceStats import WaitHistogram
+
+from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, RANDOM_SEED
+
+DEFAULT_BATCH_WINDOW: float = 0.002  # seconds a request waits for others to share its network pass
+DEFAULT_MAX_BATCH: int = 512  # buildings evaluated in one pass at most
+DEFAULT_PORT: int = 7000
+
+
+def latency_summary(histogram: WaitHistogram) -> dict[str, float]:
+    """
+    Count, mean, p50, p99 and max of a latency histogram of microseconds, in milliseconds
+    """
+    summary = histogram.summary()
+    return {"count": summary["count"], **{key: summary[key] / 1000 for key in ("mean", "p50", "p99", "max")}}
+
+
+class DispatchService(object):
+    def __init__(self, genome, config, batchWindow: float = DEFAULT_BATCH_WINDOW,
+                 maxBatch: int = DEFAULT_MAX_BATCH) -> None:
+        """
+        Decide the actions of buildings with one genome, batching requests that arrive close together
+
+        :param genome: genome to drive the elevators with
+        :param config: NEAT configuration of the genome, gives the building size and controller
+        :param batchWindow: seconds the first request of a batch waits for more, 0 to evaluate on the next loop turn
+        :param maxBatch: a batch is evaluated as soon as it holds this many requests
+        """
+        self.config = config
+        self.net = compile_genome(genome, config)
+        self.batchWindow: float = batchWindow
+        self.maxBatch: int = maxBatch
+        self.observationShape: tuple[int, ...] = train_neat.observation_buffer(config, 1).shape[1:]
+        self.latency: WaitHistogram = WaitHistogram()
+        self.batches: int = 0
+        self.decisions: int = 0
+        self.connections: int = 0
+        self._pending: list[tuple[np.ndarray, asyncio.Future]] = []
+        self._flushHandle: Optional[asyncio.TimerHandle] = None
+
+    @property
+    def header(self) -> dict:
+        """
+        Description of the building the service expects, sent to every connection
+        """
+        floors, elevators = train_neat.building_size(self.config)
+        return {"floors": floors, "elevators": elevators, "controller": train_neat.controller_mode(self.config),
+                "observation": list(self.observationShape)}
+
+    async def decide(self, observation: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Actions for one building, evaluated in a batch with the other requests of the window
+
+        :param observation: array of shape observationShape
+        :return: directions (int8, 1 up, 0 idle, -1 down) and take ins (bool), one per elevator
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((observation, future))
+        if len(self._pending) >= self.maxBatch:
+            self._flush()
+        elif self._flushHandle is None:
+            self._flushHandle = loop.call_later(self.batchWindow, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flushHandle is not None:
+            self._flushHandle.cancel()
+            self._flushHandle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        try:
+            directions, take_ins = train_neat.network_actions(self.net, self.config,
+                                                              np.stack([observation for observation, _ in pending]))
+        except Exception as error:
+            for _, future in pending:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        directions = np.sign(directions).astype(np.int8)
+        for i, (_, future) in enumerate(pending):
+            # the building may have disconnected while waiting
+            if not future.done():
+                future.set_result((directions[i], take_ins[i]))
+        self.batches += 1
+        self.decisions += len(pending)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serve one building connection until it closes, see the module docstring for the protocol
+        """
+        size = 8 * int(np.prod(self.observationShape))
+        self.connections += 1
+        try:
+            writer.write(json.dumps(self.header).encode() + b"\n")
+            await writer.drain()
+            while True:
+                data = await reader.readexactly(size)
+                start = time.perf_counter()
+                observation = np.frombuffer(data, dtype="<f8").reshape(self.observationShape)
+                directions, take_ins = await self.decide(observation)
+                writer.write(directions.tobytes() + take_ins.astype(np.uint8).tobytes())
+                self.latency.add(int((time.perf_counter() - start) * 1e6))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # building gone
+            pass
+        finally:
+            self.connections -= 1
+            writer.close()
+
+    async def start(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        """
+        Listen for buildings
+
+        :param host: address to listen on
+        :param port: port to listen on, 0 for one chosen by the system
+        :return: the asyncio server, close it to stop
+        """
+        return await asyncio.start_server(self.handle, host, port)
+
+    def report(self) -> dict:
+        """
+        Connections, decisions, batches and decision latency in milliseconds so far
+        """
+        return {"connections": self.connections, "decisions": self.decisions, "batches": self.batches,
+                "mean_batch": self.decisions / self.batches if self.batches else 0.0,
+                "latency_ms": latency_summary(self.latency)}
+
+
+async def run_building(host: str, port: int, floors: Floors, steps: int, tick: float = 0.0,
+                       latency: Optional[WaitHistogram] = None) -> int:
+    """
+    Drive a simulated building with the actions of a DispatchService
+
+    :param host: address of the service
+    :param port: port of the service
+    :param floors: building to drive, of the size the service expects
+    :param steps: ticks to simulate
+    :param tick: seconds between the start of two ticks, 0 to run as fast as the service answers
+    :param latency: WaitHistogram of round trip times in microseconds to add to, None to disable
+    :return: total wait time of the building
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        header = json.loads(await reader.readline())
+        size = (len(floors.getWaitingCounts()), len(floors.getElevatorLocation()))
+        if (header["floors"], header["elevators"]) != size:
+            raise ValueError(f"Service expects {header['floors']} floors and {header['elevators']} elevators, "
+                             f"the building has {size[0]} and {size[1]}")
+        local = header["controller"] == "local"
+        elevators = size[1]
+        observation = np.empty(header["observation"])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time()
+        for _ in range(steps):
+            if local:
+                floors.observeLocal(observation)
+            else:
+                floors.observe(observation)
+            start = time.perf_counter()
+            writer.write(observation.astype("<f8", copy=False).tobytes())
+            data = await reader.readexactly(2 * elevators)
+            if latency is not None:
+                latency.add(int((time.perf_counter() - start) * 1e6))
+            floors.applyActions(np.frombuffer(data[:elevators], dtype=np.int8),
+                                np.frombuffer(data[elevators:], dtype=np.uint8))
+            floors.next()
+            if tick > 0:
+                deadline += tick
+                await asyncio.sleep(max(0.0, deadline - loop.time()))
+    finally:
+        writer.close()
+        await writer.wait_closed()
+    return floors.totalWaitTime
+
+
+async def run_load(host: str, port: int, buildings: int, steps: int, tick: float = 0.0,
+                   floors: int = DEFAULT_ELEVATOR_FLOOR, elevators: int = DEFAULT_ELEVATOR_COUNT,
+                   seed: int = RANDOM_SEED) -> dict:
+    """
+    Drive many simulated buildings against a DispatchService at once
+
+    Every building has its own traffic, drawn from the training profile with seed + its number,
+    and starts at a random offset within the first tick so the requests spread over time.
+
+    :param host: address of the service
+    :param port: port of the service
+    :param buildings: number of buildings
+    :param steps: ticks each building simulates
+    :param tick: seconds between two ticks of a building, 0 to run as fast as the service answers
+    :param floors: floor count of every building
+    :param elevators: elevator count of every building
+    :param seed: traffic seed of the first building
+    :return: buildings, decisions, seconds, decisions per second, round trip latency in milliseconds and wait times
+    """
+    latency = WaitHistogram()
+    offsets = random.Random(seed)
+
+    async def building(number: int) -> int:
+        await asyncio.sleep(offsets.random() * tick)
+        generator = ProfilePassengerGenerator(time_capture_profile(floors), floors, seed + number)
+        return await run_building(host, port, Floors(passengerGenerator=generator, elevatorCount=elevators,
+                                                     floorCount=floors), steps, tick, latency)
+
+    start = time.perf_counter()
+    waits = await asyncio.gather(*(building(number) for number in range(buildings)))
+    elapsed = time.perf_counter() - start
+    return {"buildings": buildings, "decisions": latency.count, "seconds": elapsed,
+            "decisions_per_second": latency.count / elapsed, "latency_ms": latency_summary(latency),
+            "total_wait": sum(waits), "mean_wait": sum(waits) / buildings}
+
+
+def print_report(title: str, report: dict) -> None:
+    latency = report["latency_ms"]
+    details = ", ".join(f"{key} {value:.1f}" if isinstance(value, float) else f"{key} {value}"
+                        for key, value in report.items() if key != "latency_ms")
+    print(f"{title}: {details}; latency p50 {latency['p50']:.2f} ms, p99 {latency['p99']:.2f} ms, "
+          f"max {latency['max']:.2f} ms")
+
+
+async def serve(service: DispatchService, host: str, port: int, reportEvery: float) -> None:
+    server = await service.start(host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Dispatching for buildings on {address[0]}:{address[1]}")
+    async with server:
+        while True:
+            await asyncio.sleep(reportEvery)
+            print_report("Service", service.report())
+
+
+async def local_load(service: DispatchService, args: argparse.Namespace) -> None:
+    server = await service.start("127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        result = await run_load("127.0.0.1", port, args.buildings, args.steps, args.tick,
+                                args.floors, args.elevators, args.seed)
+    print_report("Buildings", result)
+    print_report("Service", service.report())
+
+
+def load_service(path: str, args: argparse.Namespace) -> DispatchService:
+    with open(path, "rb") as f:
+        genome = pickle.load(f)
+    config = train_neat.load_config(floors=args.floors, elevators=args.elevators, controller=args.controller)
+    return DispatchService(genome, config, args.batch_window, args.max_batch)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Drive the elevators of many buildings with a trained genome")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run the dispatch service")
+    serve_parser.add_argument("genome", help="pickled genome, e.g. winner.pkl")
+    serve_parser.add_argument("--listen", default=f"127.0.0.1:{DEFAULT_PORT}", help="host:port to listen on")
+    serve_parser.add_argument("--report-every", type=float, default=10.0, help="seconds between latency reports")
+
+    load_parser = commands.add_parser("load", help="simulate many buildings driven by a dispatch service")
+    load_parser.add_argument("address", nargs="?", help="service host:port, omit with --genome")
+    load_parser.add_argument("--genome", help="run a service for this pickled genome in the same process instead")
+    load_parser.add_argument("--buildings", type=int, default=100, help="concurrent buildings")
+    load_parser.add_argument("--steps", type=int, default=train_neat.TOTAL_STEPS, help="ticks per building")
+    load_parser.add_argument("--tick", type=float, default=0.1, help="seconds per tick, 0 for as fast as possible")
+    load_parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="traffic seed of the first building")
+
+    for command in (serve_parser, load_parser):
+        command.add_argument("--floors", type=int, default=DEFAULT_ELEVATOR_FLOOR, help="floor count of a building")
+        command.add_argument("--elevators", type=int, default=DEFAULT_ELEVATOR_COUNT,
+                             help="elevator count of a building")
+        command.add_argument("--controller", choices=["global", "local"], default="global",
+                             help="controller the genome was trained as")
+        command.add_argument("--batch-window", type=float, default=DEFAULT_BATCH_WINDOW,
+                             help="seconds a request waits for others to share its network pass")
+        command.add_argument("--max-batch", type=int, default=DEFAULT_MAX_BATCH, help="requests per pass at most")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "serve":
+            service = load_service(args.genome, args)
+            try:
+                asyncio.run(serve(service, *parse_address(args.listen), args.report_every))
+            finally:
+                print_report("Service", service.report())
+        elif args.genome is not None:
+            asyncio.run(local_load(load_service(args.genome, args), args))
+        elif args.address is None:
+            parser.error("load needs the address of a service or --genome")
+        else:
+            print_report("Buildings", asyncio.run(run_load(*parse_address(args.address), args.buildings, args.steps,
+                                                           args.tick, args.floors, args.elevators, args.seed)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
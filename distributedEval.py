@@ -0,0 +1,261 @@
+"""
+Genome evaluation on worker processes of other machines, over TCP.
+
+Usage:
+    python train_neat.py --listen 0.0.0.0:6000 --authkey SECRET                              (coordinator)
+    python distributedEval.py worker coordinator-host:6000 --authkey SECRET --processes 8    (every worker host)
+
+The coordinator (train_neat.run_neat with listen set) accepts workers at any time. A worker gets the
+NEAT configuration once when it connects, then batches of genomes with their traffic seed and
+curriculum stage, and sends back their fitness. Workers send heartbeats while they work; a worker
+that disconnects or misses HEARTBEAT_TIMEOUT seconds of heartbeats is dropped and its batch goes
+back in the queue.
+
+Messages are pickled (multiprocessing.connection) and connections are authenticated with the
+authkey, so only run workers and coordinators that trust each other. All hosts need the same
+version of this code and of neat-python.
+"""
+import argparse
+import itertools
+import multiprocessing
+import os
+import queue
+import socket
+import threading
+import time
+import traceback
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Optional
+
+import train_neat
+from fitnessCache import FitnessCache
+
+HEARTBEAT_INTERVAL: float = 2.0  # seconds between heartbeats of a worker
+HEARTBEAT_TIMEOUT: float = 10.0  # seconds of silence before a worker is dropped
+BATCHES_PER_WORKER: int = 4  # default batch size splits a generation into this many batches per worker
+AUTHKEY_ENV: str = "ELEVATOR_AUTHKEY"
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """
+    "host:port" as a (host, port) address
+    """
+    host, port = address.rsplit(":", 1)
+    return host, int(port)
+
+
+class RemoteGenomeEvaluator(train_neat.BatchGenomeEvaluator):
+    def __init__(self, address: tuple[str, int], authkey: bytes, config, seed: Optional[int] = None,
+                 batch_size: Optional[int] = None, cache: Optional[FitnessCache] = None) -> None:
+        """
+        Evaluate genomes on workers that connect over TCP, see the module docstring
+
+        Every generation is split into batches of genomes that share one message each way. Workers
+        take a batch at a time from a common queue, so faster workers take more batches.
+
+        :param address: (host, port) to listen on
+        :param authkey: key workers must know to connect
+        :param config: NEAT configuration, sent to every worker when it connects
+        :param seed: traffic seed, same fitness as evaluate_genomes with this seed; None draws one per generation
+        :param batch_size: genomes per message, None for BATCHES_PER_WORKER batches per connected worker
+        :param cache: FitnessCache checked before sending a genome out, None to disable
+        """
+        super().__init__(seed, cache)
+        self.config = config
+        self.batch_size: Optional[int] = batch_size
+        self.listener: Listener = Listener(address, authkey=authkey)
+        # the port is chosen by the system when address has port 0
+        self.address: tuple[str, int] = self.listener.address
+        self.workers: dict[str, Connection] = {}
+        self._queue: queue.Queue = queue.Queue()
+        self._results: queue.Queue = queue.Queue()
+        self._batch_ids = itertools.count()
+        self._lock: threading.Lock = threading.Lock()
+        self._closed: threading.Event = threading.Event()
+        threading.Thread(target=self._accept, name="coordinator-accept", daemon=True).start()
+        print(f"Waiting for workers on {self.address[0]}:{self.address[1]}")
+
+    def _accept(self) -> None:
+        while not self._closed.is_set():
+            try:
+                conn = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                # closed listener, or a client that failed authentication
+                if self._closed.is_set():
+                    return
+                continue
+            threading.Thread(target=self._serve, args=(conn,), name="coordinator-worker", daemon=True).start()
+
+    def _serve(self, conn: Connection) -> None:
+        # one thread per worker connection: hand out batches, collect results, watch heartbeats
+        batch = None
+        try:
+            _, host, pid = conn.recv()
+            name = f"{host}:{pid}"
+            conn.send(("config", self.config))
+            with self._lock:
+                self.workers[name] = conn
+            print(f"Worker {name} connected, {len(self.workers)} workers")
+            last_seen = time.monotonic()
+            while not self._closed.is_set():
+                if batch is None:
+                    try:
+                        batch = self._queue.get(timeout=HEARTBEAT_INTERVAL)
+                    except queue.Empty:
+                        pass
+                    else:
+                        conn.send(("evaluate", *batch))
+                # results and heartbeats, wait for them only while the worker has a batch
+                timeout = HEARTBEAT_INTERVAL if batch is not None else 0
+                while conn.poll(timeout):
+                    message = conn.recv()
+                    last_seen = time.monotonic()
+                    if message[0] in ("result", "error"):
+                        self._results.put(message)
+                        batch = None
+                        break
+                    timeout = 0
+                if time.monotonic() - last_seen > HEARTBEAT_TIMEOUT:
+                    print(f"Worker {name} missed its heartbeats, dropping it")
+                    break
+            else:
+                conn.send(("stop",))
+        except (OSError, EOFError):
+            pass
+        finally:
+            if batch is not None:
+                self._queue.put(batch)
+            with self._lock:
+                for name, worker in list(self.workers.items()):
+                    if worker is conn:
+                        del self.workers[name]
+                        print(f"Worker {name} left, {len(self.workers)} workers")
+            conn.close()
+
+    def evaluate_batch(self, genomes: list, config, seed: int) -> list[float]:
+        size = self.batch_size or max(1, -(-len(genomes) // (BATCHES_PER_WORKER * max(1, len(self.workers)))))
+        batches: dict[int, int] = {}
+        for start in range(0, len(genomes), size):
+            batch_id = next(self._batch_ids)
+            batches[batch_id] = start
+            self._queue.put((batch_id, seed, train_neat.curriculum_stage(config),
+                             [genome for _, genome in genomes[start:start + size]]))
+
+        fitness: list[Optional[float]] = [None] * len(genomes)
+        done: set[int] = set()
+        while len(done) < len(batches):
+            try:
+                kind, batch_id, payload = self._results.get(timeout=60)
+            except queue.Empty:
+                if not self.workers:
+                    print("No workers connected, waiting")
+                continue
+            if batch_id not in batches or batch_id in done:
+                continue
+            if kind == "error":
+                # the batch would fail again elsewhere, give up on the generation
+                self._drain()
+                raise RuntimeError(f"Worker failed to evaluate a batch:\n{payload}")
+            start = batches[batch_id]
+            fitness[start:start + len(payload)] = payload
+            done.add(batch_id)
+        return fitness
+
+    def _drain(self) -> None:
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self) -> None:
+        """
+        Stop the workers and the listener
+        """
+        self._closed.set()
+        self._drain()
+        deadline = time.monotonic() + 2 * HEARTBEAT_INTERVAL
+        while self.workers and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.listener.close()
+
+
+def run_worker(address: tuple[str, int], authkey: bytes, retry: float = 30.0) -> None:
+    """
+    Evaluate batches for a coordinator until it stops or disconnects
+
+    :param address: (host, port) of the coordinator
+    :param authkey: key of the coordinator
+    :param retry: seconds to keep trying to connect
+    :return: None
+    """
+    deadline = time.monotonic() + retry
+    while True:
+        try:
+            conn = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1.0)
+
+    send_lock = threading.Lock()
+    stopped = threading.Event()
+
+    def send(message) -> None:
+        with send_lock:
+            conn.send(message)
+
+    def heartbeat() -> None:
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                send(("heartbeat",))
+            except OSError:
+                return
+
+    try:
+        conn.send(("hello", socket.gethostname(), os.getpid()))
+        _, config = conn.recv()
+        threading.Thread(target=heartbeat, name="worker-heartbeat", daemon=True).start()
+        while True:
+            message = conn.recv()
+            if message[0] == "stop":
+                break
+            _, batch_id, seed, stage, genomes = message
+            config.curriculum_stage = stage
+            try:
+                send(("result", batch_id, [train_neat.evaluate_genome(genome, config, seed) for genome in genomes]))
+            except Exception:
+                send(("error", batch_id, traceback.format_exc()))
+    except (EOFError, OSError):
+        # coordinator gone
+        pass
+    finally:
+        stopped.set()
+        conn.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate genomes for a train_neat coordinator")
+    commands = parser.add_subparsers(dest="command", required=True)
+    worker = commands.add_parser("worker", help="connect worker processes to a coordinator")
+    worker.add_argument("address", help="coordinator host:port")
+    worker.add_argument("--authkey", default=os.environ.get(AUTHKEY_ENV),
+                        help=f"key of the coordinator (default: ${AUTHKEY_ENV})")
+    worker.add_argument("--processes", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    worker.add_argument("--retry", type=float, default=30.0, help="seconds to keep trying to connect")
+    args = parser.parse_args()
+    if not args.authkey:
+        parser.error(f"an authkey is required, use --authkey or ${AUTHKEY_ENV}")
+
+    address, authkey = parse_address(args.address), args.authkey.encode()
+    processes = [multiprocessing.Process(target=run_worker, args=(address, authkey, args.retry))
+                 for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,26 +1,137 @@
-from typing import Literal, Iterable
+from typing import Literal, Iterable, Iterator, Optional
 
-from passenger import Passenger
+from floorQueue import FloorQueue
+from passenger import Clock
+from passengerPool import PassengerPool, PassengerView
+from serviceStats import ServiceStats
 
 from elevatorConstants import DEFAULT_ELEVATOR_CAPACITY, UNLOADING_TIME, DEFAULT_ELEVATOR_FLOOR
 
 
-class Elevator(set[Passenger]):
+class Elevator(object):
     def __init__(self,
                  capacity: int = DEFAULT_ELEVATOR_CAPACITY,
-                 max_floor: int = DEFAULT_ELEVATOR_FLOOR) -> None:
+                 max_floor: int = DEFAULT_ELEVATOR_FLOOR,
+                 clock: Optional[Clock] = None,
+                 pool: Optional[PassengerPool] = None,
+                 stats: Optional[ServiceStats] = None,
+                 number: int = 0) -> None:
         """
         Initialize the elevator
 
         :param capacity: The capacity of the elevator
         :param max_floor: The maximum floor number
+        :param clock: Clock of the building, None for a standalone elevator that keeps its own time
+        :param pool: PassengerPool of the building, None for a standalone elevator that keeps its own
+        :param stats: ServiceStats counting the waits and rides of passengers leaving, None to disable
+        :param number: number of the elevator in the building, for stats
         """
-        super().__init__()
         self.capacity: int = capacity
         self.elevator_direction: str = "idle"
         self.current_floor: int = 0
         self.holdingTime: int = 0
         self.max_floor: int = max_floor
+        self.owns_clock: bool = clock is None
+        self.clock: Clock = Clock() if clock is None else clock
+        self.pool: PassengerPool = PassengerPool(self.clock) if pool is None else pool
+        self.stats: Optional[ServiceStats] = stats
+        self.number: int = number
+        # numbers of the riders, grouped by destination floor
+        self._riders: dict[int, list[int]] = {}
+        self._riderCount: int = 0
+
+    def __len__(self) -> int:
+        return self._riderCount
+
+    def __contains__(self, passenger: int) -> bool:
+        return passenger in self._riders.get(self.pool.destination[passenger], ())
+
+    def __iter__(self) -> Iterator[int]:
+        for riders in self._riders.values():
+            yield from riders
+
+    def passengers(self) -> list[PassengerView]:
+        """
+        Get the riders as objects
+
+        :return: list of PassengerView
+        """
+        return [self.pool.view(passenger) for passenger in self]
+
+    def add(self, passenger: int) -> None:
+        """
+        Put a passenger in the car
+
+        :param passenger: passenger number in the pool
+        :return: None
+        """
+        destination = self.pool.destination[passenger]
+        riders = self._riders.get(destination)
+        if riders is None:
+            self._riders[destination] = [passenger]
+        else:
+            riders.append(passenger)
+        self._riderCount += 1
+        self.pool.board(passenger)
+
+    def remove(self, passenger: int) -> None:
+        """
+        Take a passenger out of the car, it stays in the pool
+
+        :param passenger: passenger number of a rider
+        :return: None
+        """
+        destination = self.pool.destination[passenger]
+        riders = self._riders[destination]
+        riders.remove(passenger)
+        if not riders:
+            del self._riders[destination]
+        self._riderCount -= 1
+
+    def clear(self) -> None:
+        """
+        Empty the car, the riders leave the pool
+
+        :return: None
+        """
+        for passenger in self:
+            self.pool.release(passenger)
+        self._riders.clear()
+        self._riderCount = 0
+
+    def snapshot(self) -> tuple:
+        """
+        Position, direction, holding time and riders, for restore()
+        """
+        return (self.current_floor, self.elevator_direction, self.holdingTime, self._riderCount,
+                tuple((destination, tuple(riders)) for destination, riders in self._riders.items()))
+
+    def restore(self, snapshot: tuple) -> None:
+        """
+        Return to the state of a snapshot, the pool is restored separately
+
+        :param snapshot: result of snapshot()
+        :return: None
+        """
+        self.current_floor, self.elevator_direction, self.holdingTime, self._riderCount, riders = snapshot
+        self._riders = {destination: list(numbers) for destination, numbers in riders}
+
+    def copy(self, clock: Clock, pool: PassengerPool) -> "Elevator":
+        """
+        Independent copy of the elevator, without stats
+
+        :param clock: Clock of the copy
+        :param pool: PassengerPool of the copy, holding the riders
+        :return: Elevator
+        """
+        clone = Elevator.__new__(Elevator)
+        clone.__dict__.update(self.__dict__)
+        clone.owns_clock = self.owns_clock
+        clone.clock = clock
+        clone.pool = pool
+        clone.stats = None
+        clone._riders = {destination: riders[:] for destination, riders in self._riders.items()}
+        return clone
 
     def set_direction(self, direction: Literal["up", "down", "idle"]) -> None:
         """
@@ -31,65 +142,81 @@ class Elevator(set[Passenger]):
         """
         self.elevator_direction = direction
 
-    def add_passenger(self, passenger: Passenger) -> bool:
+    def add_passenger(self, passenger: int) -> bool:
         """
         Add passenger to the elevator
 
-        :param passenger: Passenger object
-        :return: bool: True if passenger is added, else False
+        :param passenger: passenger number in the pool
+        :return: bool: True if the passenger leaves the floor (boarding if going the elevator's way), else False
         """
         if len(self) < self.capacity:
-            if self.elevator_direction ==  passenger.press():
+            if self.elevator_direction == self.pool.press(passenger):
                 self.add(passenger)
             return True
         return False
 
-    def add_passengers(self, passengers_floor: set[Passenger]) -> None:
+    def add_passengers(self, passengers_floor: FloorQueue) -> list[int]:
         """
-        Add passengers to the elevator
+        Add passengers to the elevator, in the order they arrived on the floor
 
-        :param passengers_floor: list of Passenger objects
-        :return: None
-        """
-        passengers_to_remove = []
-        for passenger in passengers_floor:
-            if self.add_passenger(passenger):
-                passengers_to_remove.append(passenger)
+        Passengers are removed from the floor until the car is full; those going the
+        elevator's way board and the others leave the pool without boarding, see FloorQueue.take.
 
-        for passenger in passengers_to_remove:
-            passengers_floor.remove(passenger)
+        :param passengers_floor: FloorQueue of the current floor
+        :return: numbers of the passengers removed from the floor, those that boarded first
+        """
+        boarded, left = passengers_floor.take(self.elevator_direction, self.capacity - len(self))
+        for passenger in boarded:
+            self.add(passenger)
+        pool = self.pool
+        if self.stats is not None:
+            for passenger in left:
+                self.stats.recordDropped(pool.origin[passenger], self.clock.time - pool.arrivalTime[passenger])
+        for passenger in left:
+            pool.release(passenger)
 
         self.holdingTime += UNLOADING_TIME
+        return boarded + left
 
-    def get_internal_requests(self) -> set:
+    def get_internal_requests(self) -> Iterator[int]:
         """
         Get the internal requests of the elevator
 
-        :return: set of floor numbers
+        :return: destination floor of every rider
         """
-        for passenger in self:
-            yield passenger.destination
+        for destination, riders in self._riders.items():
+            for _ in riders:
+                yield destination
 
-    def next(self):
+    def next(self) -> int:
         """
         Drop off passengers or move to the next floor
-        Add wait for passengers
+        Riders wait through the clock; only those leaving at the new floor are visited
 
-        :return: str: total wait time of passengers
+        :return: int: number of passengers dropped off
         """
-        for passenger in self:
-            passenger.wait()
+        dropped = 0
         if self.holdingTime > 0:
             self.holdingTime -= 1
-            return
-        if self.elevator_direction == "up" and self.current_floor < self.max_floor - 1:
-            self.current_floor += 1
-        elif self.elevator_direction == "down" and self.current_floor > 0:
-            self.current_floor -= 1
-        doContinue = True
-        for passenger in list(self):
-            if passenger.destination == self.current_floor:
-                self.remove(passenger)
-                doContinue = False
-        if not doContinue:
-            self.holdingTime = UNLOADING_TIME
+        else:
+            if self.elevator_direction == "up" and self.current_floor < self.max_floor - 1:
+                self.current_floor += 1
+            elif self.elevator_direction == "down" and self.current_floor > 0:
+                self.current_floor -= 1
+            riders = self._riders.pop(self.current_floor, None)
+            if riders is not None:
+                pool = self.pool
+                if self.stats is not None:
+                    now = self.clock.time
+                    for passenger in riders:
+                        board = pool.boardTime[passenger]
+                        self.stats.recordTrip(self.number, pool.origin[passenger],
+                                              board - pool.arrivalTime[passenger], now - board)
+                for passenger in riders:
+                    pool.release(passenger)
+                dropped = len(riders)
+                self._riderCount -= dropped
+                self.holdingTime = UNLOADING_TIME
+        if self.owns_clock:
+            self.clock.time += 1
+        return dropped
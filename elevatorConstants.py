@@ -4,6 +4,20 @@ DEFAULT_ELEVATOR_COUNT: int = 4
 
 UNLOADING_TIME: int = 3
 
+# numeric direction codes used by observations and actions
+DIRECTION_UP: int = 1
+DIRECTION_IDLE: int = 0
+DIRECTION_DOWN: int = -1
+DIRECTION_CODES: dict[str, int] = {"up": DIRECTION_UP, "idle": DIRECTION_IDLE, "down": DIRECTION_DOWN}
+
+# floors on each side and other elevators seen by a local controller, see Floors.observeLocal
+LOCAL_VIEW_RADIUS: int = 4
+LOCAL_VIEW_NEIGHBOURS: int = 3
+
 DEFAULT_BUSY_MULTIPLIER: float = 0.03
 
-RANDOM_SEED: int = 42
\ No newline at end of file
+# ticks of a training run and runs per genome evaluation
+TOTAL_STEPS: int = 300
+TOTAL_RUNS: int = 3
+
+RANDOM_SEED: int = 42
@@ -0,0 +1,367 @@
+"""
+Episode recordings: per-tick state of a simulation in columnar binary files.
+
+Usage:
+    python episodeRecorder.py record winner.pkl episodes/winner --steps 36000
+    python episodeRecorder.py record winner.pkl episodes/winner --seed 2 --append
+    python episodeRecorder.py show episodes/winner 1200
+    python episodeRecorder.py plot episodes/winner --series total_wait --heatmap up_waiting --every 10
+
+A recording is a directory with meta.json and one raw little-endian file per column. Every tick
+appends one fixed-size row to each column file, so a recording can be read (memory-mapped) while
+it is still being written, and any tick is found by its offset without scanning. A recording may
+hold several episodes one after another, meta.json lists the tick each one starts at.
+"""
+import argparse
+import json
+import os
+import pickle
+from typing import Optional
+
+import numpy as np
+
+from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, DIRECTION_CODES, RANDOM_SEED
+from floor import Floors
+
+META_NAME: str = "meta.json"
+RECORDING_VERSION: int = 1
+
+# name, dtype and width of every column: "1" one value per tick, "E" one per elevator, "F" one per floor
+EPISODE_COLUMNS: tuple[tuple[str, str, str], ...] = (
+    ("time", "<i4", "1"),
+    ("elevator_floor", "<i2", "E"),
+    ("elevator_direction", "i1", "E"),  # 1 up, 0 idle, -1 down, as chosen for the tick
+    ("elevator_load", "<i2", "E"),
+    ("take_in", "u1", "E"),
+    ("up_call", "u1", "F"),
+    ("down_call", "u1", "F"),
+    ("up_waiting", "<i4", "F"),
+    ("down_waiting", "<i4", "F"),
+    ("total_wait", "<i8", "1"),
+)
+
+
+def _column_width(width: str, floorCount: int, elevatorCount: int) -> int:
+    return {"1": 1, "E": elevatorCount, "F": floorCount}[width]
+
+
+def _recorded_ticks(directory: str, columns: list[dict]) -> int:
+    # complete ticks, the shortest column file decides
+    ticks = []
+    for column in columns:
+        path = os.path.join(directory, column["name"] + ".bin")
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        ticks.append(size // (np.dtype(column["dtype"]).itemsize * column["width"]))
+    return min(ticks)
+
+
+def _episode_starts(meta: dict, ticks: int) -> list[int]:
+    # recordings made before episodes were listed hold a single episode
+    starts = meta.get("episodes", [0] if ticks else [])
+    return [start for start in starts if start < ticks]
+
+
+class EpisodeRecorder(object):
+    def __init__(self, directory: str, floorCount: int, elevatorCount: int, bufferTicks: int = 1024,
+                 append: bool = False) -> None:
+        """
+        Append the state of a building to a recording once per tick
+
+        record() is called after the actions of a tick are applied and before Floors.next(), so
+        every row holds the state the controller saw and the actions it chose for it. Rows are
+        buffered and appended to the column files every bufferTicks ticks and on flush()/close().
+
+        Every recorder writes one episode. Its first tick is added to the episode starts in
+        meta.json before its first rows are written.
+
+        :param directory: recording directory, created if missing
+        :param floorCount: floor count of the building
+        :param elevatorCount: elevator count of the building
+        :param bufferTicks: ticks kept in memory between writes
+        :param append: add the episode after those already recorded in directory; False refuses a
+            directory that already holds ticks
+        """
+        self.directory: str = directory
+        self.floorCount: int = floorCount
+        self.elevatorCount: int = elevatorCount
+        self.bufferTicks: int = bufferTicks
+        os.makedirs(directory, exist_ok=True)
+
+        meta = {"version": RECORDING_VERSION, "floorCount": floorCount, "elevatorCount": elevatorCount,
+                "columns": [{"name": name, "dtype": dtype, "width": _column_width(width, floorCount, elevatorCount)}
+                            for name, dtype, width in EPISODE_COLUMNS]}
+        path = os.path.join(directory, META_NAME)
+        self.start: int = 0
+        self.episodes: list[int] = []
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                saved = json.load(f)
+            if {key: value for key, value in saved.items() if key != "episodes"} != meta:
+                raise ValueError(f"{directory} holds a recording of another building or format")
+            self.start = _recorded_ticks(directory, meta["columns"])
+            if self.start and not append:
+                raise FileExistsError(f"{directory} already holds a recording of {self.start} ticks, "
+                                      f"append to add an episode after it")
+            self.episodes = _episode_starts(saved, self.start)
+        self._meta: dict = meta
+        self._writeMeta()
+
+        self._buffers: dict[str, np.ndarray] = {
+            column["name"]: np.zeros((bufferTicks, column["width"]), dtype=column["dtype"])
+            for column in meta["columns"]}
+        self._files = {name: open(os.path.join(directory, name + ".bin"), "ab") for name in self._buffers}
+        self._filled: int = 0
+        self._started: bool = False
+
+    def _writeMeta(self) -> None:
+        path = os.path.join(self.directory, META_NAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump({**self._meta, "episodes": self.episodes}, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def __enter__(self) -> "EpisodeRecorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def record(self, floors: Floors) -> None:
+        """
+        Add a row with the current state and actions of a building
+
+        :param floors: Floors being simulated
+        :return: None
+        """
+        row, b = self._filled, self._buffers
+        b["time"][row] = floors.time
+        b["elevator_floor"][row] = floors.getElevatorLocation()
+        b["elevator_direction"][row] = [DIRECTION_CODES[direction] for direction in floors.getElevatorDirection()]
+        b["elevator_load"][row] = floors.getElevatorLoads()
+        b["take_in"][row] = floors.takeIns
+        requests = floors.getFloorRequests()
+        b["up_call"][row] = [up for up, _ in requests]
+        b["down_call"][row] = [down for _, down in requests]
+        b["up_waiting"][row] = floors.upWaiting
+        b["down_waiting"][row] = floors.downWaiting
+        b["total_wait"][row] = floors.totalWaitTime
+        self._filled += 1
+        if self._filled == self.bufferTicks:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Append the buffered rows to the column files
+
+        :return: None
+        """
+        if self._filled:
+            if not self._started:
+                self.episodes.append(self.start)
+                self._writeMeta()
+                self._started = True
+            for name, buffer in self._buffers.items():
+                self._files[name].write(buffer[:self._filled].tobytes())
+                self._files[name].flush()
+            self._filled = 0
+
+    def close(self) -> None:
+        """
+        Flush and close the column files
+
+        :return: None
+        """
+        self.flush()
+        for f in self._files.values():
+            f.close()
+
+
+class EpisodeReplay(object):
+    def __init__(self, directory: str) -> None:
+        """
+        Read a recording through memory maps, nothing is loaded until it is indexed
+
+        Columns are arrays of shape (ticks, width) indexed by tick number from the start of the
+        recording. Only complete ticks are visible, so a recording still being written can be read.
+        Each episode restarts the time column at 0; episodes lists the tick every episode starts at.
+
+        :param directory: recording directory
+        """
+        self.directory: str = directory
+        with open(os.path.join(directory, META_NAME), "r") as f:
+            meta = json.load(f)
+        if meta["version"] != RECORDING_VERSION:
+            raise ValueError(f"Cannot read recording version {meta['version']}")
+        self.floorCount: int = meta["floorCount"]
+        self.elevatorCount: int = meta["elevatorCount"]
+        self.columns: dict[str, np.ndarray] = {}
+
+        self.ticks: int = _recorded_ticks(directory, meta["columns"])
+        self.episodes: list[int] = _episode_starts(meta, self.ticks)
+        for column in meta["columns"]:
+            name = column["name"]
+            if self.ticks == 0:
+                self.columns[name] = np.zeros((0, column["width"]), dtype=column["dtype"])
+            else:
+                self.columns[name] = np.memmap(os.path.join(directory, name + ".bin"), dtype=column["dtype"],
+                                               mode="r", shape=(self.ticks, column["width"]))
+
+    def __len__(self) -> int:
+        return self.ticks
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def at(self, tick: int) -> dict[str, np.ndarray]:
+        """
+        State of one tick
+
+        :param tick: tick number, negative counts from the end
+        :return: one row per column
+        """
+        return {name: column[tick] for name, column in self.columns.items()}
+
+    def window(self, start: int = 0, stop: Optional[int] = None, every: int = 1) -> dict[str, np.ndarray]:
+        """
+        Views of every column over a range of ticks
+
+        :param start: first tick
+        :param stop: tick after the last one, None for the end
+        :param every: keep one tick in every, to thin out long recordings
+        :return: one (ticks, width) view per column
+        """
+        return {name: column[start:stop:every] for name, column in self.columns.items()}
+
+    def episode(self, index: int) -> dict[str, np.ndarray]:
+        """
+        Views of every column over one episode
+
+        :param index: episode number, negative counts from the end
+        :return: one (ticks, width) view per column
+        """
+        starts = self.episodes + [self.ticks]
+        index = range(len(self.episodes))[index]
+        return self.window(starts[index], starts[index + 1])
+
+    def waiting(self, start: int = 0, stop: Optional[int] = None, every: int = 1) -> np.ndarray:
+        """
+        Passengers waiting on every floor over a range of ticks, as (ticks, floors)
+        """
+        return self.columns["up_waiting"][start:stop:every] + self.columns["down_waiting"][start:stop:every]
+
+
+def plot_series(replay: EpisodeReplay, names: tuple[str, ...] = ("total_wait",), start: int = 0,
+                stop: Optional[int] = None, every: int = 1, ax=None):
+    """
+    Plot columns over time, one line per elevator or floor for wide columns
+
+    :param replay: EpisodeReplay
+    :param names: columns to plot
+    :param start: first tick
+    :param stop: tick after the last one, None for the end
+    :param every: plot one tick in every
+    :param ax: matplotlib axes to draw on, None for a new figure
+    :return: the axes
+    """
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        _, ax = plt.subplots(figsize=(10, 6))
+    ticks = np.arange(len(replay))[start:stop:every]
+    for name in names:
+        values = replay[name][start:stop:every]
+        for lane in range(values.shape[1]):
+            ax.plot(ticks, values[:, lane], label=name if values.shape[1] == 1 else f"{name}[{lane}]")
+    ax.set_xlabel("Tick")
+    ax.legend()
+    ax.grid()
+    return ax
+
+
+def plot_heatmap(replay: EpisodeReplay, name: str = "up_waiting", start: int = 0, stop: Optional[int] = None,
+                 every: int = 1, ax=None):
+    """
+    Plot a per-floor or per-elevator column as a heatmap over time
+
+    :param replay: EpisodeReplay
+    :param name: column to plot, "waiting" for up_waiting + down_waiting
+    :param start: first tick
+    :param stop: tick after the last one, None for the end
+    :param every: plot one tick in every
+    :param ax: matplotlib axes to draw on, None for a new figure
+    :return: the axes
+    """
+    import matplotlib.pyplot as plt
+
+    if ax is None:
+        _, ax = plt.subplots(figsize=(10, 6))
+    values = replay.waiting(start, stop, every) if name == "waiting" else replay[name][start:stop:every]
+    stop = len(replay) if stop is None else min(stop, len(replay))
+    image = ax.imshow(values.T, aspect="auto", origin="lower", interpolation="nearest",
+                      extent=(start, stop, -0.5, values.shape[1] - 0.5))
+    ax.figure.colorbar(image, ax=ax, label=name)
+    ax.set_xlabel("Tick")
+    ax.set_ylabel("Floor" if values.shape[1] == replay.floorCount else "Elevator")
+    return ax
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Record simulation episodes and analyse recordings")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser("record", help="simulate a saved genome and record every tick")
+    record.add_argument("genome", help="pickled genome, e.g. winner.pkl")
+    record.add_argument("directory", help="recording directory")
+    record.add_argument("--steps", type=int, default=None, help="ticks to simulate (default: a training episode)")
+    record.add_argument("--seed", type=int, default=RANDOM_SEED, help="traffic seed")
+    record.add_argument("--controller", choices=["global", "local"], default="global",
+                        help="controller the genome was trained as")
+    record.add_argument("--floors", type=int, default=DEFAULT_ELEVATOR_FLOOR, help="floor count of the building")
+    record.add_argument("--elevators", type=int, default=DEFAULT_ELEVATOR_COUNT,
+                        help="elevator count of the building")
+    record.add_argument("--append", action="store_true",
+                        help="add the episode after those already in the directory")
+
+    show = commands.add_parser("show", help="print the state of one tick")
+    show.add_argument("directory", help="recording directory")
+    show.add_argument("tick", type=int, help="tick number, negative counts from the end")
+
+    plot = commands.add_parser("plot", help="plot time series and a heatmap")
+    plot.add_argument("directory", help="recording directory")
+    plot.add_argument("--series", nargs="+", default=["total_wait"], help="columns to plot over time")
+    plot.add_argument("--heatmap", default="waiting", help="per-floor or per-elevator column to plot as a heatmap")
+    plot.add_argument("--start", type=int, default=0, help="first tick")
+    plot.add_argument("--stop", type=int, default=None, help="tick after the last one")
+    plot.add_argument("--every", type=int, default=1, help="plot one tick in every")
+    plot.add_argument("--output", help="save the figure to this file instead of showing it")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        import train_neat
+
+        with open(args.genome, "rb") as f:
+            genome = pickle.load(f)
+        config = train_neat.load_config(floors=args.floors, elevators=args.elevators, controller=args.controller)
+        steps = train_neat.TOTAL_STEPS if args.steps is None else args.steps
+        total_wait = train_neat.record_episode(genome, config, args.directory, args.seed, steps, args.append)
+        print(f"Recorded {steps} ticks to {args.directory}, total wait time {total_wait}")
+    elif args.command == "show":
+        replay = EpisodeReplay(args.directory)
+        if len(replay.episodes) > 1:
+            print(f"episode starts: {replay.episodes}")
+        for name, row in replay.at(args.tick).items():
+            print(f"{name}: {row.tolist()}")
+    else:
+        import matplotlib.pyplot as plt
+
+        replay = EpisodeReplay(args.directory)
+        _, (top, bottom) = plt.subplots(2, 1, figsize=(12, 9), sharex=True)
+        plot_series(replay, tuple(args.series), args.start, args.stop, args.every, ax=top)
+        plot_heatmap(replay, args.heatmap, args.start, args.stop, args.every, ax=bottom)
+        if args.output:
+            plt.savefig(args.output)
+        else:
+            plt.show()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import heapq
+from time import perf_counter
+from typing import Callable, Union
+
+from floor import Floors
+from obtainPassenger import PassengerGenerator
+from serviceStats import ServiceStats
+from simProfiler import SimulationProfiler
+
+from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, DEFAULT_ELEVATOR_CAPACITY
+
+# event kinds, in the order they are handled when they fall on the same time step
+EVENT_PASSENGER_ARRIVAL: str = "passenger arrival"
+EVENT_ELEVATOR_ARRIVAL: str = "elevator arrival"
+EVENT_HOLDING_END: str = "holding end"
+EVENT_END: str = "end"
+
+
+class EventFloors(Floors):
+    def __init__(self,
+                 passengerGenerator: Union[PassengerGenerator, None] = None,
+                 elevatorCount: int = DEFAULT_ELEVATOR_COUNT,
+                 floorCount: int = DEFAULT_ELEVATOR_FLOOR,
+                 elevatorCapacity: int = DEFAULT_ELEVATOR_CAPACITY,
+                 profiler: Union[SimulationProfiler, None] = None,
+                 stats: Union[ServiceStats, None] = None
+                 ) -> None:
+        """
+        Floors that jumps over quiet time steps
+
+        A time step is quiet when no passenger arrives, no elevator takes in, drops off
+        or reaches a floor with waiting passengers or the end of its run, and no holding
+        time runs out. Over quiet steps elevators keep counting down holdingTime or
+        moving, and the wait of every passenger in the system is charged in one go.
+        The controller is only consulted at the decision points in between.
+
+        Skipping needs PassengerGenerator.nextArrival; generators that may produce
+        passengers at any time step (the default) make every step a decision point.
+
+        :param passengerGenerator: PassengerGenerator object to generate passengers according to rules
+        :param elevatorCount: Elevator count
+        :param floorCount: Floor count
+        :param elevatorCapacity: Elevator capacity
+        :param profiler: SimulationProfiler recording phase times and counters of next() and skip(), None to disable
+        :param stats: ServiceStats counting wait and ride times of the passengers, None to disable
+        """
+        super().__init__(passengerGenerator, elevatorCount, floorCount, elevatorCapacity, profiler, stats)
+        self.decisionCount: int = 0
+        self.skippedSteps: int = 0
+        self.eventCounts: dict[str, int] = {}
+
+    def fork(self) -> "EventFloors":
+        clone = super().fork()
+        clone.eventCounts = dict(self.eventCounts)
+        return clone
+
+    def _nextEvents(self, until: int, positions: Union[list[int], None] = None) -> list[tuple[int, str, int]]:
+        """
+        Queue of upcoming events for the current actions
+
+        :param until: end of the simulation
+        :param positions: elevator floors before the last time step, None if unknown
+        :return: heap of (time step, kind, elevator index), time steps before the event are quiet
+        """
+        events = [(until, EVENT_END, -1)]
+        arrival = self.passengerGenerator.nextArrival(self.time)
+        if arrival is not None:
+            events.append((arrival, EVENT_PASSENGER_ARRIVAL, -1))
+
+        floorCount = len(self._floors)
+        for i, elevator in enumerate(self._elevators):
+            position = elevator.current_floor
+            if self.takeIns[i] and len(self._floors[position]) > 0:
+                # takes in at this time step
+                events.append((self.time, EVENT_ELEVATOR_ARRIVAL, i))
+                continue
+            if elevator.holdingTime > 0:
+                # the last holding step is quiet, decide before the elevator moves again
+                events.append((self.time + elevator.holdingTime, EVENT_HOLDING_END, i))
+                continue
+            step = {"up": 1, "down": -1}.get(elevator.elevator_direction, 0)
+            if step == 0 or not 0 <= position + step < floorCount:
+                if positions is not None and positions[i] != position:
+                    # reached the end of its run in the last time step, decide now
+                    events.append((self.time, EVENT_ELEVATOR_ARRIVAL, i))
+                # else it stays where it is, nothing happens until another event
+                continue
+            destinations = set(elevator.get_internal_requests())
+            ticks = 0
+            while True:
+                position += step
+                if position in destinations:
+                    # drops off in this time step
+                    events.append((self.time + ticks, EVENT_ELEVATOR_ARRIVAL, i))
+                    break
+                ticks += 1
+                if len(self._floors[position]) > 0 or not 0 <= position + step < floorCount:
+                    # quiet arrival at a floor with hall calls or at the end of its run, decide after it
+                    events.append((self.time + ticks, EVENT_ELEVATOR_ARRIVAL, i))
+                    break
+        heapq.heapify(events)
+        return events
+
+    def skip(self, steps: int, wait: int = 1) -> int:
+        """
+        Advance over quiet time steps without simulating them one by one
+
+        :param steps: number of quiet time steps, must not pass the next event
+        :param wait: wait time charged per passenger and time step, as in Floors.next
+        :return: int: total wait time of passengers
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            start = perf_counter()
+        for elevator in self._elevators:
+            if elevator.holdingTime > 0:
+                elevator.holdingTime -= steps
+            elif elevator.elevator_direction == "up":
+                elevator.current_floor = min(elevator.current_floor + steps, elevator.max_floor - 1)
+            elif elevator.elevator_direction == "down":
+                elevator.current_floor = max(elevator.current_floor - steps, 0)
+        self.totalWaitTime += wait * self.passengerCount * steps
+        self.time += steps
+        self.skippedSteps += steps
+        if profiler is not None:
+            self._profile(profiler, "skip", start)
+            profiler.counters["skipped_steps"] += steps
+            # nobody arrives or leaves a floor over quiet steps, the queues stay as they are
+            waiting = self.getWaitingCounts()
+            profiler.recordQueues(sum(waiting), max(waiting, default=0), steps)
+        return self.totalWaitTime
+
+    def run(self, controller: Callable[["EventFloors"], None], until: int, wait: int = 1) -> int:
+        """
+        Simulate until a time step, consulting the controller at decision points only
+
+        :param controller: sets the actions of the floors, e.g. with applyActions
+        :param until: time step to stop at
+        :param wait: wait time charged per passenger and time step, as in Floors.next
+        :return: int: total wait time of passengers
+        """
+        while self.time < until:
+            controller(self)
+            self.decisionCount += 1
+            positions = self.getElevatorLocation()
+            self.next(wait)
+            if self.time >= until:
+                break
+            events = self._nextEvents(until, positions)
+            eventTime, kind, _ = heapq.heappop(events)
+            self.eventCounts[kind] = self.eventCounts.get(kind, 0) + 1
+            if eventTime > self.time:
+                self.skip(eventTime - self.time, wait)
+        return self.totalWaitTime
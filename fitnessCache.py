@@ -0,0 +1,110 @@
+import hashlib
+import os
+import pickle
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+DEFAULT_CACHE_SIZE: int = 10000
+
+
+def genome_key(genome, context: Hashable = None) -> bytes:
+    """
+    Canonical hash of the network a genome encodes
+
+    Covers the enabled connections with their weights and every node's bias, response,
+    activation and aggregation, in sorted order, so equal networks hash equally no matter
+    how the genes were created. Genome keys and fitness are not part of it.
+
+    :param genome: DefaultGenome
+    :param context: anything else the fitness depends on, e.g. the traffic seed
+    :return: 16 byte digest
+    """
+    nodes = sorted((key, ng.bias, ng.response, ng.activation, ng.aggregation) for key, ng in genome.nodes.items())
+    connections = sorted((key, cg.weight) for key, cg in genome.connections.items() if cg.enabled)
+    # repr round-trips floats exactly
+    return hashlib.blake2b(repr((nodes, connections, context)).encode(), digest_size=16).digest()
+
+
+class FitnessCache(object):
+    def __init__(self, maxsize: int = DEFAULT_CACHE_SIZE) -> None:
+        """
+        Least recently used fitness values by genome_key
+
+        :param maxsize: maximum number of fitness values kept
+        """
+        self.maxsize: int = maxsize
+        self._fitness: OrderedDict[bytes, float] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def __len__(self) -> int:
+        return len(self._fitness)
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self._fitness
+
+    def get(self, key: bytes) -> Optional[float]:
+        """
+        Look up a fitness value and mark it as recently used
+
+        :param key: genome_key of the genome
+        :return: the fitness, None when it is not cached
+        """
+        fitness = self._fitness.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self._fitness.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, key: bytes, fitness: float) -> None:
+        """
+        Store a fitness value, evicting the least recently used one when full
+
+        :param key: genome_key of the genome
+        :param fitness: its fitness
+        :return: None
+        """
+        self._fitness[key] = fitness
+        self._fitness.move_to_end(key)
+        while len(self._fitness) > self.maxsize:
+            self._fitness.popitem(last=False)
+
+    def clear(self) -> None:
+        """
+        Drop every fitness value and reset the hit counters
+
+        :return: None
+        """
+        self._fitness.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def save(self, path: str) -> None:
+        """
+        Save the cached fitness values, oldest first
+
+        :param path: file path
+        :return: None
+        """
+        with open(path, "wb") as f:
+            pickle.dump((self.maxsize, list(self._fitness.items())), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: str, maxsize: Optional[int] = None) -> "FitnessCache":
+        """
+        Load a cache saved with save(), an empty cache if the file does not exist
+
+        :param path: file path
+        :param maxsize: maximum number of fitness values kept, None for the saved one
+        :return: FitnessCache
+        """
+        if not os.path.exists(path):
+            return cls(maxsize or DEFAULT_CACHE_SIZE)
+        with open(path, "rb") as f:
+            saved_size, items = pickle.load(f)
+        cache = cls(maxsize or saved_size)
+        for key, fitness in items:
+            cache.put(key, fitness)
+        return cache
@@ -1,10 +1,49 @@
-from typing import Union, Literal
+import copy
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Union, Literal
 
 from elevator import Elevator
+from floorQueue import FloorQueue
 from obtainPassenger import PassengerGenerator, RandomPassengerGenerator
-from passenger import Passenger
+from passenger import Clock
+from passengerPool import PassengerPool, PassengerView
+from serviceStats import ServiceStats
+from simProfiler import SimulationProfiler
 
-from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, DEFAULT_ELEVATOR_CAPACITY
+from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, DEFAULT_ELEVATOR_CAPACITY, DIRECTION_CODES, \
+    LOCAL_VIEW_RADIUS, LOCAL_VIEW_NEIGHBOURS
+
+if TYPE_CHECKING:
+    # numpy is imported by the methods that use it, so importing the simulator stays fast
+    import numpy as np
+
+DIRECTION_NAMES: tuple[str, str, str] = ("down", "idle", "up")  # indexed by direction code + 1
+
+
+class FloorsSnapshot(object):
+    __slots__ = ("time", "totalWaitTime", "passengerCount", "takeIns", "floorRequests", "upWaiting", "downWaiting",
+                 "pool", "floors", "elevators", "generator")
+
+    def __init__(self, floors: "Floors") -> None:
+        """
+        State of a Floors at one time step, see Floors.snapshot
+
+        Holds copies of the pool columns, the floor queues as tuples of passenger numbers, the
+        elevators as tuples and the generator state; nothing refers back to the building.
+
+        :param floors: Floors to take the state of
+        """
+        self.time: int = floors.time
+        self.totalWaitTime: int = floors.totalWaitTime
+        self.passengerCount: int = floors.passengerCount
+        self.takeIns: tuple[bool, ...] = tuple(floors.takeIns)
+        self.floorRequests: tuple[tuple[bool, bool], ...] = tuple(floors.floorRequests)
+        self.upWaiting: tuple[int, ...] = tuple(floors.upWaiting)
+        self.downWaiting: tuple[int, ...] = tuple(floors.downWaiting)
+        self.pool: tuple = floors.pool.snapshot()
+        self.floors: tuple = tuple(floor.snapshot() for floor in floors._floors)
+        self.elevators: tuple = tuple(elevator.snapshot() for elevator in floors._elevators)
+        self.generator: Any = floors.passengerGenerator.getState()
 
 
 class Floors(object):
@@ -12,7 +51,9 @@ class Floors(object):
                  passengerGenerator: Union[PassengerGenerator, None] = None,
                  elevatorCount: int = DEFAULT_ELEVATOR_COUNT,
                  floorCount: int = DEFAULT_ELEVATOR_FLOOR,
-                 elevatorCapacity: int = DEFAULT_ELEVATOR_CAPACITY
+                 elevatorCapacity: int = DEFAULT_ELEVATOR_CAPACITY,
+                 profiler: Union[SimulationProfiler, None] = None,
+                 stats: Union[ServiceStats, None] = None
                  ) -> None:
         """
         Initialize the floors
@@ -21,20 +62,98 @@ class Floors(object):
         :param elevatorCount: Elevator count
         :param floorCount: Floor count
         :param elevatorCapacity: Elevator capacity
+        :param profiler: SimulationProfiler recording phase times and counters of next(), None to disable
+        :param stats: ServiceStats counting wait and ride times of the passengers, None to disable
         """
-        self.time: int = 0
-        self._floors: list[set[Passenger]] = [set() for _ in range(floorCount)]
-        self._elevators: list[Elevator] = [Elevator(elevatorCapacity, floorCount) for _ in range(elevatorCount)]
+        self.clock: Clock = Clock()
+        self.pool: PassengerPool = PassengerPool(self.clock)
+        self._floors: list[FloorQueue] = [FloorQueue(self.pool) for _ in range(floorCount)]
+        self._elevators: list[Elevator] = [Elevator(elevatorCapacity, floorCount, self.clock, self.pool, stats, i)
+                                           for i in range(elevatorCount)]
         self.takeIns: list[bool] = [False for _ in range(elevatorCount)]
         self.floorRequests: list[tuple[bool, bool]] = [(False, False) for _ in range(floorCount)]
+        self.upWaiting: list[int] = [0 for _ in range(floorCount)]
+        self.downWaiting: list[int] = [0 for _ in range(floorCount)]
         self.totalWaitTime: int = 0
-        self.updateFloor(0)
+        self.passengerCount: int = 0
+        self.profiler: Union[SimulationProfiler, None] = profiler
+        self.stats: Union[ServiceStats, None] = stats
+        self.updateFloor()
 
         if passengerGenerator is None:
             self.passengerGenerator = RandomPassengerGenerator(floorCount)
         else:
             self.passengerGenerator = passengerGenerator
 
+    def snapshot(self) -> FloorsSnapshot:
+        """
+        Compact copy of the simulation state, to restore() later, any number of times
+
+        Covers the time, passengers, queues, elevators, actions, wait accounting and the
+        random state of the passenger generator, so a restored building goes on exactly as
+        this one does. The profiler and stats are not part of the state.
+
+        :return: FloorsSnapshot
+        """
+        return FloorsSnapshot(self)
+
+    def restore(self, snapshot: FloorsSnapshot) -> None:
+        """
+        Return to a snapshot of this building, or of another one of the same size and traffic
+
+        :param snapshot: result of snapshot()
+        :return: None
+        """
+        if len(snapshot.floors) != len(self._floors) or len(snapshot.elevators) != len(self._elevators):
+            raise ValueError("Cannot restore the snapshot of a building of another size")
+        self.time = snapshot.time
+        self.totalWaitTime = snapshot.totalWaitTime
+        self.passengerCount = snapshot.passengerCount
+        self.takeIns = list(snapshot.takeIns)
+        self.floorRequests = list(snapshot.floorRequests)
+        self.upWaiting = list(snapshot.upWaiting)
+        self.downWaiting = list(snapshot.downWaiting)
+        self.pool.restore(snapshot.pool)
+        for floor, state in zip(self._floors, snapshot.floors):
+            floor.restore(state)
+        for elevator, state in zip(self._elevators, snapshot.elevators):
+            elevator.restore(state)
+        self.passengerGenerator.setState(snapshot.generator)
+
+    def fork(self) -> "Floors":
+        """
+        Independent copy of the building in its current state, e.g. to try actions ahead
+
+        The copy draws the same passengers as this building from now on. It has no profiler
+        or stats, so what it simulates is not counted with this building.
+
+        :return: Floors of the same type
+        """
+        clone = copy.copy(self)
+        clone.clock = Clock(self.time)
+        clone.pool = self.pool.copy(clone.clock)
+        clone._floors = [floor.copy(clone.pool) for floor in self._floors]
+        clone._elevators = [elevator.copy(clone.clock, clone.pool) for elevator in self._elevators]
+        clone.takeIns = list(self.takeIns)
+        clone.floorRequests = list(self.floorRequests)
+        clone.upWaiting = list(self.upWaiting)
+        clone.downWaiting = list(self.downWaiting)
+        clone.profiler = None
+        clone.stats = None
+        clone.passengerGenerator = self.passengerGenerator.fork()
+        return clone
+
+    @property
+    def time(self) -> int:
+        """
+        Current time step, shared with the elevators and passengers through the clock
+        """
+        return self.clock.time
+
+    @time.setter
+    def time(self, time: int) -> None:
+        self.clock.time = time
+
     def setTakeIns(self, takeIns: list[bool]) -> None:
         """
         Set the take in status of the elevators
@@ -71,6 +190,14 @@ class Floors(object):
         """
         return [elevator.elevator_direction for elevator in self._elevators]
 
+    def getElevatorLoads(self) -> list[int]:
+        """
+        Get the number of riders in each elevator
+
+        :return: list[int]
+        """
+        return [len(elevator) for elevator in self._elevators]
+
     def getFloorRequests(self) -> list[tuple[bool, bool]]:
         """
         Get the floor requests
@@ -79,6 +206,161 @@ class Floors(object):
         """
         return self.floorRequests
 
+    @property
+    def observationSize(self) -> int:
+        """
+        Length of the observation written by observe()
+        """
+        return 1 + 2 * len(self._elevators) + 3 * len(self._floors)
+
+    def observe(self, out: Union["np.ndarray", None] = None) -> "np.ndarray":
+        """
+        Write the state of the building into a float buffer
+
+        Layout, for E elevators and F floors:
+
+            [0]                      time
+            [1, 1 + E)               elevator floors
+            [1 + E, 1 + 2E)          elevator directions (1 up, 0 idle, -1 down)
+            [1 + 2E, 1 + 2E + 2F)    floor requests, (up, down) for every floor, 1.0 if pressed
+            [1 + 2E + 2F, 1 + 2E + 3F)  passengers waiting on every floor
+
+        :param out: float array of length observationSize to reuse, None to allocate one
+        :return: the observation buffer
+        """
+        import numpy as np
+        if out is None:
+            out = np.empty(self.observationSize)
+        E, F = len(self._elevators), len(self._floors)
+        out[0] = self.time
+        out[1:1 + E] = [elevator.current_floor for elevator in self._elevators]
+        out[1 + E:1 + 2 * E] = [DIRECTION_CODES[elevator.elevator_direction] for elevator in self._elevators]
+        requests = out[1 + 2 * E:1 + 2 * E + 2 * F]
+        waiting = out[1 + 2 * E + 2 * F:]
+        # waiting doubles as scratch space for the up/down counts
+        waiting[:] = self.upWaiting
+        np.greater(waiting, 0, out=requests[0::2], casting="unsafe")
+        waiting[:] = self.downWaiting
+        np.greater(waiting, 0, out=requests[1::2], casting="unsafe")
+        waiting += self.upWaiting
+        return out
+
+    @staticmethod
+    def localObservationSize(radius: int = LOCAL_VIEW_RADIUS, neighbours: int = LOCAL_VIEW_NEIGHBOURS) -> int:
+        """
+        Length of the view of one elevator written by observeLocal(), the same for every building size
+        """
+        return 10 + 3 * (2 * radius + 1) + 3 * neighbours
+
+    def observeLocal(self,
+                     out: Union["np.ndarray", None] = None,
+                     radius: int = LOCAL_VIEW_RADIUS,
+                     neighbours: int = LOCAL_VIEW_NEIGHBOURS) -> "np.ndarray":
+        """
+        Write a fixed-size view around every elevator into a float buffer, one row per elevator
+
+        Layout of a row, for a window of W = 2 * radius + 1 floors centred on the elevator
+        (floors outside the building read 0) and K = neighbours:
+
+            [0]                  load, riders / capacity
+            [1]                  direction (1 up, 0 idle, -1 down)
+            [2]                  1.0 if holding
+            [3], [4]             floors to the top, to the bottom, capped at radius, / radius
+            [5]                  floor / (floor count - 1)
+            [6, 6 + W)           riders going to each floor of the window
+            [6 + W], [7 + W]     riders going above, below the window
+            [8 + W, 8 + 3W)      passengers waiting, (up, down) for each floor of the window
+            [8 + 3W], [9 + 3W]   passengers waiting above, below the window
+            [10 + 3W, 10 + 3W + 3K)  nearest other elevators, (present, floor offset / (floor count - 1), direction)
+
+        :param out: float array of shape (elevator count, localObservationSize) to reuse, None to allocate one
+        :param radius: floors on each side of the elevator in the window
+        :param neighbours: number of other elevators described
+        :return: the observation buffer
+        """
+        import numpy as np
+        E, F = len(self._elevators), len(self._floors)
+        W = 2 * radius + 1
+        if out is None:
+            out = np.empty((E, self.localObservationSize(radius, neighbours)))
+        scale = max(F - 1, 1)
+        elevators = self._elevators
+        positions = np.array([elevator.current_floor for elevator in elevators])
+        directions = np.array([DIRECTION_CODES[elevator.elevator_direction] for elevator in elevators])
+        out[:, 0] = [len(elevator) / elevator.capacity for elevator in elevators]
+        out[:, 1] = directions
+        out[:, 2] = [elevator.holdingTime > 0 for elevator in elevators]
+        out[:, 3] = np.minimum(F - 1 - positions, radius) / radius
+        out[:, 4] = np.minimum(positions, radius) / radius
+        out[:, 5] = positions / scale
+
+        # floors padded with radius empty floors on each side, floor f at column f + radius;
+        # the window of an elevator on floor p is columns p .. p + W - 1
+        P = F + 2 * radius
+        rows = np.arange(E)[:, None]
+        window = positions[:, None] + np.arange(W)
+        destinations = [i * P + destination + radius
+                        for i, elevator in enumerate(elevators) for destination in elevator.get_internal_requests()]
+        riders = np.bincount(destinations, minlength=E * P).reshape(E, P)
+        out[:, 6:6 + W] = riders[rows, window]
+        # below[:, c] = riders going to columns before c
+        below = np.zeros((E, P + 1))
+        np.cumsum(riders, axis=1, out=below[:, 1:])
+        out[:, 6 + W] = below[:, P] - below[rows[:, 0], positions + W]
+        out[:, 7 + W] = below[rows[:, 0], positions]
+
+        waiting = np.zeros((2, P))
+        waiting[0, radius:radius + F] = self.upWaiting
+        waiting[1, radius:radius + F] = self.downWaiting
+        out[:, 8 + W:8 + 3 * W] = waiting[:, window].transpose(1, 2, 0).reshape(E, 2 * W)
+        waitingBelow = np.zeros(P + 1)
+        np.cumsum(waiting[0] + waiting[1], out=waitingBelow[1:])
+        out[:, 8 + 3 * W] = waitingBelow[P] - waitingBelow[positions + W]
+        out[:, 9 + 3 * W] = waitingBelow[positions]
+
+        others = out[:, 10 + 3 * W:].reshape(E, neighbours, 3)
+        others[:] = 0.0
+        if E > 1 and neighbours > 0:
+            offsets = positions[None, :] - positions[:, None]
+            distance = np.abs(offsets)
+            np.fill_diagonal(distance, F + 1)
+            K = min(neighbours, E - 1)
+            nearest = np.argsort(distance, axis=1, kind="stable")[:, :K]
+            others[:, :K, 0] = 1.0
+            others[:, :K, 1] = np.take_along_axis(offsets, nearest, axis=1) / scale
+            others[:, :K, 2] = directions[nearest]
+        return out
+
+    def applyActions(self, directions: "np.ndarray", takeIns: "np.ndarray") -> None:
+        """
+        Set directions and take ins from numeric arrays
+
+        :param directions: E numbers, their sign gives the direction (1 up, 0 idle, -1 down)
+        :param takeIns: E bools
+        :return: None
+        """
+        import numpy as np
+        for elevator, direction in zip(self._elevators, np.sign(directions).astype(int).tolist()):
+            elevator.elevator_direction = DIRECTION_NAMES[direction + 1]
+        self.takeIns = np.asarray(takeIns, dtype=bool).tolist()
+
+    def getWaitingCounts(self) -> list[int]:
+        """
+        Get the number of passengers waiting on each floor
+
+        :return: list[int]
+        """
+        return [up + down for up, down in zip(self.upWaiting, self.downWaiting)]
+
+    def getWaitingPassengers(self, floor: int) -> list[PassengerView]:
+        """
+        Get the passengers waiting on a floor as objects, in arrival order
+
+        :param floor: floor number
+        :return: list[PassengerView]
+        """
+        return [self.pool.view(passenger) for passenger in self._floors[floor]]
+
     def getInternalRequests(self) -> list[set[int]]:
         """
         Get the internal requests of the elevators
@@ -87,26 +369,54 @@ class Floors(object):
         """
         return [elevator.get_internal_requests() for elevator in self._elevators]
 
-    def updateFloor(self, wait: int = 1):
+    def recordUnfinished(self) -> None:
         """
-        Update the floor requests for each floor and wait time of passengers
+        Count the passengers still in the building in the stats, as if they left now
+
+        Call it once at the end of an episode, so unserved passengers weigh on the distributions.
 
-        :return: total wait time of passengers on the floor
+        :return: None
         """
+        stats, pool, now = self.stats, self.pool, self.time
+        if stats is None:
+            return
         for floor in self._floors:
             for passenger in floor:
-                passenger.wait(wait)
-        for i, floor in enumerate(self._floors):
-            up = False
-            down = False
-            for passenger in floor:
-                if passenger.press() == "up":
-                    up = True
-                else:
-                    down = True
-                if up and down:
-                    break
-            self.floorRequests[i] = (up, down)
+                stats.waitByFloor[pool.origin[passenger]].add(now - pool.arrivalTime[passenger])
+        for elevator in self._elevators:
+            for passenger in elevator:
+                board = pool.boardTime[passenger]
+                stats.recordTrip(elevator.number, pool.origin[passenger], board - pool.arrivalTime[passenger],
+                                 now - board)
+
+    def updateFloor(self, floor: Union[int, None] = None) -> None:
+        """
+        Update the floor requests from the up/down waiting counts
+        Waiting passengers wait through the clock, so their wait time is not touched
+
+        :param floor: floor number to update, None for every floor
+        :return: None
+        """
+        if floor is None:
+            for i in range(len(self._floors)):
+                self.floorRequests[i] = (self.upWaiting[i] > 0, self.downWaiting[i] > 0)
+        else:
+            self.floorRequests[floor] = (self.upWaiting[floor] > 0, self.downWaiting[floor] > 0)
+
+    @staticmethod
+    def _profile(profiler: SimulationProfiler, phase: str, start: float) -> float:
+        now = perf_counter()
+        profiler.phaseTimes[phase] += now - start
+        return now
+
+    def _countTakeIn(self, profiler: SimulationProfiler, elevator: Elevator, boarded: int, left: int) -> None:
+        profiler.counters["boardings"] += boarded
+        profiler.counters["dropped"] += left
+        if len(elevator) >= elevator.capacity:
+            if elevator.elevator_direction == "up":
+                profiler.counters["rejected_boardings"] += self.upWaiting[elevator.current_floor]
+            elif elevator.elevator_direction == "down":
+                profiler.counters["rejected_boardings"] += self.downWaiting[elevator.current_floor]
 
     def next(self, wait = 1) -> int:
         """
@@ -117,7 +427,7 @@ class Floors(object):
             UPDATE (INTERNAL):
             - generate passengers (1)
             - elevator next (3)
-            - update floor (4)
+            - update floor (4), done where passengers arrive (1) or board (2)
 
 
             UPDATE (EXTERNAL):
@@ -126,33 +436,62 @@ class Floors(object):
 
         :return: int: total wait time of passengers if any is dropped off, else 0
         """
+        profiler = self.profiler
+        if profiler is not None:
+            start = perf_counter()
+
         # generate passengers
-        passengers = self.passengerGenerator.obtain(self.time)
-        for passenger in passengers:
-            self._floors[passenger.origin].add(passenger)
+        origins, destinations = self.passengerGenerator.obtainTrips(self.time)
+        for origin, destination in zip(origins, destinations):
+            passenger = self.pool.allocate(origin, destination)
+            if origin < destination:
+                self._floors[origin].append(passenger, "up")
+                self.upWaiting[origin] += 1
+            else:
+                self._floors[origin].append(passenger, "down")
+                self.downWaiting[origin] += 1
+            # update floor
+            self.updateFloor(origin)
+        self.passengerCount += len(origins)
+
+        if profiler is not None:
+            start = self._profile(profiler, "generate", start)
+            profiler.counters["arrivals"] += len(origins)
 
         # elevator take in
         for i, elevator in enumerate(self._elevators):
-            if self.takeIns[i] and len(self._floors[elevator.current_floor]) > 0:
-                elevator.add_passengers(self._floors[elevator.current_floor])
+            floor = self._floors[elevator.current_floor]
+            if self.takeIns[i] and len(floor) > 0:
+                riders = len(elevator)
+                removed = elevator.add_passengers(floor)
+                self.upWaiting[elevator.current_floor] = floor.waiting("up")
+                self.downWaiting[elevator.current_floor] = floor.waiting("down")
+                # passengers that leave the floor without boarding leave the system
+                left = len(removed) - (len(elevator) - riders)
+                self.passengerCount -= left
+                # update floor
+                self.updateFloor(elevator.current_floor)
+                if profiler is not None:
+                    self._countTakeIn(profiler, elevator, len(removed) - left, left)
+
+        if profiler is not None:
+            start = self._profile(profiler, "take_in", start)
 
         # elevator next
         for elevator in self._elevators:
-            elevator.next()
+            dropped = elevator.next()
+            self.passengerCount -= dropped
+            if profiler is not None:
+                profiler.counters["alightings"] += dropped
 
-        # update floor
-        self.updateFloor()
+        if profiler is not None:
+            start = self._profile(profiler, "elevator_next", start)
 
-        waitTime = 0
-        for floor in self._floors:
-            waitTime += wait * len(floor)
-        for elevator in self._elevators:
-            waitTime += wait * len(elevator)
-
-        self.totalWaitTime += waitTime
+        self.totalWaitTime += wait * self.passengerCount
         self.time += 1
-        return self.totalWaitTime
-
-
-
 
+        if profiler is not None:
+            self._profile(profiler, "wait_accounting", start)
+            waiting = self.getWaitingCounts()
+            profiler.recordQueues(sum(waiting), max(waiting, default=0))
+        return self.totalWaitTime
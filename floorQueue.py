@@ -0,0 +1,130 @@
+import heapq
+from collections import deque
+from typing import Iterator
+
+from passengerPool import PassengerPool
+
+
+class FloorQueue(object):
+    def __init__(self, pool: PassengerPool) -> None:
+        """
+        Numbers of the passengers waiting on a floor, in one FIFO queue per direction
+
+        The arrival sequence numbers of the pool merge the two queues back into the
+        arrival order of the floor.
+
+        :param pool: PassengerPool of the building
+        """
+        self.pool: PassengerPool = pool
+        self._up: deque[int] = deque()
+        self._down: deque[int] = deque()
+
+    def __len__(self) -> int:
+        return len(self._up) + len(self._down)
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        Waiting passengers in arrival order
+        """
+        yield from heapq.merge(self._up, self._down, key=self.pool.sequence.__getitem__)
+
+    def append(self, passenger: int, direction: str) -> None:
+        """
+        Queue a passenger behind everyone waiting
+
+        :param passenger: passenger number
+        :param direction: "up" or "down", where the passenger is going
+        :return: None
+        """
+        if direction == "up":
+            self._up.append(passenger)
+        else:
+            self._down.append(passenger)
+
+    def waiting(self, direction: str) -> int:
+        """
+        Number of passengers waiting to go a direction
+
+        :param direction: "up" or "down"
+        :return: int
+        """
+        return len(self._up) if direction == "up" else len(self._down)
+
+    def take(self, direction: str, space: int) -> tuple[list[int], list[int]]:
+        """
+        Empty the floor in arrival order until a car going direction with space free places is full
+
+        Passengers going direction board, passengers going the other way leave the floor without
+        boarding. Once the car is full everyone behind stays. An idle car takes no one but still
+        clears the floor.
+
+        :param direction: "up", "down" or "idle"
+        :param space: free places in the car
+        :return: passengers that board, in arrival order, and passengers that leave without boarding
+        """
+        if space <= 0:
+            return [], []
+        if direction == "up":
+            same, other = self._up, self._down
+        elif direction == "down":
+            same, other = self._down, self._up
+        else:
+            left = list(self)
+            self._up.clear()
+            self._down.clear()
+            return [], left
+
+        if len(same) < space:
+            # the car never fills, the whole floor leaves
+            boarded = list(same)
+            same.clear()
+            left = list(other)
+            other.clear()
+            return boarded, left
+
+        boarded = [same.popleft() for _ in range(space)]
+        # the car is full after the last boarder, only those who arrived before it leave
+        sequence = self.pool.sequence
+        last = sequence[boarded[-1]]
+        left = []
+        while other and sequence[other[0]] < last:
+            left.append(other.popleft())
+        return boarded, left
+
+    def snapshot(self) -> tuple[tuple[int, ...], tuple[int, ...]]:
+        """
+        Passengers going up and down, for restore()
+        """
+        return tuple(self._up), tuple(self._down)
+
+    def restore(self, snapshot: tuple[tuple[int, ...], tuple[int, ...]]) -> None:
+        """
+        Return to the queues of a snapshot
+
+        :param snapshot: result of snapshot()
+        :return: None
+        """
+        self._up = deque(snapshot[0])
+        self._down = deque(snapshot[1])
+
+    def copy(self, pool: PassengerPool) -> "FloorQueue":
+        """
+        Independent copy of the queues
+
+        :param pool: PassengerPool of the copy
+        :return: FloorQueue
+        """
+        clone = FloorQueue.__new__(FloorQueue)
+        clone.pool = pool
+        clone._up = self._up.copy()
+        clone._down = self._down.copy()
+        return clone
+
+    def clear(self) -> None:
+        """
+        Remove every waiting passenger
+
+        :return: None
+        """
+        self._up.clear()
+        self._down.clear()
@@ -0,0 +1,74 @@
+from typing import Callable, Optional, Sequence
+
+import numpy as np
+
+from floor import Floors, FloorsSnapshot
+
+# directions (E numbers, sign gives the direction) and take ins (E bools), as Floors.applyActions
+Action = tuple[np.ndarray, np.ndarray]
+
+
+def score_candidates(floors: Floors,
+                     candidates: Sequence[Action],
+                     horizon: int,
+                     policy: Optional[Callable[[Floors], Action]] = None,
+                     scratch: Optional[Floors] = None) -> list[int]:
+    """
+    Wait time each candidate action would add over the next horizon time steps
+
+    Every candidate is simulated from the current state on a scratch building, restored from one
+    snapshot between candidates, so all of them see the same arriving passengers and floors
+    itself is not touched.
+
+    :param floors: building to look ahead from
+    :param candidates: actions to try for the first time step
+    :param horizon: time steps to simulate per candidate
+    :param policy: actions for the time steps after the first, None keeps the candidate's actions
+    :param scratch: building of the same size and traffic to simulate on, e.g. a floors.fork() kept
+        between calls; None forks one
+    :return: added wait time per candidate, lower is better
+    """
+    if scratch is None:
+        scratch = floors.fork()
+    start: FloorsSnapshot = floors.snapshot()
+    scores = []
+    for directions, takeIns in candidates:
+        scratch.restore(start)
+        scratch.applyActions(directions, takeIns)
+        scratch.next()
+        for _ in range(horizon - 1):
+            if policy is not None:
+                scratch.applyActions(*policy(scratch))
+            scratch.next()
+        scores.append(scratch.totalWaitTime - start.totalWaitTime)
+    return scores
+
+
+class LookaheadDispatcher(object):
+    def __init__(self,
+                 candidates: Callable[[Floors], Sequence[Action]],
+                 horizon: int,
+                 policy: Optional[Callable[[Floors], Action]] = None) -> None:
+        """
+        Model-predictive controller: at every decision, apply the candidate action with the lowest
+        wait over the horizon (see score_candidates)
+
+        Usable as the controller of EventFloors.run. The scratch building is forked on the first
+        call and reused for every later decision on the same building.
+
+        :param candidates: candidate actions for a building in its current state
+        :param horizon: time steps to look ahead
+        :param policy: actions after the first time step of a rollout, None keeps the candidate's actions
+        """
+        self.candidates: Callable[[Floors], Sequence[Action]] = candidates
+        self.horizon: int = horizon
+        self.policy: Optional[Callable[[Floors], Action]] = policy
+        self.scratch: Optional[Floors] = None
+        self.lastScores: list[int] = []
+
+    def __call__(self, floors: Floors) -> None:
+        if self.scratch is None:
+            self.scratch = floors.fork()
+        candidates = self.candidates(floors)
+        self.lastScores = score_candidates(floors, candidates, self.horizon, self.policy, self.scratch)
+        floors.applyActions(*candidates[int(np.argmin(self.lastScores))])
@@ -1,5 +1,7 @@
+import copy
+from typing import Any, Union
+
 from elevatorConstants import DEFAULT_BUSY_MULTIPLIER, RANDOM_SEED
-from passenger import Passenger
 
 import random
 
@@ -11,37 +13,81 @@ class PassengerGenerator(object):
         self.floorCount: int = floorCount
         self.busyMultiplier: float = busyMultiplier
 
-        self.seed: int = RANDOM_SEED
+        self.seed: int = seed
+        self.random: random.Random = random.Random(seed)
+
+    def obtainTrips(self, time: int) -> tuple[list[int], list[int]]:
+        """
+        Origins and destinations of the passengers arriving at a time step, in arrival order
 
-    def obtain(self, *args)-> list[Passenger]:
+        :param time: time step
+        :return: origin floors and destination floors
+        """
         raise NotImplementedError("This method must be implemented in a subclass")
 
+    def _randomTrips(self, count: int, origins: list[int], destinations: list[int]) -> None:
+        # trips between two different floors, appended to origins and destinations
+        for _ in range(count):
+            origin = self.random.randint(0, self.floorCount - 1)
+            destination = self.random.randint(0, self.floorCount - 1)
+            while origin == destination:
+                destination = self.random.randint(0, self.floorCount - 1)
+            origins.append(origin)
+            destinations.append(destination)
+
+    def getState(self) -> Any:
+        """
+        State of the random generator, for setState()
+        """
+        return self.random.getstate()
+
+    def setState(self, state: Any) -> None:
+        """
+        Return to a state from getState(), the passengers drawn from then on are the same
+
+        :param state: result of getState()
+        :return: None
+        """
+        self.random.setstate(state)
+
+    def fork(self) -> "PassengerGenerator":
+        """
+        Independent copy in the same state, it draws the same passengers as this one from now on
+
+        :return: PassengerGenerator
+        """
+        clone = copy.copy(self)
+        # setstate sets the whole state, skip seeding
+        clone.random = random.Random.__new__(random.Random)
+        clone.random.setstate(self.random.getstate())
+        return clone
+
+    def nextArrival(self, time: int) -> Union[int, None]:
+        """
+        Earliest time step, from time on, at which passengers may arrive
+
+        :param time: current time step
+        :return: int: time step, None if no passenger arrives any more
+        """
+        return time
+
 
 class RandomPassengerGenerator(PassengerGenerator):
-    def obtain(self, *args) -> list[Passenger]:
-        passengers: list[Passenger] = []
-        for _ in range(int(round(self.busyMultiplier * self.floorCount))):
-            origin = random.randint(0, self.floorCount - 1)
-            destination = random.randint(0, self.floorCount - 1)
-            while origin == destination:
-                destination = random.randint(0, self.floorCount - 1)
-            passengers.append(Passenger(origin, destination))
-        return passengers
+    def obtainTrips(self, time: int) -> tuple[list[int], list[int]]:
+        origins: list[int] = []
+        destinations: list[int] = []
+        self._randomTrips(int(round(self.busyMultiplier * self.floorCount)), origins, destinations)
+        return origins, destinations
 
 
 
 class TimeCapture(PassengerGenerator):
-    def obtain(self, time: int) -> list[Passenger]:
-        passengers: list[Passenger] = []
-        if time % 50 in range(45, 55):
+    def obtainTrips(self, time: int) -> tuple[list[int], list[int]]:
+        if 45 <= time % 50 < 55:
             # More passengers from 3rd floor to 1st floor
-            for _ in range(int(round(self.busyMultiplier * 5))):
-                passengers.append(Passenger(3, 1))
-        else:
-            for _ in range(int(round(self.busyMultiplier * self.floorCount))):
-                origin = random.randint(0, self.floorCount - 1)
-                destination = random.randint(0, self.floorCount - 1)
-                while origin == destination:
-                    destination = random.randint(0, self.floorCount - 1)
-                passengers.append(Passenger(origin, destination))
-        return passengers
+            count = int(round(self.busyMultiplier * 5))
+            return [3] * count, [1] * count
+        origins: list[int] = []
+        destinations: list[int] = []
+        self._randomTrips(int(round(self.busyMultiplier * self.floorCount)), origins, destinations)
+        return origins, destinations
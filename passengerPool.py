@@ -0,0 +1,180 @@
+from array import array
+from typing import Literal
+
+from passenger import Clock
+
+# passenger states
+PASSENGER_FREE: int = 0
+PASSENGER_WAITING: int = 1
+PASSENGER_RIDING: int = 2
+
+
+class PassengerPool(object):
+    def __init__(self, clock: Clock, capacity: int = 256) -> None:
+        """
+        Passengers of a building as int32 columns, indexed by passenger number
+
+        Numbers of passengers that left are reused, so the pool only grows to the largest
+        number of passengers in the building at once. The columns are array.array("i"),
+        which index faster than NumPy arrays one element at a time; np.asarray(pool.origin)
+        gives a NumPy copy. sequence numbers the arrivals of the building (int64), so
+        passengers of a floor can be put back in arrival order.
+
+        :param clock: Clock of the building, stamps arrival times
+        :param capacity: initial number of rows, doubled when full
+        """
+        self.clock: Clock = clock
+        self.origin: array = array("i", bytes(4 * capacity))
+        self.destination: array = array("i", bytes(4 * capacity))
+        self.arrivalTime: array = array("i", bytes(4 * capacity))
+        self.boardTime: array = array("i", bytes(4 * capacity))
+        self.state: array = array("i", [PASSENGER_FREE]) * capacity
+        self.sequence: array = array("q", bytes(8 * capacity))
+        self.arrivals: int = 0
+        # free numbers, lowest on top
+        self._free: list[int] = list(range(capacity - 1, -1, -1))
+
+    def __len__(self) -> int:
+        """
+        Number of passengers in the building
+        """
+        return len(self.state) - len(self._free)
+
+    def _grow(self) -> None:
+        capacity = len(self.state)
+        for column in (self.origin, self.destination, self.arrivalTime, self.boardTime):
+            column.frombytes(bytes(4 * capacity))
+        self.state.extend(array("i", [PASSENGER_FREE]) * capacity)
+        self.sequence.frombytes(bytes(8 * capacity))
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def snapshot(self) -> tuple:
+        """
+        Copy of the columns, the arrival count and the free numbers, for restore()
+        """
+        return (self.origin[:], self.destination[:], self.arrivalTime[:], self.boardTime[:], self.state[:],
+                self.sequence[:], self.arrivals, self._free[:])
+
+    def restore(self, snapshot: tuple) -> None:
+        """
+        Return to the state of a snapshot, which stays usable
+
+        :param snapshot: result of snapshot()
+        :return: None
+        """
+        origin, destination, arrivalTime, boardTime, state, sequence, self.arrivals, free = snapshot
+        self.origin = origin[:]
+        self.destination = destination[:]
+        self.arrivalTime = arrivalTime[:]
+        self.boardTime = boardTime[:]
+        self.state = state[:]
+        self.sequence = sequence[:]
+        self._free = free[:]
+
+    def copy(self, clock: Clock) -> "PassengerPool":
+        """
+        Independent copy of the pool
+
+        :param clock: Clock of the copy
+        :return: PassengerPool
+        """
+        clone = PassengerPool.__new__(PassengerPool)
+        clone.clock = clock
+        clone.restore(self.snapshot())
+        return clone
+
+    def allocate(self, origin: int, destination: int) -> int:
+        """
+        Add a passenger arriving now
+
+        :param origin: origin floor
+        :param destination: destination floor
+        :return: passenger number
+        """
+        if not self._free:
+            self._grow()
+        index = self._free.pop()
+        self.origin[index] = origin
+        self.destination[index] = destination
+        self.arrivalTime[index] = self.clock.time
+        self.state[index] = PASSENGER_WAITING
+        self.sequence[index] = self.arrivals
+        self.arrivals += 1
+        return index
+
+    def board(self, index: int) -> None:
+        """
+        Mark a passenger as riding from now
+
+        :param index: passenger number
+        :return: None
+        """
+        self.state[index] = PASSENGER_RIDING
+        self.boardTime[index] = self.clock.time
+
+    def release(self, index: int) -> None:
+        """
+        Remove a passenger that left the building, its number is reused
+
+        :param index: passenger number
+        :return: None
+        """
+        self.state[index] = PASSENGER_FREE
+        self._free.append(index)
+
+    def press(self, index: int) -> Literal["up", "down"]:
+        """
+        Direction a passenger is going, as Passenger.press
+
+        :param index: passenger number
+        :return: "up" or "down"
+        """
+        return "up" if self.origin[index] < self.destination[index] else "down"
+
+    def view(self, index: int) -> "PassengerView":
+        """
+        Object view of a passenger, valid until it is released
+
+        :param index: passenger number
+        :return: PassengerView
+        """
+        return PassengerView(self, index)
+
+
+class PassengerView(object):
+    __slots__ = ("pool", "index")
+
+    def __init__(self, pool: PassengerPool, index: int) -> None:
+        """
+        Passenger-like view of a row of a PassengerPool
+
+        :param pool: PassengerPool
+        :param index: passenger number
+        """
+        self.pool: PassengerPool = pool
+        self.index: int = index
+
+    @property
+    def origin(self) -> int:
+        return self.pool.origin[self.index]
+
+    @property
+    def destination(self) -> int:
+        return self.pool.destination[self.index]
+
+    @property
+    def arrival_time(self) -> int:
+        return self.pool.arrivalTime[self.index]
+
+    @property
+    def state(self) -> int:
+        return self.pool.state[self.index]
+
+    def press(self) -> Literal["up", "down"]:
+        return self.pool.press(self.index)
+
+    def get_wait_time(self) -> int:
+        return self.pool.clock.time - self.arrival_time
+
+    def __str__(self):
+        return f'Passenger from {self.origin} to {self.destination}'
@@ -0,0 +1,230 @@
+import re
+from array import array
+from itertools import accumulate
+from typing import Iterable, Optional
+
+# values below 2 * HISTOGRAM_SUB_BUCKETS are counted exactly, larger ones in buckets of relative width
+# at most 1 / HISTOGRAM_SUB_BUCKETS
+HISTOGRAM_SUB_BITS: int = 5
+HISTOGRAM_SUB_BUCKETS: int = 1 << HISTOGRAM_SUB_BITS
+HISTOGRAM_BUCKETS: int = (32 - HISTOGRAM_SUB_BITS) * HISTOGRAM_SUB_BUCKETS
+
+
+def bucket_index(value: int) -> int:
+    """
+    Histogram bucket of a non-negative int32 value
+    """
+    if value < 2 * HISTOGRAM_SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - HISTOGRAM_SUB_BITS - 1
+    return HISTOGRAM_SUB_BUCKETS * shift + (value >> shift)
+
+
+def bucket_bounds(index: int) -> tuple[int, int]:
+    """
+    Smallest and largest value counted in a histogram bucket
+    """
+    if index < 2 * HISTOGRAM_SUB_BUCKETS:
+        return index, index
+    shift = index // HISTOGRAM_SUB_BUCKETS - 1
+    low = (index - HISTOGRAM_SUB_BUCKETS * shift) << shift
+    return low, low + (1 << shift) - 1
+
+
+class WaitHistogram(object):
+    def __init__(self) -> None:
+        """
+        Mergeable histogram of tick counts with log-linear buckets
+
+        Memory is fixed (HISTOGRAM_BUCKETS counters) however many values are added. Count, sum
+        and max are exact; quantiles are exact below 2 * HISTOGRAM_SUB_BUCKETS ticks and within
+        1 / HISTOGRAM_SUB_BUCKETS relative error above.
+        """
+        self.counts: array = array("q", bytes(8 * HISTOGRAM_BUCKETS))
+        self.count: int = 0
+        self.total: int = 0
+        self.max: int = 0
+
+    def add(self, value: int) -> None:
+        """
+        Count a value
+
+        :param value: ticks, 0 or more
+        :return: None
+        """
+        self.counts[value if value < 2 * HISTOGRAM_SUB_BUCKETS else bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def extend(self, values: Iterable[int]) -> None:
+        """
+        Count several values
+        """
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: "WaitHistogram") -> None:
+        """
+        Add the values counted by another histogram, e.g. of another run or process
+
+        :param other: WaitHistogram
+        :return: None
+        """
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def mean(self) -> float:
+        """
+        Mean value, 0 when empty
+        """
+        return self.total / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> int:
+        """
+        Value below which a fraction q of the counted values lies
+
+        :param q: fraction between 0 and 1
+        :return: upper bound of the bucket holding the quantile, capped by the max; 0 when empty
+        """
+        if not self.count:
+            return 0
+        rank = max(1, round(q * self.count))
+        for index, seen in enumerate(accumulate(self.counts)):
+            if seen >= rank:
+                return min(bucket_bounds(index)[1], self.max)
+        return self.max
+
+    def summary(self) -> dict[str, float]:
+        """
+        Count, mean, p50, p95, p99 and max
+        """
+        return {"count": self.count, "mean": self.mean(), "p50": self.quantile(0.5),
+                "p95": self.quantile(0.95), "p99": self.quantile(0.99), "max": self.max}
+
+
+class ServiceStats(object):
+    def __init__(self, floorCount: int, elevatorCount: int) -> None:
+        """
+        Wait and ride time distributions of a building, by origin floor and by elevator
+
+        Attach it with Floors(stats=...). The wait of a passenger is the time from arriving until
+        leaving the floor, aboard or not; the ride is the time from boarding until alighting.
+        Passengers are counted when they leave the floor without boarding and when they alight
+        (in Elevator.next), so no passenger is kept once it has left. Floors.recordUnfinished adds
+        those still in the building at the end of an episode.
+
+        One ServiceStats can be shared by several Floors of the same size, or merged afterwards.
+
+        :param floorCount: floor count of the building
+        :param elevatorCount: elevator count of the building
+        """
+        self.floorCount: int = floorCount
+        self.elevatorCount: int = elevatorCount
+        self.waitByFloor: list[WaitHistogram] = [WaitHistogram() for _ in range(floorCount)]
+        self.waitByElevator: list[WaitHistogram] = [WaitHistogram() for _ in range(elevatorCount)]
+        self.rideByElevator: list[WaitHistogram] = [WaitHistogram() for _ in range(elevatorCount)]
+        self.dropped: int = 0
+
+    def recordDropped(self, origin: int, wait: int) -> None:
+        """
+        Count a passenger that left the floor without boarding
+
+        :param origin: origin floor
+        :param wait: ticks waited
+        :return: None
+        """
+        self.waitByFloor[origin].add(wait)
+        self.dropped += 1
+
+    def recordTrip(self, elevator: int, origin: int, wait: int, ride: int) -> None:
+        """
+        Count a passenger that alighted
+
+        :param elevator: number of the elevator that carried it
+        :param origin: origin floor
+        :param wait: ticks waited on the floor
+        :param ride: ticks in the elevator
+        :return: None
+        """
+        self.waitByFloor[origin].add(wait)
+        self.waitByElevator[elevator].add(wait)
+        self.rideByElevator[elevator].add(ride)
+
+    def merge(self, other: "ServiceStats") -> None:
+        """
+        Add the distributions of another building of the same size
+
+        :param other: ServiceStats
+        :return: None
+        """
+        if (other.floorCount, other.elevatorCount) != (self.floorCount, self.elevatorCount):
+            raise ValueError("Cannot merge the stats of buildings of different sizes")
+        for mine, theirs in zip(self.waitByFloor + self.waitByElevator + self.rideByElevator,
+                                other.waitByFloor + other.waitByElevator + other.rideByElevator):
+            mine.merge(theirs)
+        self.dropped += other.dropped
+
+    def wait(self) -> WaitHistogram:
+        """
+        Wait time of every passenger counted
+        """
+        total = WaitHistogram()
+        for histogram in self.waitByFloor:
+            total.merge(histogram)
+        return total
+
+    def ride(self) -> WaitHistogram:
+        """
+        Ride time of every passenger counted
+        """
+        total = WaitHistogram()
+        for histogram in self.rideByElevator:
+            total.merge(histogram)
+        return total
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        """
+        WaitHistogram.summary of the waits and rides of the building
+        """
+        return {"wait": self.wait().summary(), "ride": self.ride().summary()}
+
+
+OBJECTIVE_PATTERN = re.compile(r"(mean|max|p\d{1,2})_(wait|ride)")
+
+
+def objective_value(stats: ServiceStats, objective: str) -> float:
+    """
+    Statistic named by an objective, lower is better
+
+    Objectives are <statistic>_<time>: statistic is mean, max or pNN (a percentile, e.g. p95),
+    time is wait or ride, e.g. "p99_wait" or "mean_ride".
+
+    :param stats: ServiceStats
+    :param objective: objective name
+    :return: value of the statistic
+    """
+    match = OBJECTIVE_PATTERN.fullmatch(objective)
+    if match is None:
+        raise ValueError(f"Unknown objective {objective!r}, use e.g. mean_wait, p95_wait, p99_ride or max_wait")
+    statistic, time = match.groups()
+    histogram = stats.wait() if time == "wait" else stats.ride()
+    if statistic == "mean":
+        return histogram.mean()
+    if statistic == "max":
+        return histogram.max
+    return histogram.quantile(int(statistic[1:]) / 100)
+
+
+def check_objective(objective: Optional[str]) -> None:
+    """
+    Raise ValueError for an objective name objective_value does not know, "total_wait" and None pass
+    """
+    if objective not in (None, "total_wait") and OBJECTIVE_PATTERN.fullmatch(objective) is None:
+        raise ValueError(f"Unknown objective {objective!r}, use total_wait or e.g. mean_wait, p95_wait, p99_ride")
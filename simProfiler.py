@@ -0,0 +1,89 @@
+# phases of Floors.next, floor requests are updated inside generate and take_in
+# skip is EventFloors.skip jumping over quiet steps
+PHASES: tuple[str, ...] = ("generate", "take_in", "elevator_next", "wait_accounting", "skip")
+COUNTERS: tuple[str, ...] = ("steps", "arrivals", "boardings", "alightings", "dropped", "rejected_boardings",
+                             "skipped_steps")
+
+
+class SimulationProfiler(object):
+    def __init__(self) -> None:
+        """
+        Wall time per phase and event counters of Floors.next
+
+        Attach it with Floors(profiler=...). Floors only checks for None when no
+        profiler is attached, so disabled profiling costs next to nothing.
+
+        Counters:
+
+            - arrivals: passengers generated
+            - boardings: passengers that entered an elevator
+            - alightings: passengers dropped off at their destination
+            - dropped: passengers that left the floor on a take in without boarding
+            - rejected_boardings: passengers heading the car's way left behind because it was full
+            - skipped_steps: quiet steps EventFloors jumped over, also counted in steps
+        """
+        self.phaseTimes: dict[str, float] = {}
+        self.counters: dict[str, int] = {}
+        self.queueLengthSum: int = 0
+        self.maxQueueLength: int = 0
+        self.maxFloorQueueLength: int = 0
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear all times and counters
+
+        :return: None
+        """
+        self.phaseTimes = {phase: 0.0 for phase in PHASES}
+        self.counters = {counter: 0 for counter in COUNTERS}
+        self.queueLengthSum = 0
+        self.maxQueueLength = 0
+        self.maxFloorQueueLength = 0
+
+    def recordQueues(self, waiting: int, longestFloor: int, steps: int = 1) -> None:
+        """
+        Record the waiting passengers at the end of a time step
+
+        :param waiting: passengers waiting on all floors
+        :param longestFloor: passengers waiting on the busiest floor
+        :param steps: number of time steps ending with these queues
+        :return: None
+        """
+        self.counters["steps"] += steps
+        self.queueLengthSum += waiting * steps
+        self.maxQueueLength = max(self.maxQueueLength, waiting)
+        self.maxFloorQueueLength = max(self.maxFloorQueueLength, longestFloor)
+
+    def merge(self, other: "SimulationProfiler") -> None:
+        """
+        Add the times and counters of another profiler, e.g. from another process
+
+        :param other: SimulationProfiler
+        :return: None
+        """
+        for phase, seconds in other.phaseTimes.items():
+            self.phaseTimes[phase] += seconds
+        for counter, count in other.counters.items():
+            self.counters[counter] += count
+        self.queueLengthSum += other.queueLengthSum
+        self.maxQueueLength = max(self.maxQueueLength, other.maxQueueLength)
+        self.maxFloorQueueLength = max(self.maxFloorQueueLength, other.maxFloorQueueLength)
+
+    def summary(self) -> dict:
+        """
+        Summary of the recorded times and counters
+
+        :return: dict with phase_seconds, counters and queue length statistics
+        """
+        steps = self.counters["steps"]
+        total = sum(self.phaseTimes.values())
+        return {
+            "phase_seconds": dict(self.phaseTimes),
+            "total_seconds": total,
+            "seconds_per_step": total / steps if steps else 0.0,
+            "counters": dict(self.counters),
+            "mean_queue_length": self.queueLengthSum / steps if steps else 0.0,
+            "max_queue_length": self.maxQueueLength,
+            "max_floor_queue_length": self.maxFloorQueueLength,
+        }
@@ -0,0 +1,163 @@
+"""
+Hyperparameter sweep over neat_config variants.
+
+Usage:
+    python sweep.py --grid pop_size=30,60 conn_add_prob=0.3,0.5 floors=20,40 --cores 4 --generations 20
+    python sweep.py --experiments experiments.json --cores 8
+
+Every experiment is a set of overrides of neat_config ("key" or "Section.key"), plus "floors" and
+"elevators" for the building size, "controller" (global or local) and "objective" (see train_neat.load_config).
+Configurations are built in memory, experiments run in parallel on at most --cores processes, and
+all of them train on the same traffic: generation g uses the traffic seed --seed + g * TOTAL_RUNS,
+generated once up front and memory-mapped by the workers.
+One row per experiment is written to a CSV table at the end.
+"""
+import argparse
+import csv
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import neat
+
+import train_neat
+from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, RANDOM_SEED
+
+RESULT_FIELDS: list[str] = ["best_fitness", "final_mean_fitness", "generations", "nodes", "connections", "seconds"]
+
+
+def generation_seed(base_seed: int, generation: int) -> int:
+    # runs of one generation use seed + 0 .. TOTAL_RUNS - 1, keep generations apart
+    return base_seed + generation * train_neat.TOTAL_RUNS
+
+
+def _init_sweep_worker(trace_directory: str) -> None:
+    train_neat.trace_directory = trace_directory
+
+
+def run_experiment(job: tuple[int, dict, int, int]) -> dict:
+    """
+    Train one configuration
+
+    :param job: experiment index, overrides, generations and base traffic seed
+    :return: the overrides with the RESULT_FIELDS of the run
+    """
+    index, overrides, generations, base_seed = job
+    neat_overrides = dict(overrides)
+    floors = int(neat_overrides.pop("floors", DEFAULT_ELEVATOR_FLOOR))
+    elevators = int(neat_overrides.pop("elevators", DEFAULT_ELEVATOR_COUNT))
+    controller = neat_overrides.pop("controller", "global")
+    objective = neat_overrides.pop("objective", "total_wait")
+    config = train_neat.load_config(neat_overrides, floors, elevators, controller=controller, objective=objective)
+
+    random.seed(base_seed + index)
+    population = neat.Population(config)
+    stats = neat.StatisticsReporter()
+    population.add_reporter(stats)
+    generation = itertools.count()
+
+    def evaluate(genomes, config) -> None:
+        train_neat.evaluate_genomes(genomes, config, generation_seed(base_seed, next(generation)))
+
+    start = time.perf_counter()
+    winner = population.run(evaluate, n=generations)
+    seconds = time.perf_counter() - start
+    nodes, connections = winner.size()
+    return {"experiment": index, **overrides,
+            "best_fitness": winner.fitness,
+            "final_mean_fitness": stats.get_fitness_mean()[-1],
+            "generations": len(stats.most_fit_genomes),
+            "nodes": nodes,
+            "connections": connections,
+            "seconds": round(seconds, 2)}
+
+
+def run_sweep(experiments: list[dict], generations: int, cores: int, base_seed: int = RANDOM_SEED) -> list[dict]:
+    """
+    Train every experiment, at most cores at a time
+
+    :param experiments: overrides of every experiment, see train_neat.load_config
+    :param generations: generations per experiment
+    :param cores: number of worker processes
+    :param base_seed: traffic seed of the first generation
+    :return: one result row per experiment, in experiment order
+    """
+    with tempfile.TemporaryDirectory(prefix="sweep-traffic-") as trace_directory:
+        for floors in sorted({int(e.get("floors", DEFAULT_ELEVATOR_FLOOR)) for e in experiments}):
+            for g in range(generations):
+                train_neat.save_generation_traces(trace_directory, generation_seed(base_seed, g), floors)
+
+        jobs = [(i, experiment, generations, base_seed) for i, experiment in enumerate(experiments)]
+        rows = []
+        # one experiment per worker process, so each starts from a clean state
+        with multiprocessing.Pool(min(cores, len(jobs)), initializer=_init_sweep_worker,
+                                  initargs=(trace_directory,), maxtasksperchild=1) as pool:
+            for row in pool.imap_unordered(run_experiment, jobs):
+                print(f"Experiment {row['experiment']} done: best fitness {row['best_fitness']} "
+                      f"in {row['seconds']}s")
+                rows.append(row)
+    return sorted(rows, key=lambda row: row["experiment"])
+
+
+def parse_grid(items: list[str]) -> list[dict]:
+    """
+    Cartesian product of key=value1,value2 items
+    """
+    keys, choices = [], []
+    for item in items:
+        key, values = item.split("=", 1)
+        keys.append(key)
+        choices.append(values.split(","))
+    return [dict(zip(keys, values)) for values in itertools.product(*choices)]
+
+
+def write_table(rows: list[dict], path: str) -> None:
+    """
+    Write the results as CSV and print them, best first
+    """
+    params = []
+    for row in rows:
+        for key in row:
+            if key not in params and key != "experiment" and key not in RESULT_FIELDS:
+                params.append(key)
+    fields = ["experiment"] + params + RESULT_FIELDS
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, restval="")
+        writer.writeheader()
+        writer.writerows(rows)
+
+    widths = {field: max(len(field), *(len(str(row.get(field, ""))) for row in rows)) for field in fields}
+    print("  ".join(field.ljust(widths[field]) for field in fields))
+    for row in sorted(rows, key=lambda row: row["best_fitness"], reverse=True):
+        print("  ".join(str(row.get(field, "")).ljust(widths[field]) for field in fields))
+    print("Results written to", path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run NEAT hyperparameter sweeps in parallel")
+    parser.add_argument("--grid", nargs="+", default=[], metavar="KEY=V1,V2",
+                        help="config overrides to combine, e.g. pop_size=30,60 floors=20,40")
+    parser.add_argument("--experiments", help="JSON file with a list of override dicts")
+    parser.add_argument("--generations", type=int, default=20, help="generations per experiment (default: 20)")
+    parser.add_argument("--cores", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="traffic seed of the first generation")
+    parser.add_argument("--output", default="sweep_results.csv", help="CSV file to write")
+    args = parser.parse_args()
+
+    experiments = parse_grid(args.grid) if args.grid else []
+    if args.experiments:
+        with open(args.experiments, "r") as f:
+            experiments += json.load(f)
+    if not experiments:
+        parser.error("no experiments, use --grid or --experiments")
+
+    rows = run_sweep(experiments, args.generations, args.cores, args.seed)
+    write_table(rows, args.output)
+
+
+if __name__ == "__main__":
+    main()
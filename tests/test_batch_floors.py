@@ -0,0 +1,68 @@
+import random
+
+import numpy as np
+import pytest
+
+from batchFloor import BatchFloors
+from floor import Floors
+from obtainPassenger import TimeCapture
+from trafficTrace import TrafficTrace, TracePassengerGenerator
+
+
+def run_side_by_side(capacity: int, busyMultiplier: float, floorCount: int = 12, elevatorCount: int = 3,
+                     buildingCount: int = 4, steps: int = 300) -> None:
+    traces = [TrafficTrace.generate(floorCount, steps, seed, TimeCapture, busyMultiplier)
+              for seed in range(buildingCount)]
+    batch = BatchFloors(buildingCount, [TracePassengerGenerator(trace) for trace in traces],
+                        elevatorCount, floorCount, capacity)
+    buildings = [Floors(TracePassengerGenerator(trace), elevatorCount, floorCount, capacity) for trace in traces]
+    rng = np.random.default_rng(capacity)
+    for _ in range(steps):
+        directions = rng.integers(-1, 2, (buildingCount, elevatorCount))
+        takeIns = rng.random((buildingCount, elevatorCount)) < 0.6
+        for building, direction, takeIn in zip(buildings, directions, takeIns):
+            building.applyActions(direction, takeIn)
+            building.next()
+        batch.step(directions, takeIns)
+        assert batch.totalWaitTime.tolist() == [building.totalWaitTime for building in buildings]
+        assert batch.position.tolist() == [building.getElevatorLocation() for building in buildings]
+        assert batch.load.tolist() == [building.getElevatorLoads() for building in buildings]
+        assert batch.waitingUp.tolist() == [building.upWaiting for building in buildings]
+        assert batch.waitingDown.tolist() == [building.downWaiting for building in buildings]
+
+
+@pytest.mark.parametrize("capacity", [1, 3, 10])
+@pytest.mark.parametrize("busyMultiplier", [0.3, 1.0])
+def test_batch_floors_matches_floors(capacity, busyMultiplier):
+    # small capacities fill the car, so boarding order decides who rides
+    run_side_by_side(capacity, busyMultiplier)
+
+
+def test_observe_matches_floors():
+    traces = [TrafficTrace.generate(8, 50, seed, TimeCapture, 0.5) for seed in range(2)]
+    batch = BatchFloors(2, [TracePassengerGenerator(trace) for trace in traces], 2, 8)
+    buildings = [Floors(TracePassengerGenerator(trace), 2, 8) for trace in traces]
+    for step in range(50):
+        directions = np.array([[1, -1], [0, 1]]) * (1 if step % 20 < 10 else -1)
+        takeIns = np.full((2, 2), step % 3 == 0)
+        for building, direction, takeIn in zip(buildings, directions, takeIns):
+            building.applyActions(direction, takeIn)
+            building.next()
+        batch.step(directions, takeIns)
+    np.testing.assert_array_equal(batch.observe(), np.stack([building.observe() for building in buildings]))
+
+
+def test_population_evaluation_matches_floors():
+    neat = pytest.importorskip("neat")
+    import train_neat
+
+    random.seed(0)
+    fitness = {}
+    for engine in ("floors", "batch"):
+        config = train_neat.load_config(floors=10, elevators=2, engine=engine)
+        population = neat.Population(config)
+        genomes = list(population.population.items())[:5]
+        train_neat.evaluate_genomes(genomes, config, seed=3)
+        fitness[engine] = [genome.fitness for _, genome in genomes]
+        random.seed(0)
+    assert fitness["batch"] == fitness["floors"]
@@ -0,0 +1,54 @@
+import os
+import random
+
+import neat
+import pytest
+
+import train_neat
+from checkpoints import BackgroundCheckpointer, read_manifest, restore_checkpoint
+
+
+def assign_fitness(genomes, config) -> None:
+    # below the fitness threshold, so every generation runs
+    for _, genome in genomes:
+        genome.fitness = -1e9 * random.random()
+
+
+def small_config(**kwargs) -> neat.Config:
+    # a small building keeps the networks small
+    return train_neat.load_config({"pop_size": 8}, **{"floors": 3, "elevators": 1, **kwargs})
+
+
+def train(directory: str, generations: int, run=None) -> str:
+    config = small_config()
+    population = neat.Population(config)
+    checkpointer = BackgroundCheckpointer(directory, generation_interval=1, keep=2, run=run)
+    population.add_reporter(checkpointer)
+    try:
+        population.run(assign_fitness, n=generations)
+    finally:
+        checkpointer.close()
+    return checkpointer.run
+
+
+def test_new_run_keeps_snapshots_of_earlier_runs(tmp_path):
+    directory = str(tmp_path)
+    first = train(directory, 8, run="first")
+    first_files = set(os.listdir(directory))
+    second = train(directory, 3, run="second")
+    assert first_files <= set(os.listdir(directory))
+    assert {entry["run"] for entry in read_manifest(directory)} == {first, second}
+    for entry in read_manifest(directory):
+        assert os.path.exists(os.path.join(directory, entry["path"]))
+
+    population, _, _, run = restore_checkpoint(directory, "latest")
+    assert run == second
+    assert population.generation == 2
+
+
+@pytest.mark.parametrize("options", [{"floors": 4}, {"controller": "local"}, {"objective": "p95_wait"}])
+def test_restore_rejects_other_training_settings(tmp_path, options):
+    train(str(tmp_path), 2)
+    restore_checkpoint(str(tmp_path), "latest", small_config())
+    with pytest.raises(ValueError):
+        restore_checkpoint(str(tmp_path), "latest", small_config(**options))
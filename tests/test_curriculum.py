@@ -0,0 +1,51 @@
+import random
+
+import neat
+
+import train_neat
+from curriculum import CurriculumScheduler, CurriculumStage, DEFAULT_CURRICULUM
+
+
+def test_last_default_stage_is_the_training_traffic():
+    config = train_neat.load_config()
+    config.curriculum_stage = DEFAULT_CURRICULUM[-1]
+    assert DEFAULT_CURRICULUM[-1].isFull()
+    assert train_neat.fitness_scale(config, 5) == 1
+    for staged, full in zip(train_neat.episode_traces(config, 5), train_neat.generation_traces(5)):
+        assert staged.ticks.tolist() == full.ticks.tolist()
+        assert staged.origins.tolist() == full.origins.tolist()
+        assert staged.destinations.tolist() == full.destinations.tolist()
+
+
+def test_stages_thin_the_traffic():
+    config = train_neat.load_config()
+    config.curriculum_stage = CurriculumStage(train_neat.TOTAL_STEPS, 1, intensity=0.5)
+    staged = train_neat.episode_traces(config, 5)
+    assert len(staged) == 1
+    assert 0.4 < len(staged[0]) / len(train_neat.generation_traces(5)[0]) < 0.6
+    assert train_neat.fitness_scale(config, 5) > train_neat.TOTAL_RUNS
+
+
+def test_stage_changes_keep_the_fitness_history():
+    config = train_neat.load_config({"pop_size": 8}, floors=3, elevators=1)
+    population = neat.Population(config)
+    scheduler = CurriculumScheduler(population, [CurriculumStage(20, 1, generations=2),
+                                                 CurriculumStage(train_neat.TOTAL_STEPS, train_neat.TOTAL_RUNS)])
+    population.add_reporter(scheduler)
+    stages = []
+    last_stage = set()
+
+    def evaluate(genomes, config) -> None:
+        stages.append(config.curriculum_stage)
+        if config.curriculum_stage is scheduler.stages[-1]:
+            last_stage.update(genome_id for genome_id, _ in genomes)
+        for _, genome in genomes:
+            # the first stage scores better, as if it were easier
+            genome.fitness = -1e6 * random.random() / (10 if len(stages) <= 2 else 1)
+
+    population.run(evaluate, n=4)
+    assert stages == [scheduler.stages[0]] * 2 + [scheduler.stages[1]] * 2
+    first = [species for species in population.species.species.values() if species.created == 0]
+    assert first and all(len(species.fitness_history) == 4 for species in first)
+    # the winner was evaluated at the last stage
+    assert scheduler.best is not None and scheduler.best.key in last_stage
@@ -0,0 +1,29 @@
+import pytest
+
+from episodeRecorder import EpisodeRecorder, EpisodeReplay
+from floor import Floors
+from obtainPassenger import TimeCapture
+
+
+def record(directory: str, steps: int, seed: int, append: bool = False) -> None:
+    floors = Floors(TimeCapture(6, 0.5, seed), 2, 6)
+    with EpisodeRecorder(directory, 6, 2, bufferTicks=16, append=append) as recorder:
+        for _ in range(steps):
+            floors.applyActions([1, -1], [True, True])
+            recorder.record(floors)
+            floors.next()
+
+
+def test_recording_again_needs_append(tmp_path):
+    directory = str(tmp_path / "episodes")
+    record(directory, 40, 0)
+    with pytest.raises(FileExistsError):
+        record(directory, 30, 1)
+    assert len(EpisodeReplay(directory)) == 40
+
+    record(directory, 30, 1, append=True)
+    replay = EpisodeReplay(directory)
+    assert len(replay) == 70
+    assert replay.episodes == [0, 40]
+    assert replay.episode(-1)["time"][:, 0].tolist() == list(range(30))
+    assert replay.episode(0)["time"][:, 0].tolist() == list(range(40))
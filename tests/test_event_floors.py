@@ -0,0 +1,69 @@
+import pytest
+
+from demandProfile import ProfilePassengerGenerator, office_day_profile
+from eventFloors import EventFloors
+from floor import Floors
+from serviceStats import ServiceStats
+from simProfiler import SimulationProfiler
+from trafficTrace import TrafficTrace, TracePassengerGenerator
+
+
+def sweep(floors: Floors) -> None:
+    # every car sweeps between the ends and takes everyone in; the actions only change at the ends,
+    # which are decision points, so consulting it every step or at decision points gives the same run
+    directions = []
+    for position, direction in zip(floors.getElevatorLocation(), floors.getElevatorDirection()):
+        if position == len(floors.getWaitingCounts()) - 1:
+            direction = "down"
+        elif position == 0 or direction == "idle":
+            direction = "up"
+        directions.append(direction)
+    floors.setElevatorDirection(directions)
+    floors.setTakeIns([True] * len(directions))
+
+
+def generators(kind: str, floorCount: int, steps: int, seed: int):
+    if kind == "profile":
+        profile = office_day_profile(floorCount, 2000, busyMultiplier=0.002)
+        return (ProfilePassengerGenerator(profile, floorCount, seed, blockSize=500),
+                ProfilePassengerGenerator(profile, floorCount, seed, blockSize=500))
+    trace = office_day_profile(floorCount, steps, busyMultiplier=0.002).generate(floorCount, steps, seed)
+    return TracePassengerGenerator(trace), TracePassengerGenerator(trace)
+
+
+@pytest.mark.parametrize("kind", ["profile", "trace"])
+@pytest.mark.parametrize("seed", [1, 2])
+def test_event_floors_matches_floors(kind, seed):
+    floorCount, elevatorCount, steps = 20, 3, 4000
+    stepped, evented = generators(kind, floorCount, steps, seed)
+    floors = Floors(stepped, elevatorCount, floorCount, stats=ServiceStats(floorCount, elevatorCount))
+    for _ in range(steps):
+        sweep(floors)
+        floors.next()
+    profiler = SimulationProfiler()
+    events = EventFloors(evented, elevatorCount, floorCount, profiler=profiler,
+                         stats=ServiceStats(floorCount, elevatorCount))
+    events.run(sweep, steps)
+
+    assert events.time == floors.time == steps
+    assert events.totalWaitTime == floors.totalWaitTime
+    assert events.getElevatorLocation() == floors.getElevatorLocation()
+    assert events.stats.summary() == floors.stats.summary()
+    # quiet steps were skipped, and still counted by the profiler
+    assert events.skippedSteps > steps // 2
+    assert profiler.counters["skipped_steps"] == events.skippedSteps
+    assert profiler.counters["steps"] == steps
+
+
+def test_profile_next_arrival_draws_the_same_passengers():
+    profile = office_day_profile(10, 1000, busyMultiplier=0.005)
+    stepped = ProfilePassengerGenerator(profile, 10, 3, blockSize=100)
+    skipping = ProfilePassengerGenerator(profile, 10, 3, blockSize=100)
+    arrivals = [(time, trip) for time in range(1000) for trip in zip(*stepped.obtainTrips(time))]
+    skipped = []
+    time = 0
+    while time < 1000:
+        time = skipping.nextArrival(time)
+        skipped.extend((time, trip) for trip in zip(*skipping.obtainTrips(time)))
+        time += 1
+    assert skipped == arrivals
@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from elevator import Elevator
+from floor import Floors
+from floorQueue import FloorQueue
+from obtainPassenger import TimeCapture, RandomPassengerGenerator
+from passenger import Clock
+from passengerPool import PassengerPool
+
+# totals after 50, 150 and 250 steps, passengers still waiting and the sum of their wait times,
+# from the simulator before the clock-based wait accounting, the pool and the bucketed cars
+BASELINE: dict[tuple[str, int], tuple[int, int, int, int, int]] = {
+    ("TimeCapture", 1): (6387, 47025, 114939, 615, 69570),
+    ("TimeCapture", 2): (6374, 51277, 133144, 782, 95922),
+    ("TimeCapture", 3): (6638, 46409, 104034, 497, 47959),
+    ("RandomPassengerGenerator", 1): (6427, 49900, 121417, 709, 75502),
+    ("RandomPassengerGenerator", 2): (6446, 49260, 124361, 801, 92327),
+    ("RandomPassengerGenerator", 3): (6690, 53217, 139828, 842, 101567),
+}
+
+
+def seeded_episode(generatorType, seed: int, floorCount: int = 15, elevatorCount: int = 3, busyMultiplier: float = 0.4,
+                   steps: int = 250) -> tuple[list[int], Floors]:
+    # cars never fill, the old floors were sets and boarded in no particular order once they did
+    floors = Floors(generatorType(floorCount, busyMultiplier, seed), elevatorCount, floorCount, elevatorCapacity=1000)
+    actions = random.Random(seed + 1000)
+    totals = []
+    for _ in range(steps):
+        floors.setElevatorDirection([actions.choice(["up", "down", "idle"]) for _ in range(elevatorCount)])
+        floors.setTakeIns([actions.random() < 0.5 for _ in range(elevatorCount)])
+        totals.append(floors.next())
+    return totals, floors
+
+
+@pytest.mark.parametrize("generatorType", [TimeCapture, RandomPassengerGenerator])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_matches_baseline(generatorType, seed):
+    totals, floors = seeded_episode(generatorType, seed)
+    waits = [passenger.get_wait_time() for floor in range(len(floors.getWaitingCounts()))
+             for passenger in floors.getWaitingPassengers(floor)]
+    assert (totals[49], totals[149], totals[-1], len(waits), sum(waits)) == BASELINE[generatorType.__name__, seed]
+
+
+def test_total_wait_counts_every_passenger_every_step():
+    totals, floors = seeded_episode(TimeCapture, 4, steps=120)
+    waiting = sum(floors.getWaitingCounts())
+    riding = sum(floors.getElevatorLoads())
+    assert floors.passengerCount == waiting + riding
+    assert totals[-1] - totals[-2] == waiting + riding
+
+
+def reference_take(passengers: list[tuple[int, str]], direction: str, space: int) -> tuple[list[int], list[int]]:
+    # the old Elevator.add_passengers on a floor kept in arrival order
+    boarded, left = [], []
+    for passenger, going in passengers:
+        if len(boarded) < space:
+            (boarded if going == direction else left).append(passenger)
+    return boarded, left
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_floor_queue_takes_in_arrival_order(seed):
+    rng = random.Random(seed)
+    pool = PassengerPool(Clock())
+    floor = FloorQueue(pool)
+    passengers = []
+    for _ in range(rng.randint(0, 30)):
+        destination = rng.choice([0, 2])
+        passenger = pool.allocate(1, destination)
+        going = pool.press(passenger)
+        floor.append(passenger, going)
+        passengers.append((passenger, going))
+    assert list(floor) == [passenger for passenger, _ in passengers]
+
+    direction = rng.choice(["up", "down", "idle"])
+    space = rng.randint(0, 12)
+    boarded, left = floor.take(direction, space)
+    expected = reference_take(passengers, direction, space)
+    assert (boarded, sorted(left)) == (expected[0], sorted(expected[1]))
+    assert list(floor) == [passenger for passenger, _ in passengers if passenger not in boarded + left]
+
+
+def test_elevator_drops_only_riders_of_the_floor():
+    elevator = Elevator(capacity=10, max_floor=10)
+    for destination in (1, 2, 2, 5):
+        elevator.add(elevator.pool.allocate(0, destination))
+    elevator.set_direction("up")
+    assert elevator.next() == 1
+    assert elevator.current_floor == 1
+    for _ in range(3):
+        # unloading
+        assert elevator.next() == 0
+    assert elevator.next() == 2
+    assert sorted(elevator.get_internal_requests()) == [5]
@@ -0,0 +1,166 @@
+import copy
+import json
+from typing import Type, Optional
+
+import numpy as np
+
+from obtainPassenger import PassengerGenerator, TimeCapture
+
+from elevatorConstants import DEFAULT_BUSY_MULTIPLIER
+
+TRACE_DTYPE = np.dtype([("tick", np.int32), ("origin", np.int32), ("destination", np.int32)])
+
+
+class TrafficTrace(object):
+    def __init__(self,
+                 ticks: np.ndarray,
+                 origins: np.ndarray,
+                 destinations: np.ndarray,
+                 length: int,
+                 floorCount: int) -> None:
+        """
+        Arrivals of one episode, stored as arrays sorted by tick
+
+        :param ticks: arrival tick of every passenger
+        :param origins: origin floor of every passenger
+        :param destinations: destination floor of every passenger
+        :param length: number of ticks in the episode
+        :param floorCount: floor count of the building
+        """
+        order = np.argsort(ticks, kind="stable")
+        self.ticks: np.ndarray = np.asarray(ticks, dtype=np.int32)[order]
+        self.origins: np.ndarray = np.asarray(origins, dtype=np.int32)[order]
+        self.destinations: np.ndarray = np.asarray(destinations, dtype=np.int32)[order]
+        self.length: int = length
+        self.floorCount: int = floorCount
+        # arrivals of tick t are self.ticks[offsets[t]:offsets[t + 1]]
+        self.offsets: np.ndarray = np.searchsorted(self.ticks, np.arange(length + 1), side="left")
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    @classmethod
+    def record(cls, generator: PassengerGenerator, length: int) -> "TrafficTrace":
+        """
+        Record the passengers a generator produces over an episode
+
+        :param generator: PassengerGenerator to record
+        :param length: number of ticks to record
+        :return: TrafficTrace
+        """
+        ticks, origins, destinations = [], [], []
+        for time in range(length):
+            tickOrigins, tickDestinations = generator.obtainTrips(time)
+            ticks.extend([time] * len(tickOrigins))
+            origins.extend(tickOrigins)
+            destinations.extend(tickDestinations)
+        return cls(np.array(ticks, dtype=np.int32), np.array(origins, dtype=np.int32),
+                   np.array(destinations, dtype=np.int32), length, generator.floorCount)
+
+    @classmethod
+    def generate(cls,
+                 floorCount: int,
+                 length: int,
+                 seed: int,
+                 generatorType: Type[PassengerGenerator] = TimeCapture,
+                 busyMultiplier: float = DEFAULT_BUSY_MULTIPLIER) -> "TrafficTrace":
+        """
+        Build the arrivals of an episode from a seed
+
+        :param floorCount: floor count of the building
+        :param length: number of ticks in the episode
+        :param seed: seed of the passenger generator
+        :param generatorType: PassengerGenerator subclass producing the traffic
+        :param busyMultiplier: busy multiplier of the generator
+        :return: TrafficTrace
+        """
+        return cls.record(generatorType(floorCount, busyMultiplier, seed), length)
+
+    def arrivals(self, time: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Get the arrivals of a tick
+
+        :param time: tick
+        :return: origins and destinations of the passengers arriving at that tick
+        """
+        if time >= self.length:
+            return self.origins[:0], self.destinations[:0]
+        start, end = self.offsets[time], self.offsets[time + 1]
+        return self.origins[start:end], self.destinations[start:end]
+
+    def idleWait(self) -> int:
+        """
+        Total wait of the trace if no passenger is ever picked up: every passenger waits from its
+        arrival to the end of the trace
+        """
+        return int((self.length - self.ticks.astype(np.int64)).sum())
+
+    def save(self, path: str) -> None:
+        """
+        Save the trace as a .npy record array, with its length and floor count in path + ".json"
+
+        :param path: file path of the .npy file
+        :return: None
+        """
+        records = np.empty(len(self), dtype=TRACE_DTYPE)
+        records["tick"] = self.ticks
+        records["origin"] = self.origins
+        records["destination"] = self.destinations
+        with open(path, "wb") as f:
+            np.save(f, records)
+        with open(path + ".json", "w") as f:
+            json.dump({"length": self.length, "floorCount": self.floorCount}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "TrafficTrace":
+        """
+        Load a trace saved with save()
+
+        :param path: file path of the .npy file
+        :param mmap: memory-map the file instead of reading it, so processes share the pages
+        :return: TrafficTrace
+        """
+        records = np.load(path, mmap_mode="r" if mmap else None)
+        with open(path + ".json", "r") as f:
+            meta = json.load(f)
+        trace = cls.__new__(cls)
+        # saved traces are already sorted, keep the (memory-mapped) columns as they are
+        trace.ticks = records["tick"]
+        trace.origins = records["origin"]
+        trace.destinations = records["destination"]
+        trace.length = meta["length"]
+        trace.floorCount = meta["floorCount"]
+        trace.offsets = np.searchsorted(trace.ticks, np.arange(trace.length + 1), side="left")
+        return trace
+
+
+class TracePassengerGenerator(PassengerGenerator):
+    def __init__(self, trace: TrafficTrace) -> None:
+        """
+        Replay a recorded trace, so every simulation of it sees the same passengers
+
+        :param trace: TrafficTrace to replay
+        """
+        super().__init__(trace.floorCount)
+        self.trace: TrafficTrace = trace
+
+    def getState(self) -> None:
+        # replaying a trace only depends on the time
+        return None
+
+    def setState(self, state: None) -> None:
+        pass
+
+    def fork(self) -> "TracePassengerGenerator":
+        # the trace is never modified, share it
+        return copy.copy(self)
+
+    def nextArrival(self, time: int) -> Optional[int]:
+        index = int(np.searchsorted(self.trace.ticks, time, side="left"))
+        if index >= len(self.trace):
+            return None
+        return int(self.trace.ticks[index])
+
+    def obtainTrips(self, time: int) -> tuple[list[int], list[int]]:
+        origins, destinations = self.trace.arrivals(time)
+        return origins.tolist(), destinations.tolist()
@@ -1,46 +1,43 @@
+import argparse
+import configparser
+import functools
+import multiprocessing
+import os
 import pickle
+import random
+import tempfile
 from collections.abc import Iterable
-from typing import Literal
+from typing import Literal, Optional
 
 import neat
+import numpy as np
 
-from elevatorConstants import DEFAULT_ELEVATOR_FLOOR
+from elevatorConstants import DEFAULT_ELEVATOR_FLOOR, DEFAULT_ELEVATOR_COUNT, RANDOM_SEED, TOTAL_STEPS, TOTAL_RUNS
 from floor import Floors
-from obtainPassenger import TimeCapture
-import matplotlib.pyplot as plt
-from neat.checkpoint import Checkpointer
-
-def convert_input(value):
-    if value == "up":
-        return 1
-    elif value == "idle":
-        return 0
-    elif value == "down":
-        return -1
-    elif isinstance(value, bool):
-        return float(value)
-    else:
-        return float(value)
-
-
-def convert_output(value: list, elevator_locations: list[int]):
-    outputs = []
-    for i in range(len(elevator_locations)):
-        if value[i] == 0:
-            outputs.append("idle")
-        elif value[i] > 0:
-            outputs.append("up")
-        elif value[i] < 0:
-            outputs.append("down")
-    for i in range(len(elevator_locations), len(value)):
-        if value[i] > 0:
-            outputs.append(True)
-        else:
-            outputs.append(False)
-    return outputs
+from batchFloor import BatchFloors
+from eventFloors import EventFloors
+from simProfiler import SimulationProfiler
+from serviceStats import ServiceStats, check_objective, objective_value
+from compiledNetwork import compile_genome
+from fitnessCache import FitnessCache, genome_key, DEFAULT_CACHE_SIZE
+from checkpoints import BackgroundCheckpointer, restore_checkpoint
+from curriculum import CurriculumScheduler, load_curriculum
+from demandProfile import ProfilePassengerGenerator, time_capture_profile
+from episodeRecorder import EpisodeRecorder
+from trafficTrace import TrafficTrace, TracePassengerGenerator
+
+CONFIG_PATH: str = "neat_config"
+# simulators genomes can be evaluated with, see simulate_genome
+ENGINES: tuple[str, ...] = ("floors", "batch", "event")
+
+# directory of traces saved by save_generation_traces, loaded instead of generated when set
+trace_directory: Optional[str] = None
 
 
 def plot_fitness(stats):
+    # imported here so worker processes never load matplotlib
+    import matplotlib.pyplot as plt
+
     generation = range(len(stats.most_fit_genomes))
     best_fitness = [c.fitness for c in stats.most_fit_genomes]
     avg_fitness = [c for c in stats.get_fitness_mean()]
@@ -58,129 +55,831 @@ def plot_fitness(stats):
     plt.show()
 
 
+def load_config(overrides: Optional[dict] = None,
+                floors: int = DEFAULT_ELEVATOR_FLOOR,
+                elevators: int = DEFAULT_ELEVATOR_COUNT,
+                path: str = CONFIG_PATH,
+                controller: Literal["global", "local"] = "global",
+                objective: str = "total_wait",
+                engine: str = "floors") -> neat.Config:
+    """
+    Build the NEAT configuration in memory, leaving the config file untouched.
+
+    num_inputs and num_outputs are set from the controller and the building size:
+
+        - global: one network sees the whole building (Floors.observe) and drives every elevator
+        - local: one shared network is evaluated per elevator on its Floors.observeLocal view and
+          outputs its direction and take in, so its size does not depend on the building
+
+    The building size, controller, objective and engine are kept on the config as floor_count, elevator_count,
+    controller, objective and engine.
+
+    :param overrides: values replacing those of the file, keyed by "Section.key" or by a key found in a single section
+    :param floors: floor count of the building
+    :param elevators: elevator count of the building
+    :param path: NEAT config file to start from
+    :param controller: "global" or "local"
+    :param objective: fitness objective, see evaluate_genome
+    :param engine: simulator of the evaluations, one of ENGINES, see simulate_genome
+    :return: neat.Config
+    """
+    check_objective(objective)
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}, use one of {', '.join(ENGINES)}")
+    if engine == "batch" and (controller != "global" or objective != "total_wait"):
+        raise ValueError("The batch engine only runs the global controller on the total_wait objective")
+    parser = configparser.ConfigParser()
+    with open(path, "r") as f:
+        parser.read_file(f)
+    if controller == "global":
+        values = {"DefaultGenome.num_inputs": 1 + 2 * elevators + 3 * floors,
+                  "DefaultGenome.num_outputs": 2 * elevators}
+    elif controller == "local":
+        values = {"DefaultGenome.num_inputs": Floors.localObservationSize(), "DefaultGenome.num_outputs": 2}
+    else:
+        raise ValueError(f"Unknown controller {controller!r}, use 'global' or 'local'")
+    values.update(overrides or {})
+    for name, value in values.items():
+        if "." in name:
+            section, key = name.split(".", 1)
+        else:
+            sections = [section for section in parser.sections() if parser.has_option(section, name)]
+            if len(sections) != 1:
+                raise KeyError(f"Config key {name!r} is in {len(sections)} sections, use Section.{name}")
+            section, key = sections[0], name
+        if not parser.has_section(section):
+            raise KeyError(f"No section {section!r} in {path}")
+        parser.set(section, key, str(value))
+
+    # neat.Config only reads files
+    fd, temp_path = tempfile.mkstemp(suffix=".cfg", text=True)
+    try:
+        with os.fdopen(fd, "w") as f:
+            parser.write(f)
+        config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                             neat.DefaultSpeciesSet, neat.DefaultStagnation, temp_path)
+    finally:
+        os.remove(temp_path)
+    config.floor_count = floors
+    config.elevator_count = elevators
+    config.controller = controller
+    config.objective = objective
+    config.engine = engine
+    return config
+
+
+def controller_mode(config) -> Literal["global", "local"]:
+    """
+    Controller a configuration was made for, see load_config; "global" for configs read directly with neat.Config
+    """
+    return getattr(config, "controller", "global")
+
+
+def fitness_objective(config) -> str:
+    """
+    Fitness objective a configuration was made for, see load_config; "total_wait" for configs read directly
+    """
+    return getattr(config, "objective", "total_wait")
+
+
+def simulation_engine(config) -> str:
+    """
+    Simulator a configuration evaluates genomes with, see load_config; "floors" for configs read directly
+    """
+    return getattr(config, "engine", "floors")
+
+
+def building_size(config) -> tuple[int, int]:
+    """
+    Building a configuration was made for, as set by load_config or else from its input and output counts
+
+    :param config: NEAT configuration
+    :return: floor count and elevator count
+    """
+    if hasattr(config, "floor_count"):
+        return config.floor_count, config.elevator_count
+    elevators = config.genome_config.num_outputs // 2
+    return (config.genome_config.num_inputs - 1 - 2 * elevators) // 3, elevators
+
+
+def curriculum_stage(config):
+    """
+    Curriculum stage a configuration is evaluated at, set by curriculum.CurriculumScheduler; None without a curriculum
+    """
+    return getattr(config, "curriculum_stage", None)
+
+
+def episode_shape(config) -> tuple[int, int, float, float]:
+    """
+    Episodes a genome is evaluated on: those of the curriculum stage, or TOTAL_STEPS and TOTAL_RUNS of the full traffic
+
+    :param config: NEAT configuration
+    :return: steps per run, number of runs, and the fractions of random and burst passengers kept, see generation_traces
+    """
+    stage = curriculum_stage(config)
+    if stage is None:
+        return TOTAL_STEPS, TOTAL_RUNS, 1.0, 1.0
+    return stage.steps, stage.runs, stage.intensity, stage.burst
+
+
+def trace_path(directory: str, floors: int, seed: int, steps: int = TOTAL_STEPS,
+               intensity: float = 1.0, burst: float = 1.0) -> str:
+    """
+    File of the trace of one run seed, see save_generation_traces
+    """
+    return os.path.join(directory, f"traffic-{floors}-{steps}-{intensity:g}-{burst:g}-{seed}.npy")
+
+
+@functools.lru_cache(maxsize=4)
+def generation_traces(seed: int, floors: int = DEFAULT_ELEVATOR_FLOOR, steps: int = TOTAL_STEPS,
+                      runs: int = TOTAL_RUNS, intensity: float = 1.0, burst: float = 1.0
+                      ) -> tuple[TrafficTrace, ...]:
+    """
+    Traffic of every run for a traffic seed, generated once and replayed for every genome.
+
+    :param seed: traffic seed, run i uses seed + i
+    :param floors: floor count of the building
+    :param steps: ticks per run
+    :param runs: number of runs
+    :param intensity: fraction of the random passengers kept, see demandProfile.time_capture_profile
+    :param burst: fraction of the burst passengers kept
+    :return: one TrafficTrace per run
+    """
+    if trace_directory is not None:
+        paths = [trace_path(trace_directory, floors, seed + i, steps, intensity, burst) for i in range(runs)]
+        if all(os.path.exists(path) for path in paths):
+            return tuple(TrafficTrace.load(path) for path in paths)
+    profile = time_capture_profile(floors, intensity=intensity, burst=burst)
+    return tuple(profile.generate(floors, steps, seed + i) for i in range(runs))
+
+
+def episode_traces(config, seed: int) -> tuple[TrafficTrace, ...]:
+    """
+    Traffic of every run genomes are evaluated on, see episode_shape and generation_traces
+    """
+    return generation_traces(seed, building_size(config)[0], *episode_shape(config))
+
+
+def fitness_scale(config, seed: int) -> float:
+    """
+    Factor of the total wait fitness at a curriculum stage, 1 without a curriculum
+
+    Idle wait (see TrafficTrace.idleWait) of the full episodes (TOTAL_STEPS, TOTAL_RUNS, all passengers)
+    over that of the stage episodes, for the same traffic seed: the fitness reads as the total wait of
+    the full episodes at the same fraction of the idle wait. Passengers arriving late in a short episode
+    are only counted until it ends, which the idle wait accounts for and a passenger count does not, so
+    a genome scores about the same at every stage of 100 steps or more. The scale stays the one NEAT's
+    reproduction expects (fitness ranges below 1 are treated as 1), and is exactly 1 at the full episodes.
+
+    :param config: NEAT configuration
+    :param seed: traffic seed
+    :return: factor of the total wait
+    """
+    stage = curriculum_stage(config)
+    if stage is None or stage.isFull():
+        return 1
+    floors = building_size(config)[0]
+    stage_idle = sum(trace.idleWait() for trace in episode_traces(config, seed))
+    full_idle = sum(trace.idleWait() for trace in generation_traces(seed, floors))
+    return full_idle / max(1, stage_idle)
+
+
+def save_generation_traces(directory: str, seed: int, floors: int = DEFAULT_ELEVATOR_FLOOR) -> None:
+    """
+    Save the traffic of a traffic seed, for processes that set trace_directory to share
+
+    :param directory: trace directory
+    :param seed: traffic seed
+    :param floors: floor count of the building
+    :return: None
+    """
+    for i, trace in enumerate(generation_traces(seed, floors)):
+        trace.save(trace_path(directory, floors, seed + i))
+
+
+def observation_buffer(config, runs: int) -> np.ndarray:
+    """
+    Network input buffer for control_step
+
+    :param config: NEAT configuration
+    :param runs: number of buildings controlled side by side
+    :return: one observation row per run (global) or one row per elevator of every run (local)
+    """
+    num_floors, num_elevators = building_size(config)
+    if controller_mode(config) == "local":
+        # see Floors.observeLocal for the layout
+        return np.empty((runs, num_elevators, Floors.localObservationSize()))
+    # see Floors.observe for the layout
+    return np.empty((runs, 1 + 2 * num_elevators + 3 * num_floors))
+
+
+def network_actions(net, config, inputs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Evaluate the network once for a batch of observed buildings
+
+    :param net: compiled network of the genome
+    :param config: NEAT configuration
+    :param inputs: observations laid out as by observation_buffer, one per building
+    :return: directions (sign gives the direction) and take ins, both of shape (buildings, elevators)
+    """
+    num_elevators = building_size(config)[1]
+    # Get NEAT outputs: directions and take-in actions for each elevator
+    if controller_mode(config) == "local":
+        outputs = net.activate_batch(inputs.reshape(-1, inputs.shape[-1])).reshape(len(inputs), num_elevators, 2)
+        return outputs[:, :, 0], outputs[:, :, 1] > 0
+    outputs = net.activate_batch(inputs)
+    return outputs[:, :num_elevators], outputs[:, num_elevators:] > 0
+
+
+def control_step(net, config, floor_systems: list[Floors], inputs: np.ndarray) -> None:
+    """
+    Observe the buildings, evaluate the network once for all of them and apply its actions
+
+    :param net: compiled network of the genome
+    :param config: NEAT configuration
+    :param floor_systems: buildings controlled side by side
+    :param inputs: buffer from observation_buffer
+    :return: None
+    """
+    local = controller_mode(config) == "local"
+    # Get inputs for the NEAT network
+    for floor_system, rows in zip(floor_systems, inputs):
+        if local:
+            floor_system.observeLocal(rows)
+        else:
+            floor_system.observe(rows)
+    directions, take_ins = network_actions(net, config, inputs)
+    for i, floor_system in enumerate(floor_systems):
+        # Update the elevator system with the actions
+        floor_system.applyActions(directions[i], take_ins[i])
+
+
+def simulate_genome(genome, config, seed: int, runs: Iterable[int], start_wait: int = 0,
+                    bound: Optional[int] = None, profiler: Optional[SimulationProfiler] = None,
+                    stats: Optional[ServiceStats] = None) -> tuple[int, int]:
+    """
+    Simulate some runs of a genome side by side, so the network is evaluated once per step for all of them
+    (and, with a local controller, for all of their elevators).
+
+    Total wait time only grows, so once start_wait plus the wait of these runs passes the bound
+    the final score is known to be worse than the bound and the simulation stops. The batch engine
+    (see simulation_engine) steps all runs as one BatchFloors, see simulate_batch. The event engine
+    runs them one after another on EventFloors, consulting the network at decision points only; it
+    has no bound.
+
+    :param genome: genome to simulate
+    :param config: NEAT configuration
+    :param seed: traffic seed, see generation_traces
+    :param runs: indices of the runs to simulate
+    :param start_wait: wait time already collected in other runs, counted against the bound
+    :param bound: stop once the total wait passes this, None to always finish
+    :param profiler: SimulationProfiler to record the simulation in, None to disable
+    :param stats: ServiceStats collecting the wait and ride times of all runs, None to disable;
+        passengers still in the building at the end are counted too
+    :return: total wait time of the runs (plus start_wait) and the number of steps simulated
+    """
+    net = compile_genome(genome, config)
+    num_floors, num_elevators = building_size(config)
+    steps = episode_shape(config)[0]
+    traces = episode_traces(config, seed)
+    if simulation_engine(config) == "batch":
+        if profiler is not None or stats is not None:
+            raise ValueError("The batch engine records no profile or stats, use the floors engine")
+        return simulate_batch(net, config, [traces[run] for run in runs], start_wait, bound)
+    if simulation_engine(config) == "event":
+        if bound is not None:
+            raise ValueError("The event engine jumps over steps, it cannot stop a run at a bound")
+        inputs = observation_buffer(config, 1)
+        total_wait_time = start_wait
+        for run in runs:
+            floor_system = EventFloors(TracePassengerGenerator(traces[run]), elevatorCount=num_elevators,
+                                       floorCount=num_floors, profiler=profiler, stats=stats)
+            floor_system.run(lambda floors: control_step(net, config, [floors], inputs), steps)
+            total_wait_time += floor_system.totalWaitTime
+            if stats is not None:
+                floor_system.recordUnfinished()
+        return total_wait_time, steps
+    floor_systems = [Floors(passengerGenerator=TracePassengerGenerator(traces[run]), elevatorCount=num_elevators,
+                            floorCount=num_floors, profiler=profiler, stats=stats)
+                     for run in runs]
+    inputs = observation_buffer(config, len(floor_systems))
+    total_wait_time = start_wait
+    for step in range(steps):
+        control_step(net, config, floor_systems, inputs)
+        for floor_system in floor_systems:
+            # Simulate the next time step
+            floor_system.next()
+        total_wait_time = start_wait + sum(floor_system.totalWaitTime for floor_system in floor_systems)
+        if bound is not None and total_wait_time > bound:
+            return total_wait_time, step + 1
+    if stats is not None:
+        for floor_system in floor_systems:
+            floor_system.recordUnfinished()
+    return total_wait_time, steps
+
+
+def simulate_batch(net, config, traces: list[TrafficTrace], start_wait: int = 0,
+                   bound: Optional[int] = None) -> tuple[int, int]:
+    """
+    simulate_genome on one BatchFloors holding every run, same results as Floors
+
+    :param net: compiled network of the genome
+    :param config: NEAT configuration, global controller
+    :param traces: traffic of every run
+    :param start_wait: wait time already collected in other runs, counted against the bound
+    :param bound: stop once the total wait passes this, None to always finish
+    :return: total wait time of the runs (plus start_wait) and the number of steps simulated
+    """
+    num_floors, num_elevators = building_size(config)
+    steps = episode_shape(config)[0]
+    buildings = BatchFloors(len(traces), [TracePassengerGenerator(trace) for trace in traces],
+                            elevatorCount=num_elevators, floorCount=num_floors)
+    inputs = observation_buffer(config, len(traces))
+    total_wait_time = start_wait
+    for step in range(steps):
+        directions, take_ins = network_actions(net, config, buildings.observe(inputs))
+        buildings.step(directions, take_ins)
+        total_wait_time = start_wait + int(buildings.totalWaitTime.sum())
+        if bound is not None and total_wait_time > bound:
+            return total_wait_time, step + 1
+    return total_wait_time, steps
+
+
+def simulate_population(genomes: list, config, seed: int) -> list[int]:
+    """
+    Total wait of several genomes over all runs, stepping the runs of every genome as one BatchFloors
+
+    Each network is evaluated once per step on the observations of its own runs.
+
+    :param genomes: genomes to simulate
+    :param config: NEAT configuration, global controller
+    :param seed: traffic seed, see generation_traces
+    :return: total wait time of every genome, in order
+    """
+    nets = [compile_genome(genome, config) for genome in genomes]
+    num_floors, num_elevators = building_size(config)
+    steps, total_runs = episode_shape(config)[:2]
+    traces = episode_traces(config, seed)
+    count = len(genomes) * total_runs
+    # runs of genome i are buildings i * total_runs .. (i + 1) * total_runs - 1
+    buildings = BatchFloors(count, [TracePassengerGenerator(trace) for _ in genomes for trace in traces],
+                            elevatorCount=num_elevators, floorCount=num_floors)
+    inputs = observation_buffer(config, count)
+    directions = np.empty((count, num_elevators))
+    take_ins = np.empty((count, num_elevators), dtype=bool)
+    for _ in range(steps):
+        buildings.observe(inputs)
+        for i, net in enumerate(nets):
+            rows = slice(i * total_runs, (i + 1) * total_runs)
+            directions[rows], take_ins[rows] = network_actions(net, config, inputs[rows])
+        buildings.step(directions, take_ins)
+    return buildings.totalWaitTime.reshape(len(genomes), total_runs).sum(axis=1).tolist()
+
+
+def record_episode(genome, config, directory: str, seed: int = RANDOM_SEED, steps: int = TOTAL_STEPS,
+                   append: bool = False) -> int:
+    """
+    Simulate one episode of a genome and record every tick, see episodeRecorder.EpisodeReplay to read it
+
+    Traffic is drawn block by block from the training profile, so episodes can be much longer than
+    a training run.
+
+    :param genome: genome to simulate
+    :param config: NEAT configuration
+    :param directory: recording directory
+    :param seed: traffic seed
+    :param steps: ticks to simulate
+    :param append: add the episode to a recording already in directory, see EpisodeRecorder
+    :return: total wait time of the episode
+    """
+    net = compile_genome(genome, config)
+    num_floors, num_elevators = building_size(config)
+    generator = ProfilePassengerGenerator(time_capture_profile(num_floors), num_floors, seed)
+    floor_system = Floors(passengerGenerator=generator, elevatorCount=num_elevators, floorCount=num_floors)
+    inputs = observation_buffer(config, 1)
+    with EpisodeRecorder(directory, num_floors, num_elevators, append=append) as recorder:
+        for _ in range(steps):
+            control_step(net, config, [floor_system], inputs)
+            recorder.record(floor_system)
+            floor_system.next()
+    return floor_system.totalWaitTime
+
+
 # Define the fitness function
-def evaluate_genomes(genomes, config):
+def evaluate_genome(genome, config, seed: int, profiler: Optional[SimulationProfiler] = None) -> float:
+    """
+    Evaluate the performance of a single genome on all runs.
+
+    The fitness is minus the objective of the config (see fitness_objective): "total_wait" is the
+    wait summed over passengers and steps, other objectives are statistics of the wait or ride time
+    distribution of all runs, e.g. "p95_wait" (see serviceStats.objective_value). At a curriculum
+    stage (see episode_shape) the total wait is scaled to the idle wait of the full episodes (see
+    fitness_scale), so fitness stays comparable between stages of different episode lengths and traffic.
+
+    :param genome: genome to evaluate
+    :param config: NEAT configuration
+    :param seed: traffic seed, see generation_traces
+    :param profiler: SimulationProfiler to record the simulation in, None to disable
+    :return: fitness of the genome
+    """
+    objective = fitness_objective(config)
+    runs = range(episode_shape(config)[1])
+    if objective == "total_wait":
+        total_wait_time, _ = simulate_genome(genome, config, seed, runs, profiler=profiler)
+        return -total_wait_time * fitness_scale(config, seed)
+    stats = ServiceStats(*building_size(config))
+    simulate_genome(genome, config, seed, runs, profiler=profiler, stats=stats)
+    return -objective_value(stats, objective)
+
+
+def fitness_key(genome, config, seed: int) -> bytes:
+    """
+    FitnessCache key of a genome evaluated by evaluate_genome
+
+    :param genome: genome
+    :param config: NEAT configuration
+    :param seed: traffic seed
+    :return: genome_key over the network, the traffic seed, the building, the controller, the objective,
+        the engine and the episode shape
+    """
+    return genome_key(genome, (seed, episode_shape(config), curriculum_stage(config) is not None,
+                               building_size(config), controller_mode(config), fitness_objective(config),
+                               simulation_engine(config)))
+
+
+def evaluate_genomes(genomes, config, seed: Optional[int] = None, profiler: Optional[SimulationProfiler] = None,
+                     cache: Optional[FitnessCache] = None):
     """
     Evaluate the performance of each genome in the population.
+    Every genome is evaluated on the same traffic.
+
+    :param seed: traffic seed, None draws a new one for this generation
+    :param profiler: SimulationProfiler to record the simulations in, None to disable (floors engine only)
+    :param cache: FitnessCache reused for networks already evaluated on this traffic, None to disable
     """
+    if seed is None:
+        seed = random.randrange(2 ** 31)
+    # with the batch engine, genomes missing from the cache are simulated together
+    batched = [] if simulation_engine(config) == "batch" else None
     for genome_id, genome in genomes:
-        net = neat.nn.FeedForwardNetwork.create(genome, config)
-        total_steps = 300  # Number of simulation steps
-        total_runs = 3
-        total_wait_time = 0
-        for i in range(total_runs):
-            floor_system = Floors(passengerGenerator=TimeCapture(DEFAULT_ELEVATOR_FLOOR))
-            for _ in range(total_steps):
-                # Get inputs for the NEAT network
-                current_time = floor_system.time  # Get the current time
-                elevator_locations = [convert_input(loc) for loc in floor_system.getElevatorLocation()]
-                elevator_directions = [convert_input(dir) for dir in floor_system.getElevatorDirection()]
-                floor_requests = floor_system.getFloorRequests()
-                waiting_passengers = [len(floor) for floor in floor_system._floors]
-
-                inputs = [convert_input(current_time)] + elevator_locations + elevator_directions + [convert_input(item) for sublist in floor_requests for item in sublist] + waiting_passengers
-                # Get NEAT outputs
-                outputs = convert_output(net.activate(inputs), elevator_locations)
-
-                # Map outputs to actions (e.g., set directions, decide to pick up passengers)
-                elevator_actions: list[Literal["up", "down", "idle"]] = outputs[:len(elevator_locations)]
-                take_ins = outputs[len(elevator_locations):]
-
-                # Update the elevator system with the actions
-                floor_system.setElevatorDirection(elevator_actions)
-                floor_system.setTakeIns(take_ins)
-
-                # Simulate the next time step
-                wait_time = floor_system.next()
-            total_wait_time += wait_time
+        key = None
+        if cache is not None:
+            key = fitness_key(genome, config, seed)
+            fitness = cache.get(key)
+            if fitness is not None:
+                genome.fitness = fitness
+                continue
+        if batched is not None:
+            batched.append((genome, key))
+            continue
         # Assign fitness score to the genome
-        genome.fitness = -total_wait_time
+        genome.fitness = evaluate_genome(genome, config, seed, profiler)
+        if cache is not None:
+            cache.put(key, genome.fitness)
+    if batched:
+        scale = fitness_scale(config, seed)
+        waits = simulate_population([genome for genome, _ in batched], config, seed)
+        for (genome, key), wait in zip(batched, waits):
+            genome.fitness = -wait * scale
+            if cache is not None:
+                cache.put(key, genome.fitness)
     # store the curr best in temp.pkl
 
 
+class ProfilerReporter(neat.reporting.BaseReporter):
+    def __init__(self, profiler: SimulationProfiler) -> None:
+        """
+        Report the simulation profile of every generation
+
+        :param profiler: SimulationProfiler passed to evaluate_genomes
+        """
+        self.profiler: SimulationProfiler = profiler
+        self.generation: Optional[int] = None
+        self.history: list[tuple[int, dict]] = []
+
+    def start_generation(self, generation):
+        self.generation = generation
+        self.profiler.reset()
+
+    def post_evaluate(self, config, population, species, best_genome):
+        summary = self.profiler.summary()
+        self.history.append((self.generation, summary))
+        phases = ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in summary["phase_seconds"].items())
+        counters = ", ".join(f"{name} {count}" for name, count in summary["counters"].items())
+        print(f"Simulation profile: {phases}")
+        print(f"Simulation counters: {counters}, mean queue {summary['mean_queue_length']:.1f}, "
+              f"max queue {summary['max_queue_length']}")
+
+
+class RacingGenomeEvaluator(object):
+    def __init__(self, promote: float = 0.25, protect: Optional[int] = None, seed: Optional[int] = None) -> None:
+        """
+        Evaluate genomes with successive halving and early aborts
+
+        Every genome is simulated on the first run; only the best promote fraction gets the
+        remaining runs. In both rounds a genome is stopped as soon as its wait time passes the
+        protect-th best score seen so far in the round, since it can no longer end up among those.
+        Genomes are promoted best first, so that bound is tight early on.
+
+        Genomes that were not fully evaluated get the wait they would have at their rate so far,
+        scaled to all runs, capped so they never rank above a fully evaluated genome. The protect best genomes always get their exact fitness.
+
+        :param promote: fraction of the population that gets all runs
+        :param protect: number of genomes whose first run and total are never cut short, None for the promoted count
+        :param seed: traffic seed, None draws a new one per generation
+        """
+        if not 0 < promote <= 1:
+            raise ValueError("promote must be in (0, 1]")
+        self.promote: float = promote
+        self.protect: Optional[int] = protect
+        self.seed: Optional[int] = seed
+        # simulated and full-evaluation step counts of the last generation, per run
+        self.simulated_steps: int = 0
+        self.full_steps: int = 0
+
+    @staticmethod
+    def _kth_best(waits: list[int], k: int) -> Optional[int]:
+        # bound protecting the k best waits so far, None while fewer than k are known
+        return sorted(waits)[k - 1] if len(waits) >= k else None
+
+    def evaluate(self, genomes, config) -> None:
+        """
+        Fitness function for population.run
+        """
+        if fitness_objective(config) != "total_wait":
+            raise ValueError("Racing bounds the total wait time, it cannot race other objectives")
+        seed = self.seed if self.seed is not None else random.randrange(2 ** 31)
+        total_steps, total_runs = episode_shape(config)[:2]
+        promoted_count = max(1, round(self.promote * len(genomes)))
+        protect = min(self.protect or promoted_count, len(genomes))
+        self.simulated_steps = 0
+        self.full_steps = len(genomes) * total_steps * total_runs
+
+        # round 1: the first run for everyone
+        first_waits: dict[int, int] = {}
+        estimates: dict[int, float] = {}
+        finished: list[int] = []
+        for genome_id, genome in genomes:
+            bound = self._kth_best(finished, max(protect, promoted_count))
+            wait, steps = simulate_genome(genome, config, seed, [0], bound=bound)
+            self.simulated_steps += steps
+            if steps < total_steps:
+                estimates[genome_id] = wait * total_steps / steps * total_runs
+            else:
+                first_waits[genome_id] = wait
+                finished.append(wait)
+
+        # round 2: the remaining runs for the best of round 1
+        ranked = sorted(first_waits, key=first_waits.get)
+        for genome_id in ranked[promoted_count:]:
+            estimates[genome_id] = first_waits[genome_id] * total_runs
+        totals: dict[int, int] = {}
+        genomes_by_id = dict(genomes)
+        for genome_id in ranked[:promoted_count]:
+            if total_runs == 1:
+                totals[genome_id] = first_waits[genome_id]
+                continue
+            bound = self._kth_best(list(totals.values()), protect)
+            wait, steps = simulate_genome(genomes_by_id[genome_id], config, seed, range(1, total_runs),
+                                          start_wait=first_waits[genome_id], bound=bound)
+            self.simulated_steps += steps * (total_runs - 1)
+            if steps < total_steps:
+                estimates[genome_id] = wait * total_steps * total_runs / (total_steps + (total_runs - 1) * steps)
+            else:
+                totals[genome_id] = wait
+
+        worst_total = max(totals.values())
+        scale = fitness_scale(config, seed)
+        for genome_id, genome in genomes:
+            if genome_id in totals:
+                genome.fitness = -totals[genome_id] * scale
+            else:
+                genome.fitness = -max(estimates[genome_id], worst_total) * scale
+
+
+# Worker process state, set once per worker by ParallelGenomeEvaluator
+_worker_config = None
+
+
+def _init_worker(config) -> None:
+    global _worker_config
+    _worker_config = config
+
+
+def _evaluate_in_worker(job) -> float:
+    genome, seed, stage = job
+    # the curriculum stage changes between generations, the configuration is sent once
+    _worker_config.curriculum_stage = stage
+    return evaluate_genome(genome, _worker_config, seed)
+
+
+class BatchGenomeEvaluator(object):
+    def __init__(self, seed: Optional[int] = None, cache: Optional[FitnessCache] = None) -> None:
+        """
+        Base of evaluators that hand the genomes of a generation to workers all at once
+
+        Subclasses implement evaluate_batch; evaluate skips cached networks and sends
+        duplicates only once.
+
+        :param seed: traffic seed, same fitness as evaluate_genomes with this seed; None draws one per generation
+        :param cache: FitnessCache checked before sending a genome out, None to disable
+        """
+        self.seed: Optional[int] = seed
+        self.cache: Optional[FitnessCache] = cache
+
+    def evaluate_batch(self, genomes: list, config, seed: int) -> list[float]:
+        """
+        Fitness of every genome, as evaluate_genome, in order
+
+        :param genomes: (genome id, genome) pairs
+        :param config: NEAT configuration
+        :param seed: traffic seed
+        :return: fitness values
+        """
+        raise NotImplementedError
+
+    def evaluate(self, genomes, config) -> None:
+        """
+        Fitness function for population.run, evaluates the genomes in parallel
+        """
+        seed = self.seed if self.seed is not None else random.randrange(2 ** 31)
+        if self.cache is None:
+            pending = genomes
+        else:
+            # cached networks are not sent out, duplicates only once
+            keys = {genome_id: fitness_key(genome, config, seed) for genome_id, genome in genomes}
+            known: dict[bytes, Optional[float]] = {}
+            pending = []
+            for genome_id, genome in genomes:
+                key = keys[genome_id]
+                if key not in known:
+                    known[key] = self.cache.get(key)
+                    if known[key] is None:
+                        pending.append((genome_id, genome))
+        for (genome_id, genome), fitness in zip(pending, self.evaluate_batch(pending, config, seed)):
+            genome.fitness = fitness
+            if self.cache is not None:
+                known[keys[genome_id]] = fitness
+                self.cache.put(keys[genome_id], fitness)
+        if self.cache is not None:
+            for genome_id, genome in genomes:
+                genome.fitness = known[keys[genome_id]]
+
+    def close(self) -> None:
+        """
+        Release the workers
+        """
+
+
+class ParallelGenomeEvaluator(BatchGenomeEvaluator):
+    def __init__(self, num_workers: int, config, seed: Optional[int] = None, chunksize: Optional[int] = None,
+                 cache: Optional[FitnessCache] = None) -> None:
+        """
+        Evaluate genomes on a pool of worker processes
+
+        The pool is created once and kept for the whole run, so the NEAT configuration is
+        sent to every worker a single time. Each generation only the genomes, the traffic seed
+        and the curriculum stage go out and only their fitness values come back; workers build the traffic of
+        a seed once and replay it for all of their genomes.
+
+        :param num_workers: number of worker processes
+        :param config: NEAT configuration, shared with the workers
+        :param seed: traffic seed, same fitness as evaluate_genomes with this seed; None draws one per generation
+        :param chunksize: genomes per task, None splits the population evenly across workers
+        :param cache: FitnessCache checked before sending a genome out, None to disable
+        """
+        super().__init__(seed, cache)
+        self.num_workers: int = num_workers
+        self.chunksize: Optional[int] = chunksize
+        self.pool = multiprocessing.Pool(num_workers, initializer=_init_worker, initargs=(config,))
+
+    def evaluate_batch(self, genomes: list, config, seed: int) -> list[float]:
+        chunksize = self.chunksize or max(1, -(-len(genomes) // self.num_workers))
+        stage = curriculum_stage(config)
+        return self.pool.map(_evaluate_in_worker, [(genome, seed, stage) for _, genome in genomes], chunksize)
+
+    def close(self) -> None:
+        """
+        Stop the worker processes
+        """
+        self.pool.close()
+        self.pool.join()
+
 
 # Configure the NEAT algorithm
-def run_neat():
+def run_neat(num_workers: int = 1, profile: bool = False, race: Optional[float] = None,
+             cache_size: Optional[int] = None, restore: Optional[Literal["latest", "best"]] = None,
+             checkpoint_dir: str = "checkpoints", controller: Literal["global", "local"] = "global",
+             floors: int = DEFAULT_ELEVATOR_FLOOR, elevators: int = DEFAULT_ELEVATOR_COUNT,
+             objective: str = "total_wait", listen: Optional[str] = None, authkey: Optional[bytes] = None,
+             batch_size: Optional[int] = None, curriculum: Optional[str] = None,
+             curriculum_spread: Optional[float] = None, engine: str = "floors", seed: Optional[int] = None):
     """
     Set up and run the NEAT algorithm.
+
+    :param num_workers: number of processes evaluating genomes, 1 evaluates in this process
+    :param profile: report simulation phase times and counters every generation (single process only)
+    :param race: fraction of the population that gets all runs, see RacingGenomeEvaluator; None evaluates everyone fully
+    :param cache_size: fitness values kept for networks seen again on the same traffic, 0 disables the cache,
+        None keeps DEFAULT_CACHE_SIZE with a fixed seed and disables it otherwise, since a new traffic seed
+        every generation only repeats networks within a generation;
+        racing fitness depends on the rest of the population and is not cached
+    :param restore: continue from the "latest" or "best" checkpoint in checkpoint_dir, None starts a new population
+    :param checkpoint_dir: directory of the checkpoints and their manifest
+    :param controller: "global" network over the whole building or "local" network shared by the elevators
+    :param floors: floor count of the building
+    :param elevators: elevator count of the building
+    :param objective: fitness objective, "total_wait" or a wait/ride statistic such as "p95_wait", see evaluate_genome
+    :param listen: "host:port" to coordinate workers of other machines on (see distributedEval), None to evaluate here
+    :param authkey: key the workers must know, required with listen
+    :param batch_size: genomes per message to a remote worker, None to split each generation evenly
+    :param curriculum: grow the episodes over the generations: "default" or a curriculum file (see curriculum.py),
+        None to evaluate every generation on the full episodes
+    :param curriculum_spread: end a curriculum stage early once the fitness spread falls below this
+    :param engine: simulator of the evaluations, one of ENGINES: "floors", "batch" to step all runs of a
+        genome as one BatchFloors (global controller and total_wait objective only), or "event" to skip quiet
+        steps with EventFloors (no racing)
+    :param seed: traffic seed of every generation, None draws a new one per generation
     """
-    # Initialize the floor system to determine dynamic input/output sizes
-    floor_system = Floors()
-    num_elevators = len(floor_system.getElevatorLocation())
-    num_floors = len(floor_system._floors)
-
-    # Calculate the number of inputs and outputs dynamically
-    num_inputs = 1 + (2 * num_elevators) + (2 * num_floors) + num_floors  # time + elevator states + floor requests + waiting passengers
-    num_outputs = num_elevators * 2  # Directions and take-in actions for each elevator
-
-    # Dynamically update the NEAT configuration under [DefaultGenome]
-    with open("neat_config", "r") as f:
-        config_data = f.readlines()
-
-    default_genome_index = None
-    for i, line in enumerate(config_data):
-        if line.strip() == "[DefaultGenome]":
-            default_genome_index = i
-            break
-
-    if default_genome_index is None:
-        raise RuntimeError("[DefaultGenome] section is missing in the NEAT config file.")
-
-    # Check for num_inputs, num_outputs, and add num_hidden
-    num_inputs_exists = any("num_inputs" in line for line in config_data[default_genome_index:])
-    num_outputs_exists = any("num_outputs" in line for line in config_data[default_genome_index:])
-
-    with open("neat_config", "w") as f:
-        for i, line in enumerate(config_data):
-            if i == default_genome_index:
-                f.write(line)  # Write [DefaultGenome] header
-                if not num_inputs_exists:
-                    f.write(f"num_inputs              = {num_inputs}\n")
-                if not num_outputs_exists:
-                    f.write(f"num_outputs             = {num_outputs}\n")
-            else:
-                f.write(line)
-
-    config_path = "neat_config"
-    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
-                         neat.DefaultSpeciesSet, neat.DefaultStagnation, config_path)
-    do_restore: bool = False
-    i = input("Do you want to restore the last best genome? (y/n): ")
-    if i == "y":
-        do_restore = True
-    else:
-        do_restore = False
-    if do_restore:
-        # find the last temp file
-        # load the genome
-
-        # list all temp files
-        import os
-        temp_files = []
-        for file in os.listdir():
-            if file.startswith("temp"):
-                temp_files.append(file.replace("temp", ""))
-        temp_files = sorted(temp_files, key=lambda x: int(x if x.isnumeric() else -1))
-        if len(temp_files) == 0:
-            print("No temp files found")
-            return
-        print("Found temp files", temp_files)
-        last_temp_file = temp_files[-1]
-        last_temp_file = "temp" + last_temp_file
-        print("Restoring from", last_temp_file)
-        pop = Checkpointer.restore_checkpoint(last_temp_file)
-        population = pop
+    if profile and num_workers > 1:
+        raise ValueError("Profiling records the simulations of this process, use a single worker")
+    if profile and engine == "batch":
+        raise ValueError("Profiling records Floors.next, the batch engine is not profiled")
+    if race is not None and (num_workers > 1 or profile):
+        raise ValueError("Racing evaluates genomes one after another in this process, use a single worker without profiling")
+    if race is not None and engine == "event":
+        raise ValueError("Racing stops runs between steps, the event engine jumps over them")
+    if listen is not None and (num_workers > 1 or profile or race is not None):
+        raise ValueError("Remote workers replace local workers, profiling and racing")
+    if listen is not None and not authkey:
+        raise ValueError("Remote workers need an authkey")
+
+    config = load_config(floors=floors, elevators=elevators, controller=controller, objective=objective,
+                         engine=engine)
+    if cache_size is None:
+        cache_size = DEFAULT_CACHE_SIZE if seed is not None else 0
+    cache = FitnessCache(cache_size) if cache_size > 0 else None
+    saved_curriculum = None
+    run = None
+    if restore is not None:
+        population, saved_cache, saved_curriculum, run = restore_checkpoint(checkpoint_dir, restore, config)
+        # the engines give the same fitness, the one asked for now is used
+        population.config.engine = config.engine
+        print(f"Restored the {restore} checkpoint from {checkpoint_dir}, generation {population.generation}")
+        if cache is not None and saved_cache is not None:
+            saved_cache.maxsize = cache_size
+            cache = saved_cache
     else:
         population = neat.Population(config, initial_state=None)
     population.add_reporter(neat.StdOutReporter(True))
     stats = neat.StatisticsReporter()
     population.add_reporter(stats)
 
-    checkpointer = Checkpointer(generation_interval=4, time_interval_seconds=None, filename_prefix="temp")
+    scheduler = None
+    if curriculum is not None:
+        scheduler = CurriculumScheduler(population, load_curriculum(curriculum), curriculum_spread)
+        if saved_curriculum is not None:
+            scheduler.setState(saved_curriculum)
+        population.add_reporter(scheduler)
+    else:
+        # a population restored from a curriculum run continues on full episodes
+        population.config.curriculum_stage = None
+
+    checkpointer = BackgroundCheckpointer(checkpoint_dir, generation_interval=4, cache=cache, curriculum=scheduler,
+                                          run=run)
     population.add_reporter(checkpointer)
 
     # Run the NEAT algorithm
-    winner = population.run(evaluate_genomes, n=700)
+    try:
+        if listen is not None:
+            from distributedEval import RemoteGenomeEvaluator, parse_address
+
+            evaluator = RemoteGenomeEvaluator(parse_address(listen), authkey, config, seed=seed,
+                                              batch_size=batch_size, cache=cache)
+            try:
+                winner = population.run(evaluator.evaluate, n=700)
+            finally:
+                evaluator.close()
+        elif num_workers > 1:
+            evaluator = ParallelGenomeEvaluator(num_workers, config, seed=seed, cache=cache)
+            try:
+                winner = population.run(evaluator.evaluate, n=700)
+            finally:
+                evaluator.close()
+        elif race is not None:
+            winner = population.run(RacingGenomeEvaluator(promote=race, seed=seed).evaluate, n=700)
+        elif profile:
+            profiler = SimulationProfiler()
+            population.add_reporter(ProfilerReporter(profiler))
+            winner = population.run(functools.partial(evaluate_genomes, seed=seed, profiler=profiler,
+                                                      cache=cache), n=700)
+        else:
+            winner = population.run(functools.partial(evaluate_genomes, seed=seed, cache=cache), n=700)
+    finally:
+        checkpointer.close()
+    if scheduler is not None and scheduler.best is not None:
+        # fitness of earlier stages is normalised, but only the last stage is the task itself
+        winner = scheduler.best
 
     # Display the best genome
     print("\nBest genome:\n", winner)
@@ -194,4 +893,45 @@ def run_neat():
 
 # Run the training
 if __name__ == "__main__":
-    run_neat()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train elevator controllers with NEAT")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes evaluating genomes (default: 1)")
+    parser.add_argument("--profile", action="store_true",
+                        help="report simulation phase times and counters every generation")
+    parser.add_argument("--race", type=float, metavar="FRACTION",
+                        help="successive halving with early aborts, only this fraction of genomes gets all runs")
+    parser.add_argument("--cache-size", type=int,
+                        help=f"fitness values cached for repeated networks, 0 disables "
+                             f"(default: {DEFAULT_CACHE_SIZE} with --seed, 0 without)")
+    parser.add_argument("--seed", type=int,
+                        help="traffic seed of every generation, so elites are not simulated again "
+                             "(default: new traffic every generation)")
+    parser.add_argument("--restore", choices=["latest", "best"],
+                        help="continue from the latest or the best checkpoint instead of a new population")
+    parser.add_argument("--checkpoint-dir", default="checkpoints",
+                        help="directory of the checkpoints and their manifest (default: checkpoints)")
+    parser.add_argument("--controller", choices=["global", "local"], default="global",
+                        help="one network for the whole building, or one small network shared by the elevators")
+    parser.add_argument("--floors", type=int, default=DEFAULT_ELEVATOR_FLOOR, help="floor count of the building")
+    parser.add_argument("--elevators", type=int, default=DEFAULT_ELEVATOR_COUNT, help="elevator count of the building")
+    parser.add_argument("--objective", default="total_wait",
+                        help="fitness objective: total_wait, or mean/max/pNN of wait or ride, e.g. p95_wait")
+    parser.add_argument("--engine", choices=ENGINES, default="floors",
+                        help="simulator of the evaluations: batch steps all runs of a genome together, "
+                             "event skips quiet steps (default: floors)")
+    parser.add_argument("--listen", metavar="HOST:PORT",
+                        help="evaluate on workers of other machines connecting here, see distributedEval.py")
+    parser.add_argument("--authkey", default=os.environ.get("ELEVATOR_AUTHKEY"),
+                        help="key remote workers must know (default: $ELEVATOR_AUTHKEY)")
+    parser.add_argument("--batch-size", type=int, help="genomes per message to a remote worker")
+    parser.add_argument("--curriculum", nargs="?", const="default", metavar="FILE",
+                        help="start on short episodes and grow them, with the default stages or those of a JSON file")
+    parser.add_argument("--curriculum-spread", type=float, metavar="SPREAD",
+                        help="end a curriculum stage early once the relative fitness spread falls below this")
+    args = parser.parse_args()
+    run_neat(num_workers=args.workers, profile=args.profile, race=args.race, cache_size=args.cache_size,
+             restore=args.restore, checkpoint_dir=args.checkpoint_dir, controller=args.controller,
+             floors=args.floors, elevators=args.elevators, objective=args.objective, listen=args.listen,
+             authkey=args.authkey.encode() if args.authkey else None, batch_size=args.batch_size,
+             curriculum=args.curriculum, curriculum_spread=args.curriculum_spread, engine=args.engine,
+             seed=args.seed)
\ No newline at end of file
@@ -1,22 +1,16 @@
-from matplotlib import pyplot as plt
-
 import pickle
-from neat import Config, DefaultGenome, DefaultReproduction, DefaultSpeciesSet, DefaultStagnation
 import warnings
 
-import graphviz
-import matplotlib.pyplot as plt
 from neat import Config, DefaultGenome, DefaultReproduction, DefaultSpeciesSet, DefaultStagnation
-from svglib.svglib import svg2rlg
-from reportlab.graphics import renderPM
-
 
 
 def draw_net(config, genome, view=False, filename=None, node_names=None, show_disabled=True, prune_unused=False,
              node_colors=None, fmt='svg'):
     """ Receives a genome and draws a neural network with arbitrary topology. """
     # Attributes for network nodes.
-    if graphviz is None:
+    try:
+        import graphviz
+    except ImportError:
         warnings.warn("This display is not available due to a missing optional dependency (graphviz)")
         return
 
@@ -84,6 +78,10 @@ def draw_net(config, genome, view=False, filename=None, node_names=None, show_di
 
 
 if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+    from reportlab.graphics import renderPM
+    from svglib.svglib import svg2rlg
+
     # Load the best genome
     with open("winner.pkl", "rb") as f:
         best_genome = pickle.load(f)